@@ -1,8 +1,8 @@
 import streamlit as st
-from streamlit_folium import st_folium
-import folium
 from datetime import datetime
-from modules.db import init_db, ensure_settings, add_deal
+from modules.db import init_db, add_deal
+from modules.districts import locate_point
+from modules.deal_map import render_deal_map
 from modules.auth import login_required, logout
 from modules.dashboard import render_dashboard
 from modules.style import apply_custom_style, get_custom_css
@@ -51,22 +51,28 @@ class EnhancedSiteRentalValuation(SiteRentalValuation):
         
         with cols[0]:
             st.info("انقر على الخريطة لتحديد الموقع بدقة")
-            m = folium.Map(location=[24.7136, 46.6753], zoom_start=12)
-            m.add_child(folium.LatLngPopup())
             
-            # عرض الخريطة
-            map_data = st_folium(m, height=400, width="100%")
+            # عرض الخريطة مع الصفقات المخزنة داخل حدود العرض
+            show_prices = st.toggle("🌡️ إظهار وسيط سعر المتر", key="valuation_map_prices")
+            map_data = render_deal_map(key="valuation_map", height=400, price_heatmap=show_prices)
             
             lat, lng = None, None
+            place = {'district': None, 'municipality': None, 'city': None}
             if map_data and map_data.get("last_clicked"):
                 lat = map_data["last_clicked"]["lat"]
                 lng = map_data["last_clicked"]["lng"]
+                place = locate_point(lat, lng)
                 st.success(f"تم التقاط الإحداثيات: {lat:.5f}, {lng:.5f}")
+                if place['district']:
+                    st.caption(f"📌 حي {place['district']}، {place['city']}")
+                elif place['city']:
+                    st.caption(f"📌 {place['city']} (خارج حدود الأحياء المسجلة)")
 
         input_col = cols[0] if is_mobile else cols[1]
         with input_col:
             with st.form("site_info_full_form"):
-                site_name = st.text_input("اسم الموقع")
+                default_name = "، ".join(n for n in (place['district'], place['city']) if n)
+                site_name = st.text_input("اسم الموقع", value=default_name)
                 site_area = st.number_input("المساحة (م²)", min_value=1.0)
                 property_type = st.selectbox("نوع العقار", ["تجاري", "سكني", "صناعي"])
                 
@@ -81,7 +87,8 @@ class EnhancedSiteRentalValuation(SiteRentalValuation):
                             'latitude': lat,
                             'longitude': lng,
                             'activity_type': 'تأجير بلدي',
-                            'notes': f"تم التحديد عبر الخريطة التفاعلية"
+                            'notes': f"تم التحديد عبر الخريطة التفاعلية",
+                            'district': place['district'],
                         }
                         deal_id = add_deal(deal_data)
                         st.session_state.current_deal_id = deal_id
@@ -127,6 +134,5 @@ def render_sidebar_navigation():
         render_admin_panel(st.session_state.get('user_role', 'user'))
 
 if __name__ == "__main__":
-    init_db()
-    ensure_settings()
+    init_db()  # تستدعي ensure_settings
     main()
@@ -0,0 +1,73 @@
+"""
+قياس تشكيل النصوص العربية لتقرير PDF متعدد الصفحات (عنوان الرأس ورقم الصفحة وأسطر المحتوى)
+مقارنة بإعادة التشكيل وعكس الاتجاه في كل استدعاء
+التشغيل: python -m benchmarks.bench_arabic_text [عدد الصفحات]
+"""
+import sys
+import time
+
+import arabic_reshaper
+from bidi.algorithm import get_display
+
+from modules import arabic_text
+
+TITLE = 'تقرير التقييم العقاري المهني'
+LINES_PER_PAGE = 25
+
+def uncached(text):
+    """الطريقة السابقة: تشكيل وعكس اتجاه في كل استدعاء"""
+    if not text:
+        return ""
+    return get_display(arabic_reshaper.reshape(text))
+
+def make_pages(n_pages):
+    """أسطر تقرير محاكية: قالب ثابت لكل موقع مع قيم متغيرة وأسطر عامة مكررة"""
+    template = [
+        'الموقع رقم {i}: أرض تجارية على طريق الملك فهد',
+        'المساحة الإجمالية: {area:,} م²',
+        'القيمة الإيجارية السنوية المقترحة: {value:,} ريال سعودي',
+        'طريقة التقييم: المقارنة بالصفقات المماثلة في نطاق 2 كم',
+        'يخضع التقييم للائحة التصرف بالعقارات البلدية',
+        '',
+    ]
+    lines = []
+    for i in range(n_pages * LINES_PER_PAGE // len(template)):
+        lines.extend(line.format(i=i % 40, area=500 + (i % 40) * 25, value=120000 + (i % 40) * 3500)
+                     for line in template)
+    return [lines[p * LINES_PER_PAGE:(p + 1) * LINES_PER_PAGE] for p in range(n_pages)]
+
+def render_uncached(pages):
+    for page_no, lines in enumerate(pages, start=1):
+        uncached(TITLE)
+        for line in lines:
+            uncached(line)
+        uncached(f'الصفحة {page_no}')
+
+def render_cached(pages):
+    for page_no, lines in enumerate(pages, start=1):
+        arabic_text.fix_arabic_lines(lines)
+        arabic_text.page_label(page_no)
+
+def _ms(func, *args):
+    t0 = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - t0) * 1000
+
+def run(n_pages=200):
+    pages = make_pages(n_pages)
+    n_lines = sum(len(lines) for lines in pages)
+    unique = len({line for lines in pages for line in lines})
+    print(f"تقرير {n_pages} صفحة: {n_lines:,} سطر ({unique} سطر مختلف) + رأس وتذييل لكل صفحة")
+
+    baseline_ms = _ms(render_uncached, pages)
+    arabic_text._shape_cache.clear()
+    cold_ms = _ms(render_cached, pages)
+    warm_ms = _ms(render_cached, pages)
+    print(f"بدون ذاكرة: {baseline_ms:,.1f} م.ث | مع الذاكرة (أول تقرير): {cold_ms:,.1f} م.ث "
+          f"(×{baseline_ms / cold_ms:.1f}) | تقرير تالٍ: {warm_ms:,.1f} م.ث (×{baseline_ms / warm_ms:.0f})")
+
+    same = all(arabic_text.fix_arabic_lines(lines) == [uncached(line) for line in lines] for lines in pages)
+    print(f"مطابقة النتائج: {same} | الذاكرة: {arabic_text.cache_info()}")
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
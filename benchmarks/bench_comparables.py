@@ -0,0 +1,60 @@
+"""
+زمن اختيار الصفقات المقارنة لموقع تقييم واحد ومطابقته للبحث الكامل
+التشغيل: python -m benchmarks.bench_comparables [عدد الصفقات]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from modules import db, comparables
+
+def run(n_deals=1_000_000, n_subjects=50, k=10, seed=11):
+    tmp_dir = tempfile.mkdtemp()
+    db.DB_PATH = os.path.join(tmp_dir, 'system.db')
+    db.init_db()
+
+    rng = np.random.default_rng(seed)
+    # 80% من الصفقات داخل خمس مدن والبقية موزعة على نطاق المملكة
+    cities = np.array([[24.71, 46.68], [21.49, 39.19], [26.42, 50.09], [21.39, 39.86], [24.47, 39.61]])
+    in_city = rng.random(n_deals) < 0.8
+    centers = cities[rng.integers(0, len(cities), n_deals)]
+    lats = np.where(in_city, centers[:, 0] + rng.normal(0, 0.15, n_deals), rng.uniform(16.0, 32.0, n_deals))
+    lngs = np.where(in_city, centers[:, 1] + rng.normal(0, 0.15, n_deals), rng.uniform(34.5, 55.5, n_deals))
+    types = rng.choice(['تجاري', 'سكني', 'صناعي'], n_deals)
+    areas = rng.lognormal(6.5, 0.8, n_deals)
+    prices = areas * rng.uniform(800, 4000, n_deals)
+    days = rng.integers(0, 365 * 5, n_deals)
+    dates = (pd.Timestamp('2026-01-01') - pd.to_timedelta(days, unit='D')).strftime('%Y-%m-%d')
+    t0 = time.perf_counter()
+    db.add_deals_bulk({'property_type': str(types[i]), 'area': float(areas[i]), 'price': float(prices[i]),
+                       'deal_date': dates[i], 'latitude': float(lats[i]), 'longitude': float(lngs[i])}
+                      for i in range(n_deals))
+    print(f"إدخال {n_deals:,} صفقة: {time.perf_counter() - t0:.1f} ث")
+
+    picks = rng.integers(0, n_deals, n_subjects)
+    subjects = [{'latitude': lats[i] + 0.001, 'longitude': lngs[i] - 0.001, 'area': 800.0,
+                 'property_type': 'تجاري'} for i in picks]
+    timings = []
+    for subject in subjects:
+        t0 = time.perf_counter()
+        found = comparables.find_comparables(subject, k=k, as_of='2026-01-01')
+        comparables.comparables_valuation(subject, comparables.adjust_comparables(subject, found))
+        timings.append((time.perf_counter() - t0) * 1000)
+
+    # التحقق من الدقة مقابل حساب المسافة الموزونة لجميع الصفقات
+    everything = db.load_deals_frame(list(comparables.COMPARABLE_COLUMNS))
+    exact = True
+    for subject in subjects[:5]:
+        full = comparables.score_candidates(subject, everything, as_of='2026-01-01').nsmallest(k, 'score')
+        found = comparables.find_comparables(subject, k=k, as_of='2026-01-01')
+        exact &= np.allclose(np.sort(full['score'].to_numpy()), found['score'].to_numpy())
+    print(f"اختيار {k} صفقات مقارنة: الوسيط {np.median(timings):.1f} م.ث | P95 "
+          f"{np.percentile(timings, 95):.1f} م.ث | مطابقة للبحث الكامل: {exact}")
+    return timings, exact
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
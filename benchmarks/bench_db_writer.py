@@ -0,0 +1,59 @@
+"""
+اختبار ضغط لخيط الكتابة: 50 جلسة متزامنة تضيف صفقات في نفس الوقت
+التشغيل: python -m benchmarks.bench_db_writer
+"""
+import os
+import tempfile
+import threading
+import time
+
+from modules import db
+
+WRITERS = 50
+DEALS_PER_WRITER = 200
+
+def run(writers=WRITERS, deals_per_writer=DEALS_PER_WRITER):
+    tmp_dir = tempfile.mkdtemp()
+    db.DB_PATH = os.path.join(tmp_dir, 'system.db')
+    db.init_db()
+
+    ids = [[] for _ in range(writers)]
+    start_barrier = threading.Barrier(writers)
+
+    def worker(i):
+        start_barrier.wait()
+        for j in range(deals_per_writer):
+            ids[i].append(db.add_deal({
+                'property_type': 'تجاري',
+                'location': f'جلسة {i} - موقع {j}',
+                'area': 100.0 + j,
+                'latitude': 24.7 + i * 1e-3,
+                'longitude': 46.6 + j * 1e-3,
+                'deal_date': '2024-01-01',
+            }))
+            # قراءة متوازية أثناء الكتابة (WAL)
+            db.get_setting('mult_temp')
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(writers)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    expected = writers * deals_per_writer
+    returned = [deal_id for chunk in ids for deal_id in chunk]
+    stored = db.get_connection().execute('SELECT COUNT(*) FROM deals').fetchone()[0]
+    lost = sum(1 for deal_id in returned if deal_id is None)
+    stats = db.get_writer().stats
+
+    print(f"الصفقات المتوقعة: {expected} | المخزنة: {stored} | بدون رقم: {lost}")
+    print(f"أرقام فريدة: {len(set(returned)) == expected}")
+    print(f"معدل الكتابة: {expected / elapsed:,.0f} صفقة/ث خلال {elapsed:.2f} ث")
+    print(f"عدد المعاملات: {stats['batches']} (متوسط {stats['jobs'] / max(stats['batches'], 1):.1f} عملية/معاملة)")
+    assert stored == expected and lost == 0
+    return expected / elapsed
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,70 @@
+"""
+قياس طبقة الصفقات على الخريطة: جلب صفقات حدود العرض عبر R*Tree وتجميعها في خلايا لكل مستوى
+تقريب، مقارنة بعلامة لكل صفقة داخل حدود العرض
+التشغيل: python -m benchmarks.bench_deal_map [عدد الصفقات]
+"""
+import copy
+import os
+import sys
+import tempfile
+import time
+
+import folium
+import numpy as np
+from streamlit_folium import generate_leaflet_string
+
+from modules import db, deal_map
+
+def _ms(func):
+    t0 = time.perf_counter()
+    result = func()
+    return (time.perf_counter() - t0) * 1000, result
+
+def run(n_deals=100_000, seed=11):
+    tmp_dir = tempfile.mkdtemp()
+    db.DB_PATH = os.path.join(tmp_dir, 'system.db')
+    db.init_db()
+
+    rng = np.random.default_rng(seed)
+    # الصفقات متركزة حول مركز الرياض (انحراف معياري ~10 كم)
+    lats = rng.normal(24.7136, 0.09, n_deals)
+    lngs = rng.normal(46.6753, 0.10, n_deals)
+    areas = rng.uniform(200, 2000, n_deals)
+    db.add_deals_bulk({'property_type': 'تجاري', 'area': float(areas[i]), 'price': float(areas[i] * 1500),
+                       'latitude': float(lats[i]), 'longitude': float(lngs[i])} for i in range(n_deals))
+    print(f"{n_deals:,} صفقة حول الرياض")
+
+    for zoom in (8, 10, 12, 14, 16, 18):
+        bounds = deal_map.default_bounds(zoom=zoom)
+        cold_ms, clusters = _ms(lambda: deal_map.get_clusters(bounds, zoom))
+        warm_ms, _ = _ms(lambda: deal_map.get_clusters(bounds, zoom))
+        layer_ms, layer = _ms(lambda: deal_map.build_deal_layer(clusters))
+        print(f"تقريب {zoom:2d}: {len(clusters):4d} علامة تمثل {int(clusters['deal_count'].sum()):,} صفقة | "
+              f"جلب وتجميع {cold_ms:6.1f} م.ث | من الذاكرة {warm_ms:5.2f} م.ث | بناء الطبقة {layer_ms:5.1f} م.ث")
+
+    # إضافة صفقة ترفع إصدار البيانات: تُجلب صفقات حدود العرض الحالية فقط، وخريطة الأساس نسخة من القالب
+    copy_ms, _ = _ms(lambda: copy.deepcopy(deal_map.get_base_map()))
+    for zoom in (12, 16):
+        bounds = deal_map.default_bounds(zoom=zoom)
+        deal_map.get_clusters(bounds, zoom)
+        db.add_deal({'property_type': 'سكني', 'area': 500.0, 'price': 500000.0,
+                     'latitude': deal_map.MAP_CENTER[0], 'longitude': deal_map.MAP_CENTER[1]})
+        refresh_ms, clusters = _ms(lambda: deal_map.get_clusters(bounds, zoom))
+        print(f"بعد إضافة صفقة (تقريب {zoom}): إعادة الجلب والتجميع {refresh_ms:.1f} م.ث "
+              f"لـ {int(clusters['deal_count'].sum()):,} صفقة | نسخة خريطة الأساس {copy_ms:.1f} م.ث")
+    bounds = deal_map.default_bounds()
+
+    # الطريقة السابقة: علامة لكل صفقة داخل حدود العرض
+    fetch_ms, rows = _ms(lambda: db.get_deals_in_bbox(*bounds))
+    def naive_layer():
+        m = folium.Map(location=deal_map.MAP_CENTER, zoom_start=deal_map.DEFAULT_ZOOM)
+        for deal in rows:
+            folium.CircleMarker((deal['latitude'], deal['longitude']), radius=4).add_to(m)
+        m.get_root().render()
+        return generate_leaflet_string(m)
+    naive_ms, html = _ms(naive_layer)
+    print(f"علامة لكل صفقة (تقريب {deal_map.DEFAULT_ZOOM}): {len(rows):,} علامة | جلب {fetch_ms:.0f} م.ث | "
+          f"بناء وتحويل {naive_ms:,.0f} م.ث | {len(html) / 1e6:.1f} م.ب")
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
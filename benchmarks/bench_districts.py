@@ -0,0 +1,70 @@
+"""
+قياس تحديد الحي من طبقة المضلعات: دفعة كبيرة (استيراد صفقات) ونقطة واحدة (نقرة على الخريطة)
+مع مقارنة النتيجة بالاختبار البسيط لكل نقطة مقابل كل مضلع
+التشغيل: python -m benchmarks.bench_districts [عدد النقاط]
+"""
+import json
+import sys
+import time
+
+import numpy as np
+
+from modules import districts
+
+def naive_inside(lng, lat, ring):
+    inside = False
+    for (x1, y1), (x2, y2) in zip(ring[:-1], ring[1:]):
+        if (y1 > lat) != (y2 > lat) and lng < x1 + (lat - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+    return inside
+
+def naive_assign(lats, lngs, features, areas):
+    """أصغر حي يحتوي النقطة بفحص جميع المضلعات (الحلقة الخارجية لكل مضلع في الطبقة الحالية)"""
+    result = []
+    for lat, lng in zip(lats.tolist(), lngs.tolist()):
+        best = None
+        for i, feature in enumerate(features):
+            if feature['properties'].get('level') != districts.DISTRICT_LEVEL:
+                continue
+            if naive_inside(lng, lat, feature['geometry']['coordinates'][0]):
+                if best is None or areas[i] < areas[best]:
+                    best = i
+        result.append(None if best is None else features[best]['properties']['name'])
+    return result
+
+def run(n_points=1_000_000, seed=5):
+    index = districts.get_district_index()
+    with open(districts.DISTRICTS_PATH, 'r', encoding='utf-8') as f:
+        features = json.load(f)['features']
+    print(f"الطبقة: {len(index)} مضلع | مستويات الشجرة: {[len(level[0]) for level in index.tree]}")
+
+    rng = np.random.default_rng(seed)
+    # 80% من النقاط داخل الرياض وجدة (كثافة الصفقات الفعلية) والبقية على كامل المملكة
+    n_city = int(n_points * 0.8)
+    lats = np.concatenate([rng.uniform(24.55, 24.95, n_city // 2), rng.uniform(21.4, 21.8, n_city - n_city // 2),
+                           rng.uniform(16.0, 32.0, n_points - n_city)])
+    lngs = np.concatenate([rng.uniform(46.5, 46.9, n_city // 2), rng.uniform(39.0, 39.3, n_city - n_city // 2),
+                           rng.uniform(34.5, 55.5, n_points - n_city)])
+
+    t0 = time.perf_counter()
+    names = districts.assign_districts(lats, lngs)
+    elapsed = time.perf_counter() - t0
+    print(f"دفعة {n_points:,} نقطة: {elapsed * 1000:,.0f} م.ث ({elapsed / n_points * 1e6:.2f} ميكروثانية/نقطة) | "
+          f"داخل حي: {sum(n is not None for n in names):,}")
+
+    sample = rng.choice(n_points, 5000, replace=False)
+    t0 = time.perf_counter()
+    expected = naive_assign(lats[sample], lngs[sample], features, index.areas)
+    naive_us = (time.perf_counter() - t0) / len(sample) * 1e6
+    print(f"الفحص البسيط: {naive_us:,.1f} ميكروثانية/نقطة | مطابقة العينة: {list(names[sample]) == expected}")
+
+    timings = []
+    for i in sample[:2000]:
+        t0 = time.perf_counter()
+        districts.locate_point(lats[i], lngs[i])
+        timings.append((time.perf_counter() - t0) * 1e6)
+    print(f"نقرة واحدة (locate_point): الوسيط {np.median(timings):.0f} ميكروثانية | "
+          f"P95 {np.percentile(timings, 95):.0f} ميكروثانية")
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
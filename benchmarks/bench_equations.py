@@ -0,0 +1,52 @@
+"""
+قياس تقييم المعادلات المحفوظة عبر شبكة الاعتماد (معادلة مفردة ومعادلات مترابطة)
+مع التحقق من أن اسم المعادلة لا يتكرر بين الفئات
+التشغيل: python -m benchmarks.bench_equations [عدد التقييمات]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from modules import db
+from modules.equation_manager import EquationManager, EquationNameError
+
+VARIABLES = {
+    'area': 10.0, 'market_rate': 1.0, 'condition_factor': 1.0,
+    'total_revenue': 1_500_000.0, 'total_cost': 900_000.0, 'investment_cost': 4_000_000.0,
+    'annual_percentage': 0.08,
+}
+
+def check_cross_category(manager):
+    """اسم موجود في فئة أخرى يُرفض، والمعادلة الأصلية تبقى هي المستخدمة في التقييم"""
+    try:
+        manager.add_equation('rental', 'market_value', 'area * 2')
+        rejected = False
+    except EquationNameError:
+        rejected = True
+    value = manager.evaluate_equation('market_value', VARIABLES)
+    # تحديث المعادلة داخل فئتها مسموح، ومعادلات الفئات الأخرى ترى النص الجديد
+    manager.add_equation('real_estate', 'market_value', 'area * market_rate * condition_factor * 3')
+    chained = manager.evaluate_equation('rental_percentage_method', VARIABLES)
+    return rejected and value == 10.0 and chained == 30.0 * 0.08 / 12
+
+def run(n_calls=20_000):
+    tmp_dir = tempfile.mkdtemp()
+    db.DB_PATH = os.path.join(tmp_dir, 'system.db')
+    db.init_db()
+    manager = EquationManager()
+
+    for eq_ids in (['market_value'], ['roi'], ['roi', 'net_profit', 'percentage_method']):
+        manager.evaluate_equations(eq_ids, VARIABLES)
+        t0 = time.perf_counter()
+        for _ in range(n_calls):
+            manager.evaluate_equations(eq_ids, VARIABLES)
+        elapsed = time.perf_counter() - t0
+        print(f"{' + '.join(eq_ids)}: {n_calls / elapsed:,.0f} تقييم/ث ({elapsed / n_calls * 1e6:.1f} ميكروثانية)")
+
+    same = check_cross_category(manager)
+    print(f"رفض الاسم المكرر بين الفئات: {same}")
+    return same
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
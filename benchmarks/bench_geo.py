@@ -0,0 +1,85 @@
+"""
+مقارنة الأدوات الجغرافية المتجهة مع النسخة البسيطة نقطة بنقطة
+التشغيل: python -m benchmarks.bench_geo [عدد النقاط]
+"""
+import math
+import sys
+import time
+
+import numpy as np
+
+from modules import geo
+
+def naive_haversine(lat1, lng1, lat2, lng2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((p2 - p1) / 2) ** 2
+         + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2)
+    return 2 * geo.EARTH_RADIUS_KM * math.asin(math.sqrt(min(max(a, 0.0), 1.0)))
+
+def naive_geohash(lat, lng, precision=7):
+    """الخوارزمية التقليدية: تنصيف متكرر للنطاق بتبادل خط الطول والعرض"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, coord = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if coord >= mid:
+            value = value * 2 + 1
+            rng[0] = mid
+        else:
+            value = value * 2
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(geo.GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+def _timed(func):
+    t0 = time.perf_counter()
+    result = func()
+    return (time.perf_counter() - t0) * 1000, result
+
+def run(n_points=200_000, seed=3):
+    rng = np.random.default_rng(seed)
+    lats = rng.uniform(16.0, 32.0, n_points)
+    lngs = rng.uniform(34.5, 55.5, n_points)
+    lat0, lng0 = 24.7136, 46.6753
+
+    naive_ms, naive = _timed(lambda: [naive_haversine(lat0, lng0, a, b) for a, b in zip(lats, lngs)])
+    vector_ms, vector = _timed(lambda: geo.haversine_km(lat0, lng0, lats, lngs))
+    print(f"هافرساين نقطة←{n_points:,}: بسيط {naive_ms:,.1f} م.ث | متجه {vector_ms:,.1f} م.ث "
+          f"(×{naive_ms / vector_ms:.0f}) | أقصى فرق {np.max(np.abs(np.array(naive) - vector)):.2e} كم")
+
+    m = 1000
+    naive_ms, naive = _timed(lambda: [[naive_haversine(a, b, c, d) for c, d in zip(lats[:m], lngs[:m])]
+                                      for a, b in zip(lats[:m], lngs[:m])])
+    vector_ms, vector = _timed(lambda: geo.pairwise_haversine_km(lats[:m], lngs[:m]))
+    print(f"هافرساين أزواج {m}×{m}: بسيط {naive_ms:,.1f} م.ث | متجه {vector_ms:,.1f} م.ث "
+          f"(×{naive_ms / vector_ms:.0f}) | أقصى فرق {np.max(np.abs(np.array(naive) - vector)):.2e} كم")
+
+    for precision in (7, 12):
+        naive_ms, naive = _timed(lambda: [naive_geohash(a, b, precision) for a, b in zip(lats, lngs)])
+        vector_ms, vector = _timed(lambda: geo.geohash_encode(lats, lngs, precision))
+        decode_ms, (dlat, dlng, elat, elng) = _timed(lambda: geo.geohash_decode(vector, with_error=True))
+        inside = np.all(np.abs(dlat - lats) <= elat) and np.all(np.abs(dlng - lngs) <= elng)
+        print(f"Geohash دقة {precision}: بسيط {naive_ms:,.1f} م.ث | متجه {vector_ms:,.1f} م.ث "
+              f"(×{naive_ms / vector_ms:.0f}) | فك {decode_ms:,.1f} م.ث | مطابقة: {list(naive) == vector.tolist()} "
+              f"| النقاط داخل خلاياها: {inside}")
+
+    radii = rng.uniform(0.5, 50, n_points)
+    vector_ms, boxes = _timed(lambda: geo.bbox_from_radius(lats, lngs, radii))
+    # نقاط على محيط كل دائرة (36 اتجاهاً) يجب أن تقع داخل مستطيلها
+    south, west, north, east = boxes
+    bearings = np.radians(np.arange(0, 360, 10))[None, :]
+    d, p1 = (radii / geo.EARTH_RADIUS_KM)[:, None], np.radians(lats)[:, None]
+    p2 = np.arcsin(np.sin(p1) * np.cos(d) + np.cos(p1) * np.sin(d) * np.cos(bearings))
+    dl = np.arctan2(np.sin(bearings) * np.sin(d) * np.cos(p1), np.cos(d) - np.sin(p1) * np.sin(p2))
+    edge_lats, edge_lngs = np.degrees(p2), lngs[:, None] + np.degrees(dl)
+    contained = np.all((edge_lats >= south[:, None]) & (edge_lats <= north[:, None])
+                       & (edge_lngs >= west[:, None]) & (edge_lngs <= east[:, None]))
+    print(f"مستطيلات الإحاطة لـ {n_points:,} نقطة: {vector_ms:,.1f} م.ث | المحيط داخل المستطيل: {contained}")
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
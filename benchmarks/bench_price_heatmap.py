@@ -0,0 +1,87 @@
+"""
+قياس طبقة وسيط سعر المتر: بناء الخلايا أول مرة، والتحديث التدريجي بعد إضافة صفقات وتعديلها
+مقارنة بإعادة الحساب من جميع الصفوف، ودقة الوسيط التقريبي مقابل الوسيط الفعلي لكل خلية
+التشغيل: python -m benchmarks.bench_price_heatmap [عدد الصفقات]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from modules import db, geo, price_heatmap
+
+def _ms(func):
+    t0 = time.perf_counter()
+    result = func()
+    return (time.perf_counter() - t0) * 1000, result
+
+def _random_deals(rng, n):
+    areas = rng.uniform(200, 2000, n)
+    # سعر المتر يرتفع قرب المركز مع تشتت لوغاريتمي
+    lats, lngs = rng.normal(24.7136, 0.09, n), rng.normal(46.6753, 0.10, n)
+    distance = np.hypot(lats - 24.7136, lngs - 46.6753)
+    price_per_m2 = np.exp(rng.normal(np.log(3000) - 8 * distance, 0.35))
+    return [{'property_type': 'تجاري', 'area': float(areas[i]), 'price': float(areas[i] * price_per_m2[i]),
+             'latitude': float(lats[i]), 'longitude': float(lngs[i])} for i in range(n)]
+
+def full_recompute():
+    """الطريقة البديلة: تجميع جميع الصفقات من جديد (المدرجات نفسها من الصفر)"""
+    frame = db.load_deals_frame(['latitude', 'longitude', 'price_per_m2'])
+    frame = frame[frame['latitude'].notna() & (frame['price_per_m2'] > 0)]
+    return price_heatmap.aggregate_changes(frame['latitude'].to_numpy(), frame['longitude'].to_numpy(),
+                                           frame['price_per_m2'].to_numpy(), np.ones(len(frame)))
+
+def stored_cells():
+    rows = db.get_connection().execute('SELECT precision, cell, bucket, deal_count FROM price_cells').fetchall()
+    return sorted(rows)
+
+def run(n_deals=100_000, seed=17):
+    tmp_dir = tempfile.mkdtemp()
+    db.DB_PATH = os.path.join(tmp_dir, 'system.db')
+    db.init_db()
+    rng = np.random.default_rng(seed)
+    db.add_deals_bulk(_random_deals(rng, n_deals))
+
+    build_ms, drained = _ms(price_heatmap.refresh_price_cells)
+    print(f"{n_deals:,} صفقة | بناء الخلايا أول مرة: {drained:,} تغيير خلال {build_ms:,.0f} م.ث | "
+          f"{len(stored_cells()):,} صف مدرج")
+
+    for batch in (1, 100, 1000):
+        db.add_deals_bulk(_random_deals(rng, batch))
+        refresh_ms, _ = _ms(price_heatmap.refresh_price_cells)
+        recompute_ms, _ = _ms(full_recompute)
+        print(f"إضافة {batch:5,} صفقة: تحديث تدريجي {refresh_ms:7.1f} م.ث | إعادة حساب كاملة {recompute_ms:7.1f} م.ث")
+
+    # تعديل وحذف: يجب أن تبقى الخلايا المخزنة مطابقة لإعادة الحساب الكاملة
+    def mutate(conn):
+        conn.execute('UPDATE deals SET price = price * 2 WHERE id % 97 = 0')
+        conn.execute('UPDATE deals SET latitude = latitude + 0.05 WHERE id % 89 = 0')
+        conn.execute('DELETE FROM deals WHERE id % 83 = 0')
+    db.run_write(mutate)
+    refresh_ms, drained = _ms(price_heatmap.refresh_price_cells)
+    expected = sorted(row for row in full_recompute())
+    print(f"تعديل وحذف: {drained:,} تغيير خلال {refresh_ms:.0f} م.ث | مطابقة إعادة الحساب: {stored_cells() == expected}")
+
+    frame = db.load_deals_frame(['latitude', 'longitude', 'price_per_m2'])
+    frame = frame[frame['latitude'].notna() & (frame['price_per_m2'] > 0)]
+    for precision in price_heatmap.HEATMAP_PRECISIONS:
+        load_ms, cells = _ms(lambda: price_heatmap.get_price_cells(precision))
+        warm_ms, _ = _ms(lambda: price_heatmap.get_price_cells(precision))
+        exact = frame.groupby(geo.geohash_encode(frame['latitude'], frame['longitude'], precision))['price_per_m2'].median()
+        merged = cells.set_index('cell').join(exact.rename('exact'))
+        error = (merged['median_price_per_m2'] / merged['exact'] - 1).abs()
+        print(f"دقة {precision}: {len(cells):,} خلية | قراءة {load_ms:6.1f} م.ث | من الذاكرة {warm_ms:.2f} م.ث | "
+              f"خطأ الوسيط: متوسط {error.mean():.2%} وأقصى {error.max():.2%}")
+
+    for zoom in (6, 9, 12, 15):
+        bounds = (24.45, 46.35, 24.95, 47.0) if zoom < 12 else (24.65, 46.6, 24.78, 46.75)
+        cells_ms, cells = _ms(lambda: price_heatmap.get_heatmap_cells(bounds, zoom))
+        layer_ms, _ = _ms(lambda: price_heatmap.build_heatmap_layer(cells))
+        print(f"تقريب {zoom:2d}: دقة {price_heatmap.precision_for_zoom(zoom)} | {len(cells):4d} خلية | "
+              f"اختيار {cells_ms:5.1f} م.ث | بناء الطبقة {layer_ms:5.1f} م.ث")
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,22 @@
+"""
+زمن محاكاة مونت كارلو وتكرار نتائجها بنفس البذرة
+التشغيل: python -m benchmarks.bench_simulation [عدد السحبات]
+"""
+import sys
+
+from modules.simulation import run_simulation
+
+def run(n_draws=1_000_000):
+    results = {}
+    for method in ('dcf', 'residual'):
+        first = run_simulation(method, n_draws=n_draws, threshold=3_000_000)
+        second = run_simulation(method, n_draws=n_draws, threshold=3_000_000)
+        repeatable = all(first[k] == second[k] for k in ('p5', 'p50', 'p95', 'prob_below'))
+        print(f"{method}: {n_draws:,} سحبة خلال {first['elapsed'] * 1000:,.0f} مللي ثانية | "
+              f"P5 {first['p5']:,.0f} | P50 {first['p50']:,.0f} | P95 {first['p95']:,.0f} | "
+              f"P(<3M) {first['prob_below']:.3f} | قابلة للتكرار: {repeatable}")
+        results[method] = first
+    return results
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
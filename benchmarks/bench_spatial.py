@@ -0,0 +1,58 @@
+"""
+مقارنة الاستعلامات المكانية عبر فهرس R*Tree مع المسح الكامل لجدول الصفقات
+التشغيل: python -m benchmarks.bench_spatial [عدد الصفقات]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from modules import db, geo
+
+def _timed(func, repeat=20):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - t0) / repeat * 1000, result
+
+def run(n_deals=1_000_000, seed=42):
+    tmp_dir = tempfile.mkdtemp()
+    db.DB_PATH = os.path.join(tmp_dir, 'system.db')
+    db.init_db()
+
+    rng = np.random.default_rng(seed)
+    lats = rng.uniform(16.0, 32.0, n_deals)   # نطاق المملكة تقريباً
+    lngs = rng.uniform(34.5, 55.5, n_deals)
+    types = rng.choice(['تجاري', 'سكني', 'صناعي'], n_deals)
+    t0 = time.perf_counter()
+    db.add_deals_bulk({'property_type': str(types[i]), 'area': 500.0, 'price': 1000.0,
+                       'latitude': float(lats[i]), 'longitude': float(lngs[i])}
+                      for i in range(n_deals))
+    print(f"إدخال {n_deals:,} صفقة: {time.perf_counter() - t0:.1f} ث")
+
+    bbox = (24.60, 46.55, 24.80, 46.80)  # عرض خريطة الرياض
+    conn = db.get_connection()
+    naive_bbox = lambda: conn.execute(
+        'SELECT * FROM deals NOT INDEXED WHERE latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?',
+        (bbox[0], bbox[2], bbox[1], bbox[3])).fetchall()
+    naive_ms, naive_rows = _timed(naive_bbox, 3)
+    rtree_ms, rtree_rows = _timed(lambda: db.get_deals_in_bbox(*bbox))
+    print(f"المستطيل: مسح كامل {naive_ms:.1f} م.ث | R*Tree {rtree_ms:.2f} م.ث "
+          f"({len(rtree_rows)} صفقة، مطابقة: {len(naive_rows) == len(rtree_rows)})")
+
+    lat, lng, k = 24.7136, 46.6753, 10
+    def naive_nearest():
+        rows = conn.execute('SELECT id, latitude, longitude FROM deals NOT INDEXED WHERE property_type = ?',
+                            ('تجاري',)).fetchall()
+        arr = np.array([r[1:] for r in rows])
+        dist = geo.haversine_km(lat, lng, arr[:, 0], arr[:, 1])
+        return [rows[i][0] for i in np.argsort(dist, kind='stable')[:k]]
+    naive_ms, naive_ids = _timed(naive_nearest, 3)
+    rtree_ms, nearest = _timed(lambda: db.nearest_deals(lat, lng, k, {'property_type': 'تجاري'}))
+    print(f"أقرب {k}: مسح كامل {naive_ms:.1f} م.ث | R*Tree {rtree_ms:.2f} م.ث "
+          f"(مطابقة: {naive_ids == [d['id'] for d in nearest]})")
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,46 @@
+"""
+مقارنة التقييم المتجه للمحافظ مع التقييم المفرد صفاً بصف
+التشغيل: python -m benchmarks.bench_valuation [عدد المواقع]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from modules.valuation_methods import apply_valuation_method, apply_valuation_methods_batch
+
+def make_portfolio(n_rows, seed=7):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'method': rng.choice(['sales_comparison', 'residual', 'dcf'], n_rows),
+        'base_price': rng.uniform(500, 5000, n_rows),
+        'land_area': rng.uniform(200, 20000, n_rows),
+        'gdv': rng.uniform(1e6, 5e7, n_rows),
+        'construction_cost': rng.uniform(5e5, 3e7, n_rows),
+        'developer_profit': rng.uniform(0.1, 0.3, n_rows),
+        'annual_income': rng.uniform(5e4, 5e6, n_rows),
+        'discount_rate': rng.uniform(0.06, 0.14, n_rows),
+        'forecast_years': rng.integers(5, 51, n_rows),
+    })
+
+def run(n_rows=20_000):
+    portfolio = make_portfolio(n_rows)
+    additional = {'adjustments_matrix': {'location': 5, 'area': -2.5, 'condition': 1.5}}
+
+    t0 = time.perf_counter()
+    scalar = [apply_valuation_method(row['method'], row, additional)['total_value']
+              for row in portfolio.to_dict('records')]
+    scalar_time = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    batch = apply_valuation_methods_batch(portfolio, additional_data=additional)
+    batch_time = time.perf_counter() - t0
+
+    identical = np.array_equal(np.asarray(scalar, dtype=float), batch['total_value'].to_numpy())
+    print(f"المفرد: {n_rows / scalar_time:,.0f} صف/ث | المتجه: {n_rows / batch_time:,.0f} صف/ث "
+          f"(تسريع ×{scalar_time / batch_time:.0f}) | تطابق تام: {identical}")
+    return identical
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
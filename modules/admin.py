@@ -1,13 +1,19 @@
 import streamlit as st
-from modules.db import get_setting, update_setting
+from modules.db import get_settings, update_setting
+from modules.deal_importer import import_deals_file
+from modules.equation_manager import EquationManager
 
 def render_admin_panel(user_role):
     st.header("⚙️ إدارة معدلات النظام العامة")
     
     # التأكد من وجود البيانات الافتراضية عند أول تشغيل
-    current_mult_temp = get_setting('mult_temp', 0.85)
-    current_mult_long = get_setting('mult_long', 1.60)
-    current_cost = get_setting('construction_cost_m2', 3500)
+    current = get_settings(
+        ['mult_temp', 'mult_long', 'construction_cost_m2'],
+        defaults={'mult_temp': 0.85, 'mult_long': 1.60, 'construction_cost_m2': 3500}
+    )
+    current_mult_temp = current['mult_temp']
+    current_mult_long = current['mult_long']
+    current_cost = current['construction_cost_m2']
 
     with st.form("settings_form"):
         st.subheader("📊 معاملات أنواع التأجير (Multipliers)")
@@ -44,3 +50,65 @@ def render_admin_panel(user_role):
             st.success("✅ تم تحديث المعدلات بنجاح")
             # تنبيه المستخدم بضرورة إعادة التحميل لتطبيق التغييرات
             st.info("سيتم تطبيق المعدلات الجديدة في الحسابات القادمة.")
+
+    st.markdown("---")
+    render_deals_import()
+
+    st.markdown("---")
+    render_equation_usage()
+
+def render_deals_import():
+    """رفع ملفات الصفقات التاريخية (CSV / Excel) وإدخالها على دفعات"""
+    st.subheader("📥 استيراد الصفقات التاريخية")
+    uploaded = st.file_uploader("ملف الصفقات", type=["csv", "xlsx"])
+
+    if uploaded is not None and st.button("🚀 بدء الاستيراد"):
+        progress = st.progress(0.0)
+        status = st.empty()
+        total_size = max(uploaded.size, 1)
+
+        def show_progress(report):
+            progress.progress(min(uploaded.tell() / total_size, 1.0))
+            status.text(f"تمت قراءة {report['rows_read']:,} صف | مرفوض {report['rejected']:,} | "
+                        f"{report['rows_per_sec']:,.0f} صف/ث")
+
+        try:
+            report = import_deals_file(uploaded, uploaded.name, progress_callback=show_progress)
+        except Exception as e:
+            st.error(f"❌ تعذر استيراد الملف: {e}")
+            return
+
+        progress.progress(1.0)
+        st.success(f"✅ تم إدخال {report['inserted']:,} صفقة خلال {report['elapsed']:.1f} ث "
+                   f"({report['rows_per_sec']:,.0f} صف/ث)")
+        if report['rejected']:
+            st.warning(f"⚠️ تم رفض {report['rejected']:,} صف")
+            st.dataframe(report['rejected_rows'], use_container_width=True)
+
+def render_equation_usage():
+    """عدد مرات استخدام كل معادلة وزمن تقييمها الفعلي (p50 / p95)"""
+    st.subheader("🧮 استخدام المعادلات")
+    manager = EquationManager()
+    equations = manager.get_equations_by_type(None)
+
+    col1, col2 = st.columns(2)
+    col1.metric("عدد المعادلات", manager.get_equation_count())
+    col2.metric("معدل الاستخدام", f"{manager.get_usage_rate():.1f}%")
+
+    if not equations:
+        st.info("لا توجد معادلات محفوظة")
+        return
+    st.dataframe(
+        [{k: eq[k] for k in ('category', 'name', 'usage_count', 'p50_ms', 'p95_ms', 'last_used')}
+         for eq in sorted(equations, key=lambda eq: -eq['usage_count'])],
+        column_config={
+            "category": "الفئة",
+            "name": "المعادلة",
+            "usage_count": st.column_config.NumberColumn("مرات الاستخدام", format="%d"),
+            "p50_ms": st.column_config.NumberColumn("الزمن p50 (ms)", format="%.3f"),
+            "p95_ms": st.column_config.NumberColumn("الزمن p95 (ms)", format="%.3f"),
+            "last_used": "آخر استخدام",
+        },
+        use_container_width=True,
+        hide_index=True,
+    )
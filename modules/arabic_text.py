@@ -0,0 +1,37 @@
+"""
+تشكيل النصوص العربية لمكتبة FPDF (إعادة تشكيل الحروف ثم عكس الاتجاه Bidi) مع ذاكرة LRU
+مشتركة، فلا تُعاد المعالجة نفسها للنصوص المتكررة كعنوان الرأس ورقم الصفحة وأسطر القوالب
+"""
+import arabic_reshaper
+from bidi.algorithm import get_display
+from modules.cache import LRUCache
+
+SHAPE_CACHE_CHARS = 1_000_000  # الحد الأقصى لمجموع أطوال النصوص المشكَّلة المخزنة
+PAGE_LABEL = 'الصفحة {}'
+
+_shape_cache = LRUCache(SHAPE_CACHE_CHARS)
+
+def _shape(text):
+    return get_display(arabic_reshaper.reshape(text))
+
+def fix_arabic(text):
+    """تحويل النص العربي ليكون متوافقاً مع مكتبة FPDF (تشكيل وعكس الاتجاه)"""
+    if not text:
+        return ""
+    return _shape_cache.get_or_build(text, lambda: _shape(text))
+
+def fix_arabic_lines(lines):
+    """تشكيل قائمة أسطر دفعة واحدة: كل سطر مختلف يُعالج مرة واحدة فقط"""
+    shaped = {}
+    for line in lines:
+        if line not in shaped:
+            shaped[line] = fix_arabic(line)
+    return [shaped[line] for line in lines]
+
+def page_label(page_no):
+    """نص "الصفحة n" مشكَّلاً (يُعالج كل رقم صفحة مرة واحدة لكل عملية)"""
+    return fix_arabic(PAGE_LABEL.format(page_no))
+
+def cache_info():
+    """إحصاءات ذاكرة التشكيل (الإصابات والإخفاقات وعدد النصوص)"""
+    return _shape_cache.info()
@@ -1,6 +1,6 @@
 import hashlib
-import sqlite3
 from datetime import datetime
+from modules.db import get_connection, run_write
 
 def hash_password(password):
     """تشفير كلمة المرور"""
@@ -8,16 +8,10 @@ def hash_password(password):
 
 def login_required(username, password):
     """المصادقة"""
-    conn = sqlite3.connect('data/system.db')
-    c = conn.cursor()
-    
     hashed_password = hash_password(password)
     
-    c.execute('SELECT * FROM users WHERE username = ? AND password = ?', 
-              (username, hashed_password))
-    user = c.fetchone()
-    
-    conn.close()
+    user = get_connection().execute('SELECT * FROM users WHERE username = ? AND password = ?', 
+                                    (username, hashed_password)).fetchone()
     
     if user:
         return {
@@ -29,32 +23,24 @@ def login_required(username, password):
         }
     return None
 
+def _insert_user(conn, params):
+    conn.execute('INSERT INTO users (username, password, name, email, role) VALUES (?, ?, ?, ?, ?)', params)
+
 def register_user(username, password, name, email, role='user'):
     """تسجيل مستخدم جديد"""
     try:
-        conn = sqlite3.connect('data/system.db')
-        c = conn.cursor()
-        
         hashed_password = hash_password(password)
         
-        c.execute('INSERT INTO users (username, password, name, email, role) VALUES (?, ?, ?, ?, ?)',
-                  (username, hashed_password, name, email, role))
-        
-        conn.commit()
-        conn.close()
+        run_write(_insert_user, (username, hashed_password, name, email, role))
         return True
     except:
         return False
 
 def get_all_users():
     """الحصول على جميع المستخدمين"""
-    conn = sqlite3.connect('data/system.db')
-    c = conn.cursor()
-    
-    c.execute('SELECT username, name, email, role, created_at FROM users ORDER BY created_at DESC')
-    users = c.fetchall()
-    
-    conn.close()
+    users = get_connection().execute(
+        'SELECT username, name, email, role, created_at FROM users ORDER BY created_at DESC'
+    ).fetchall()
     
     return [{
         'username': u[0],
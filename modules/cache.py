@@ -0,0 +1,73 @@
+"""
+ذاكرة تخزين مؤقت LRU مشتركة بين جلسات Streamlit في نفس العملية
+"""
+import threading
+from collections import OrderedDict
+
+class LRUCache:
+    """تخزين مؤقت محدود الحجم مع إخراج الأقدم استخداماً وعدادات الإصابة
+
+    max_bytes: الحد الأقصى للحجم التقديري لجميع القيم.
+    sizeof: دالة تقدير حجم القيمة (افتراضياً len للنصوص).
+    """
+
+    def __init__(self, max_bytes, sizeof=len):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._items = OrderedDict()  # key -> (value, size)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.stats['misses'] += 1
+                return default
+            self._items.move_to_end(key)
+            self.stats['hits'] += 1
+            return item[0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            if size > self.max_bytes:
+                return value
+            self._items[key] = (value, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self._size -= evicted_size
+                self.stats['evictions'] += 1
+        return value
+
+    def pop(self, key, default=None):
+        """حذف عنصر من الذاكرة وإرجاع قيمته"""
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is None:
+                return default
+            self._size -= item[1]
+            return item[0]
+
+    def get_or_build(self, key, builder):
+        """إرجاع القيمة المخزنة أو بناؤها بـ builder() وتخزينها"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = self.put(key, builder())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+    def info(self):
+        """إحصاءات التخزين: الإصابات والإخفاقات وعدد العناصر والحجم"""
+        with self._lock:
+            return dict(self.stats, items=len(self._items), size=self._size, max_bytes=self.max_bytes)
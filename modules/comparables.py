@@ -0,0 +1,171 @@
+"""
+محرك اختيار الصفقات المقارنة: أفضل k صفقة لموقع التقييم حسب مسافة موزونة تجمع
+الموقع (هافرساين) والمساحة ونوع العقار ونوع النشاط وحداثة الصفقة، مع مصفوفة تعديلات
+جاهزة لمعادلة مقارنة المبيعات
+"""
+import math
+from datetime import date
+import numpy as np
+import pandas as pd
+from modules import db, geo
+from modules.valuation_methods import BatchValuationMethods, apply_valuation_method
+
+DEFAULT_K = 10
+START_RADIUS_KM = 1.0
+# معامل توسيع نصف قطر البحث: 2 يبقي مساحة الجولة الأخيرة ≤ 4 أضعاف المطلوب فعلاً
+RADIUS_GROWTH = 2
+
+# أوزان مكونات المسافة: كل كيلومتر، كل وحدة من |ln(نسبة المساحة)|، اختلاف النوع، اختلاف النشاط، كل سنة من عمر الصفقة
+DEFAULT_WEIGHTS = {
+    'location': 1.0,
+    'area': 1.0,
+    'property_type': 2.0,
+    'activity_type': 1.0,
+    'recency': 0.5,
+}
+
+ANNUAL_MARKET_GROWTH = 0.03   # تعديل الزمن: نمو الأسعار السنوي المفترض
+AREA_ELASTICITY = 0.10        # تعديل المساحة: انخفاض سعر المتر مع كبر المساحة (لوغاريتمياً)
+MAX_ADJUSTMENT_PCT = 30.0     # حد كل تعديل منفرد بالنسبة المئوية
+
+COMPARABLE_COLUMNS = ('id', 'location', 'district', 'property_type', 'activity_type',
+                      'area', 'price', 'deal_date', 'latitude', 'longitude')
+
+# أعمدة البحث الأولي فقط (تاريخ الصفقة كرقم يوم جولياني محسوب داخل SQLite)
+SEARCH_COLUMNS = ('id', 'latitude', 'longitude', 'area', 'price', 'property_type', 'activity_type', 'deal_julian')
+
+def _julian(as_of):
+    return pd.Timestamp(as_of or date.today()).to_julian_date()
+
+def _scores(subject, weights, lat, lng, area, property_type, activity_type, age_years):
+    """المسافة الموزونة ومسافة هافرساين لمصفوفات الصفقات المرشحة"""
+    distance = geo.haversine_km(subject['latitude'], subject['longitude'], lat, lng)
+    score = weights['location'] * distance + weights['recency'] * age_years
+    subject_area = float(subject.get('area') or 0)
+    if subject_area > 0 and weights['area']:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            area_gap = np.abs(np.log(area / subject_area))
+        score += weights['area'] * np.where(np.isfinite(area_gap), area_gap, 10.0)
+    if subject.get('property_type') and weights['property_type']:
+        score += weights['property_type'] * (property_type != subject['property_type'])
+    if subject.get('activity_type') and weights['activity_type']:
+        score += weights['activity_type'] * (activity_type != subject['activity_type'])
+    return score, distance
+
+def score_candidates(subject, candidates, weights=None, as_of=None):
+    """المسافة الموزونة لصفقات DataFrame (أعمدة COMPARABLE_COLUMNS) مع distance_km و age_years"""
+    weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+    frame = candidates.copy()
+    dates = pd.DatetimeIndex(pd.to_datetime(frame['deal_date'], errors='coerce'))
+    ages = (_julian(as_of) - dates.to_julian_date().to_numpy(dtype=float)) / 365.25
+    frame['age_years'] = np.maximum(np.nan_to_num(ages, nan=0.0), 0.0)
+    frame['score'], frame['distance_km'] = _scores(
+        subject, weights, frame['latitude'].to_numpy(dtype=float), frame['longitude'].to_numpy(dtype=float),
+        frame['area'].to_numpy(dtype=float), frame['property_type'].to_numpy(dtype=object),
+        frame['activity_type'].to_numpy(dtype=object), frame['age_years'].to_numpy())
+    return frame
+
+def _load_candidates(bbox, filters):
+    """الصفقات داخل المستطيل كمصفوفات NumPy (عبر db.load_deals_in_bbox)"""
+    frame = db.load_deals_in_bbox(*bbox, SEARCH_COLUMNS, filters)
+    if frame.empty:
+        return None
+    area = frame['area'].to_numpy(dtype=float)
+    price = frame['price'].to_numpy(dtype=float)
+    # صفقات بلا سعر أو مساحة لا تصلح للمقارنة
+    valid = (area > 0) & (price > 0)
+    return {
+        'id': frame['id'].to_numpy()[valid],
+        'latitude': frame['latitude'].to_numpy(dtype=float)[valid],
+        'longitude': frame['longitude'].to_numpy(dtype=float)[valid],
+        'area': area[valid],
+        'property_type': frame['property_type'].to_numpy(dtype=object)[valid],
+        'activity_type': frame['activity_type'].to_numpy(dtype=object)[valid],
+        'julian': frame['deal_julian'].to_numpy(dtype=float)[valid],
+    }
+
+def find_comparables(subject, k=DEFAULT_K, weights=None, filters=None, as_of=None,
+                     start_radius_km=START_RADIUS_KM):
+    """أفضل k صفقة مقارنة لموقع التقييم مرتبة حسب المسافة الموزونة (score)
+
+    subject: قاموس يحتوي latitude, longitude وبشكل اختياري area, property_type, activity_type.
+    يبحث في مستطيل يتوسع حول الموقع عبر فهرس deals_rtree. أي صفقة خارج دائرة نصف قطرها R
+    لا تقل مسافتها الموزونة عن وزن الموقع × R، لذا تتوقف الزيادة عندما يكون لدينا k صفقة
+    بمسافة موزونة لا تتجاوز هذا الحد فتكون النتيجة مطابقة للبحث الكامل.
+    تُجلب الأعمدة الكاملة للصفقات المختارة فقط في النهاية.
+    """
+    weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+    lat, lng = float(subject['latitude']), float(subject['longitude'])
+    as_of_julian = _julian(as_of)
+    radius = start_radius_km
+    while True:
+        covers_world = radius >= math.pi * geo.EARTH_RADIUS_KM or weights['location'] <= 0
+        bbox = (-90.0, -180.0, 90.0, 180.0) if covers_world else geo.bbox_from_radius(lat, lng, radius)
+        found = _load_candidates(bbox, filters)
+        if found is not None and len(found['id']):
+            ages = np.maximum(np.nan_to_num((as_of_julian - found['julian']) / 365.25, nan=0.0), 0.0)
+            score, distance = _scores(subject, weights, found['latitude'], found['longitude'], found['area'],
+                                      found['property_type'], found['activity_type'], ages)
+            top = np.argpartition(score, k - 1)[:k] if len(score) > k else np.arange(len(score))
+            top = top[np.lexsort((found['id'][top], score[top]))]
+            if covers_world or (len(top) >= k and score[top[-1]] <= weights['location'] * radius):
+                best = db.load_deals_by_ids(found['id'][top], COMPARABLE_COLUMNS)
+                return pd.concat([
+                    pd.DataFrame({'rank': np.arange(1, len(top) + 1)}), best,
+                    pd.DataFrame({'distance_km': distance[top], 'age_years': ages[top], 'score': score[top]}),
+                ], axis=1)
+        elif covers_world:
+            return pd.DataFrame(columns=['rank', *COMPARABLE_COLUMNS, 'distance_km', 'age_years', 'score'])
+        radius *= RADIUS_GROWTH
+
+def adjust_comparables(subject, comparables, market_growth=ANNUAL_MARKET_GROWTH,
+                       area_elasticity=AREA_ELASTICITY, extra_adjustments=None):
+    """مصفوفة التعديلات (%) لكل صفقة مقارنة وسعر المتر بعد التعديل
+
+    time: تحديث سعر الصفقة لتاريخ التقييم، area: فرق المساحة، location: يُدخله المقيّم
+    (extra_adjustments: قاموس اسم التعديل ← قيمة مفردة أو مصفوفة بطول الصفقات).
+    """
+    n = len(comparables)
+    area = comparables['area'].to_numpy(dtype=float)
+    price_per_m2 = comparables['price'].to_numpy(dtype=float) / area
+    adjustments = {
+        'time': market_growth * comparables['age_years'].to_numpy(dtype=float) * 100,
+        'area': np.zeros(n),
+        'location': np.zeros(n),
+    }
+    subject_area = float(subject.get('area') or 0)
+    if subject_area > 0:
+        adjustments['area'] = area_elasticity * np.log(area / subject_area) * 100
+    for name, value in (extra_adjustments or {}).items():
+        adjustments[name] = np.broadcast_to(np.asarray(value, dtype=float), n)
+    columns = {'price_per_m2': price_per_m2}
+    columns.update((f"adj_{name}", np.clip(value, -MAX_ADJUSTMENT_PCT, MAX_ADJUSTMENT_PCT))
+                   for name, value in adjustments.items())
+    total = np.sum([columns[f"adj_{name}"] for name in adjustments], axis=0)
+    columns['adj_total'] = total
+    columns['adjusted_price_per_m2'] = BatchValuationMethods().sales_comparison_method(price_per_m2, total)
+    return pd.concat([comparables.reset_index(drop=True), pd.DataFrame(columns)], axis=1)
+
+def comparables_valuation(subject, adjusted):
+    """تقييم مقارنة المبيعات من الصفقات المعدلة (أوزان عكسية للمسافة الموزونة)
+
+    تعيد base_price (متوسط سعر المتر الموزون) وadjustments_matrix بحيث يعطي
+    sales_comparison_method(base_price, adjustments_matrix) متوسط الأسعار المعدلة الموزون تماماً،
+    ثم total_value عبر apply_valuation_method بمساحة الموقع.
+    """
+    if adjusted.empty:
+        return None
+    weights = 1.0 / (adjusted['score'].to_numpy(dtype=float) + 0.1)
+    weights /= weights.sum()
+    price = adjusted['price_per_m2'].to_numpy(dtype=float)
+    base_price = float(np.dot(weights, price))
+    adj_columns = [c for c in adjusted.columns if c.startswith('adj_') and c != 'adj_total']
+    # ترجيح كل تعديل بالسعر × الوزن: Σw·p·(1+a) = Σw·p × (1 + Σw·p·a / Σw·p)
+    matrix = {c[4:]: float(np.dot(weights * price, adjusted[c].to_numpy(dtype=float)) / base_price)
+              for c in adj_columns}
+    result = apply_valuation_method('sales_comparison',
+                                    {'base_price': base_price, 'land_area': float(subject.get('area') or 1)},
+                                    {'adjustments_matrix': matrix})
+    result.update(base_price=base_price, adjustments_matrix=matrix, weights=weights.tolist(),
+                  comparables_count=len(adjusted))
+    return result
@@ -2,8 +2,77 @@ import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
+import json
 from datetime import datetime, timedelta
 import random
+from modules.cache import LRUCache
+from modules.db import get_deal_stats, get_data_version, get_recent_deals
+
+ARABIC_MONTHS = ['يناير', 'فبراير', 'مارس', 'أبريل', 'مايو', 'يونيو',
+                 'يوليو', 'أغسطس', 'سبتمبر', 'أكتوبر', 'نوفمبر', 'ديسمبر']
+UNKNOWN_REGION = 'غير محدد'
+DASHBOARD_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+def _estimate_size(value):
+    """تقدير حجم القيمة المخزنة في ذاكرة لوحة التحكم"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (list, tuple)):
+        return sum(_estimate_size(v) for v in value)
+    if isinstance(value, str):
+        return len(value)
+    return 64
+
+# مكونات لوحة التحكم الجاهزة (HTML / JSON المخططات / الجداول) مشتركة بين جميع الجلسات،
+# ومفتاحها بصمة إصدار البيانات بدل مدة صلاحية زمنية
+_dashboard_cache = LRUCache(DASHBOARD_CACHE_MAX_BYTES, sizeof=_estimate_size)
+
+def _cached(panel, builder):
+    """إرجاع المكوّن من الذاكرة إن لم تتغير البيانات، وإلا بناؤه وتخزينه"""
+    try:
+        version = get_data_version()
+    except Exception as e:
+        print(f"Error reading data version: {e}")
+        return builder()
+    # الشهر الحالي جزء من المفتاح لأن مؤشرات "هذا الشهر" تتغير مع بداية كل شهر
+    return _dashboard_cache.get_or_build((panel, version, _month_key(datetime.now())), builder)
+
+def get_dashboard_cache_info():
+    """عدادات الإصابة والإخفاق وحجم ذاكرة لوحة التحكم"""
+    return _dashboard_cache.info()
+
+def _cached_deal_stats():
+    return _cached('deal_stats', load_deal_stats)
+
+def load_deal_stats():
+    """تحميل ملخص الصفقات (صف لكل شهر × نوع عقار × منطقة) كـ DataFrame"""
+    try:
+        rows = get_deal_stats()
+    except Exception as e:
+        print(f"Error loading deal stats: {e}")
+        rows = []
+    return pd.DataFrame(rows, columns=['month', 'property_type', 'region',
+                                       'deal_count', 'total_area', 'total_price'])
+
+def _month_key(date):
+    return date.strftime('%Y-%m')
+
+def _previous_month(date):
+    return date.replace(day=1) - timedelta(days=1)
+
+def _format_change(current, previous):
+    """نص نسبة التغير عن الشهر الماضي"""
+    if not previous:
+        return "لا توجد بيانات للشهر الماضي"
+    change = (current - previous) / previous * 100
+    return f"{change:+.0f}% عن الشهر الماضي"
+
+def _format_amount(value):
+    if value >= 1_000_000:
+        return f"{value / 1_000_000:.1f}M"
+    if value >= 1_000:
+        return f"{value / 1_000:.0f}K"
+    return f"{value:,.0f}"
 
 def render_dashboard(user_role):
     """عرض لوحة التحكم الرئيسية"""
@@ -40,106 +109,108 @@ def render_dashboard(user_role):
     with col4:
         render_upcoming_tasks()
 
-def render_kpi_cards():
-    """عرض مؤشرات الأداء الرئيسية"""
-    
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        st.markdown("""
-        <div class="dashboard-card">
-            <div class="card-header">
-                <div class="card-icon">🏢</div>
-                <div>
-                    <h3 class="card-title">إجمالي الصفقات</h3>
-                    <p class="card-subtitle">+12% عن الشهر الماضي</p>
-                </div>
-            </div>
-            <div class="card-value">1,245</div>
-            <div class="card-progress">
-                <div style="background: #10B981; height: 6px; border-radius: 3px; width: 75%;"></div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown("""
+def _kpi_card(icon, title, subtitle, value, color, progress):
+    return f"""
         <div class="dashboard-card">
             <div class="card-header">
-                <div class="card-icon">📈</div>
+                <div class="card-icon">{icon}</div>
                 <div>
-                    <h3 class="card-title">التقييمات المكتملة</h3>
-                    <p class="card-subtitle">+8% عن الشهر الماضي</p>
+                    <h3 class="card-title">{title}</h3>
+                    <p class="card-subtitle">{subtitle}</p>
                 </div>
             </div>
-            <div class="card-value">892</div>
+            <div class="card-value">{value}</div>
             <div class="card-progress">
-                <div style="background: #3B82F6; height: 6px; border-radius: 3px; width: 60%;"></div>
+                <div style="background: {color}; height: 6px; border-radius: 3px; width: {progress:.0f}%;"></div>
             </div>
         </div>
-        """, unsafe_allow_html=True)
+        """
+
+def build_kpi_cards():
+    """بناء HTML بطاقات مؤشرات الأداء من ملخص الصفقات"""
+    
+    stats = _cached_deal_stats()
+    
+    today = datetime.now()
+    this_month = _month_key(today)
+    last_month = _month_key(_previous_month(today))
+    monthly = stats.groupby('month')[['deal_count', 'total_area', 'total_price']].sum()
+    
+    def month_total(month, column):
+        return monthly[column].get(month, 0)
+    
+    total_deals = int(stats['deal_count'].sum())
+    total_area = stats['total_area'].sum()
+    total_price = stats['total_price'].sum()
+    deals_this_month = int(month_total(this_month, 'deal_count'))
+    deals_last_month = int(month_total(last_month, 'deal_count'))
+    
+    avg_price_m2 = total_price / total_area if total_area else 0
+    area_this = month_total(this_month, 'total_area')
+    area_last = month_total(last_month, 'total_area')
+    price_m2_this = month_total(this_month, 'total_price') / area_this if area_this else 0
+    price_m2_last = month_total(last_month, 'total_price') / area_last if area_last else 0
+    
+    avg_value = total_price / total_deals if total_deals else 0
+    value_this = month_total(this_month, 'total_price') / deals_this_month if deals_this_month else 0
+    value_last = month_total(last_month, 'total_price') / deals_last_month if deals_last_month else 0
+    
+    month_share = deals_this_month / total_deals * 100 if total_deals else 0
+    
+    return [
+        _kpi_card("🏢", "إجمالي الصفقات", f"{stats['region'].nunique()} منطقة",
+                  f"{total_deals:,}", "#10B981", 100 if total_deals else 0),
+        _kpi_card("📈", "صفقات هذا الشهر", _format_change(deals_this_month, deals_last_month),
+                  f"{deals_this_month:,}", "#3B82F6", month_share),
+        _kpi_card("📐", "متوسط سعر المتر", _format_change(price_m2_this, price_m2_last),
+                  f"{avg_price_m2:,.0f}", "#F59E0B",
+                  min(price_m2_this / avg_price_m2 * 50, 100) if avg_price_m2 else 0),
+        _kpi_card("💰", "متوسط القيمة", _format_change(value_this, value_last),
+                  _format_amount(avg_value), "#8B5CF6",
+                  min(value_this / avg_value * 50, 100) if avg_value else 0),
+    ]
+
+def render_kpi_cards():
+    """عرض مؤشرات الأداء الرئيسية"""
     
-    with col3:
-        st.markdown("""
-        <div class="dashboard-card">
-            <div class="card-header">
-                <div class="card-icon">⭐</div>
-                <div>
-                    <h3 class="card-title">متوسط الثقة</h3>
-                    <p class="card-subtitle">+5% عن الشهر الماضي</p>
-                </div>
-            </div>
-            <div class="card-value">87%</div>
-            <div class="card-progress">
-                <div style="background: #F59E0B; height: 6px; border-radius: 3px; width: 87%;"></div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+    cards = _cached('kpi_cards', build_kpi_cards)
     
-    with col4:
-        st.markdown("""
-        <div class="dashboard-card">
-            <div class="card-header">
-                <div class="card-icon">💰</div>
-                <div>
-                    <h3 class="card-title">متوسط القيمة</h3>
-                    <p class="card-subtitle">+3% عن الشهر الماضي</p>
-                </div>
-            </div>
-            <div class="card-value">425K</div>
-            <div class="card-progress">
-                <div style="background: #8B5CF6; height: 6px; border-radius: 3px; width: 45%;"></div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+    for col, card in zip(st.columns(4), cards):
+        with col:
+            st.markdown(card, unsafe_allow_html=True)
 
-def render_evaluation_chart():
-    """عرض مخطط التقييمات"""
+def build_evaluation_chart():
+    """بناء مخطط الصفقات الشهري (JSON) من ملخص الصفقات"""
     
-    st.markdown("""
-    <div class="chart-container">
-        <h3>📈 توزيع التقييمات الشهري</h3>
-    """, unsafe_allow_html=True)
+    stats = _cached_deal_stats()
     
-    # بيانات نموذجية
-    months = ['يناير', 'فبراير', 'مارس', 'أبريل', 'مايو', 'يونيو']
-    evaluations = [120, 145, 180, 165, 210, 195]
-    confidence = [82, 85, 87, 84, 89, 87]
+    # آخر ستة أشهر من الملخص
+    month_keys = []
+    month = datetime.now()
+    for _ in range(6):
+        month_keys.insert(0, _month_key(month))
+        month = _previous_month(month)
+    monthly = (stats.groupby('month')[['deal_count', 'total_area', 'total_price']].sum()
+               .reindex(month_keys, fill_value=0))
+    
+    months = [ARABIC_MONTHS[int(key[5:]) - 1] for key in month_keys]
+    evaluations = monthly['deal_count'].tolist()
+    price_m2 = (monthly['total_price'] / monthly['total_area'].where(monthly['total_area'] > 0)).round(0)
     
     fig = go.Figure()
     
     fig.add_trace(go.Bar(
         x=months,
         y=evaluations,
-        name='عدد التقييمات',
+        name='عدد الصفقات',
         marker_color='#1E3A8A',
         opacity=0.8
     ))
     
     fig.add_trace(go.Scatter(
         x=months,
-        y=confidence,
-        name='نسبة الثقة %',
+        y=price_m2.tolist(),
+        name='متوسط سعر المتر',
         yaxis='y2',
         mode='lines+markers',
         line=dict(color='#F59E0B', width=3),
@@ -159,14 +230,13 @@ def render_evaluation_chart():
             x=1
         ),
         yaxis=dict(
-            title="عدد التقييمات",
+            title="عدد الصفقات",
             gridcolor='#E2E8F0'
         ),
         yaxis2=dict(
-            title="نسبة الثقة %",
+            title="متوسط سعر المتر",
             overlaying='y',
             side='right',
-            range=[75, 95],
             gridcolor='#E2E8F0'
         ),
         xaxis=dict(
@@ -174,22 +244,35 @@ def render_evaluation_chart():
         )
     )
     
-    st.plotly_chart(fig, use_container_width=True)
-    
-    st.markdown("</div>", unsafe_allow_html=True)
+    return fig.to_json()
 
-def render_deals_by_region():
-    """عرض الصفقات حسب المنطقة"""
+def render_evaluation_chart():
+    """عرض مخطط الصفقات الشهري"""
     
     st.markdown("""
     <div class="chart-container">
-        <h3>🗺️ توزيع الصفقات حسب المنطقة</h3>
+        <h3>📈 توزيع الصفقات الشهري</h3>
     """, unsafe_allow_html=True)
     
-    # بيانات نموذجية
-    regions = ['الرياض', 'جدة', 'الدمام', 'مكة', 'المدينة', 'الشرقية']
-    deals = [320, 280, 210, 180, 150, 105]
-    colors = ['#1E3A8A', '#2563EB', '#3B82F6', '#60A5FA', '#93C5FD', '#BFDBFE']
+    fig_json = _cached('evaluation_chart', build_evaluation_chart)
+    st.plotly_chart(json.loads(fig_json), use_container_width=True)
+    
+    st.markdown("</div>", unsafe_allow_html=True)
+
+def build_deals_by_region():
+    """بناء مخطط توزيع الصفقات حسب المنطقة (JSON)، أو نص فارغ عند عدم وجود صفقات"""
+    
+    stats = _cached_deal_stats()
+    
+    by_region = (stats.assign(region=stats['region'].replace('', UNKNOWN_REGION))
+                 .groupby('region')['deal_count'].sum().sort_values(ascending=False))
+    if by_region.empty:
+        return ''
+    
+    regions = by_region.index.tolist()
+    deals = by_region.tolist()
+    palette = ['#1E3A8A', '#2563EB', '#3B82F6', '#60A5FA', '#93C5FD', '#BFDBFE']
+    colors = [palette[i % len(palette)] for i in range(len(regions))]
     
     fig = go.Figure(data=[go.Pie(
         labels=regions,
@@ -214,10 +297,39 @@ def render_deals_by_region():
         )]
     )
     
-    st.plotly_chart(fig, use_container_width=True)
+    return fig.to_json()
+
+def render_deals_by_region():
+    """عرض الصفقات حسب المنطقة"""
+    
+    st.markdown("""
+    <div class="chart-container">
+        <h3>🗺️ توزيع الصفقات حسب المنطقة</h3>
+    """, unsafe_allow_html=True)
+    
+    fig_json = _cached('deals_by_region', build_deals_by_region)
+    if fig_json:
+        st.plotly_chart(json.loads(fig_json), use_container_width=True)
+    else:
+        st.info("لا توجد صفقات مسجلة بعد")
     
     st.markdown("</div>", unsafe_allow_html=True)
 
+def build_recent_evaluations():
+    """جدول آخر الصفقات المسجلة"""
+    try:
+        deals = get_recent_deals(5)
+    except Exception as e:
+        print(f"Error loading recent deals: {e}")
+        deals = []
+    return pd.DataFrame({
+        'العنوان': [d['location'] or d['district'] or f"#{d['id']}" for d in deals],
+        'النوع': [d['property_type'] or UNKNOWN_REGION for d in deals],
+        'القيمة': [f"{d['price'] or 0:,.0f} ر.س" for d in deals],
+        'سعر المتر': [round(d['price'] / d['area']) if d['price'] and d['area'] else 0 for d in deals],
+        'التاريخ': pd.to_datetime([d['deal_date'] for d in deals], errors='coerce'),
+    })
+
 def render_recent_evaluations():
     """عرض آخر التقييمات"""
     
@@ -226,16 +338,7 @@ def render_recent_evaluations():
         <h3>🕒 آخر التقييمات</h3>
     """, unsafe_allow_html=True)
     
-    # بيانات نموذجية
-    data = {
-        'العنوان': ['حي النخيل - الرياض', 'حي الياسمين - جدة', 'حي الربيع - الدمام'],
-        'النوع': ['سكني', 'تجاري', 'مكتبي'],
-        'القيمة': ['450,000 ر.س', '320,000 ر.س', '280,000 ر.س'],
-        'الثقة': ['92%', '85%', '88%'],
-        'التاريخ': ['2024-01-15', '2024-01-14', '2024-01-13']
-    }
-    
-    df = pd.DataFrame(data)
+    df = _cached('recent_evaluations', build_recent_evaluations)
     
     # تنسيق الجدول
     st.dataframe(
@@ -244,13 +347,7 @@ def render_recent_evaluations():
             "العنوان": st.column_config.TextColumn("العنوان", width="medium"),
             "النوع": st.column_config.TextColumn("النوع", width="small"),
             "القيمة": st.column_config.TextColumn("القيمة", width="small"),
-            "الثقة": st.column_config.ProgressColumn(
-                "الثقة",
-                format="%f%%",
-                min_value=0,
-                max_value=100,
-                width="small"
-            ),
+            "سعر المتر": st.column_config.NumberColumn("سعر المتر", format="%d", width="small"),
             "التاريخ": st.column_config.DateColumn("التاريخ")
         },
         hide_index=True,
@@ -1,17 +1,172 @@
 import sqlite3
 import json
+import math
 import os
+import queue
+import threading
+from concurrent.futures import Future
 from datetime import datetime
+import numpy as np
+import pandas as pd
+from modules import districts, geo
 
 # التأكد من وجود مجلد البيانات لتجنب الأخطاء
 if not os.path.exists('data'):
     os.makedirs('data')
 
 DB_PATH = 'data/system.db'
+EQUATIONS_JSON_PATH = 'data/equations.json'  # التخزين القديم للمعادلات (يُنقل إلى SQLite في الترحيل 7)
 
-def init_db():
-    """تهيئة قاعدة البيانات وإنشاء الجداول"""
-    conn = sqlite3.connect(DB_PATH)
+# إعدادات الاتصال المشترك: اتصال طويل العمر لكل خيط (Thread) بدل فتح وإغلاق
+# اتصال جديد في كل دالة، مع وضع WAL لتقليل أخطاء "database is locked"
+DB_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -20000),        # ~20MB لكل اتصال
+    ('mmap_size', 268435456),      # 256MB
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', 5000),
+)
+STATEMENT_CACHE_SIZE = 256
+WRITE_BATCH_SIZE = 256         # أقصى عدد عمليات كتابة في معاملة واحدة
+WRITE_TIMEOUT = 30             # ثوانٍ لانتظار نتيجة عملية الكتابة
+BULK_CHUNK_SIZE = 2000         # عدد الصفوف في كل executemany عند الإدخال الجماعي
+
+_local = threading.local()
+
+# أعمدة جدول الصفقات القابلة للإدخال (ترتيبها هو ترتيب معاملات جملة الإدخال)
+DEAL_COLUMNS = (
+    'property_type', 'location', 'area', 'price', 'deal_date',
+    'latitude', 'longitude', 'activity_type', 'notes', 'district'
+)
+
+# الاستعلامات الثابتة (نص ثابت يضمن إعادة استخدام الجمل المُجهّزة من ذاكرة sqlite3)
+INSERT_DEAL_SQL = f'''INSERT INTO deals 
+                   ({', '.join(DEAL_COLUMNS)})
+                   VALUES ({', '.join('?' * len(DEAL_COLUMNS))})'''
+SELECT_SETTING_SQL = 'SELECT value FROM settings WHERE key = ?'
+UPSERT_SETTING_SQL = '''INSERT OR REPLACE INTO settings (key, value, updated_at) 
+                     VALUES (?, ?, ?)'''
+
+def _open_connection(path):
+    """فتح اتصال جديد وتطبيق إعدادات الأداء عليه"""
+    conn = sqlite3.connect(path, timeout=30, cached_statements=STATEMENT_CACHE_SIZE)
+    for pragma, value in DB_PRAGMAS:
+        conn.execute(f'PRAGMA {pragma} = {value}')
+    return conn
+
+def get_connection(path=None):
+    """الحصول على الاتصال المشترك للخيط الحالي (يُنشأ مرة واحدة ثم يعاد استخدامه)"""
+    path = path or DB_PATH
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = connections[path] = _open_connection(path)
+    return conn
+
+def close_connection(path=None):
+    """إغلاق اتصال الخيط الحالي (مفيد عند تغيير مسار قاعدة البيانات)"""
+    connections = getattr(_local, 'connections', {})
+    conn = connections.pop(path or DB_PATH, None)
+    if conn is not None:
+        conn.close()
+
+class DBWriter:
+    """خيط كتابة وحيد يملك جميع عمليات الكتابة على قاعدة البيانات
+
+    تُرسل العمليات إلى طابور، ويجمعها الخيط في معاملة واحدة (Group Commit)
+    ثم يعيد النتيجة لكل جلسة عبر Future. القراءة تبقى متوازية بفضل وضع WAL.
+    إذا فشلت عملية داخل الدفعة تُعاد عمليات الدفعة كلٌّ في معاملة مستقلة.
+    """
+
+    def __init__(self, path, batch_size=WRITE_BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.stats = {'jobs': 0, 'batches': 0, 'errors': 0}
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args):
+        """إرسال عملية كتابة func(conn, *args) وإرجاع Future بنتيجتها"""
+        future = Future()
+        self._queue.put((func, args, future))
+        return future
+
+    def _next_batch(self):
+        """انتظار أول عملية ثم سحب ما تراكم في الطابور حتى حجم الدفعة"""
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _execute(self, conn, jobs):
+        """تنفيذ مجموعة عمليات في معاملة واحدة؛ أي خطأ يتراجع عن المعاملة كاملة"""
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            results = [(future, func(conn, *args), None) for func, args, future in jobs]
+            conn.execute('COMMIT')
+            return results
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+
+    def _run(self):
+        conn = _open_connection(self.path)
+        conn.isolation_level = None  # إدارة المعاملات يدوياً
+        while True:
+            batch = self._next_batch()
+            try:
+                results = self._execute(conn, batch)
+            except Exception as e:
+                if len(batch) == 1:
+                    results = [(batch[0][2], None, e)]
+                else:
+                    # إعادة تنفيذ كل عملية في معاملة مستقلة حتى لا يُفشل خطأ واحد الدفعة كاملة
+                    # (أرخص من SAVEPOINT لكل عملية، والذي يبطئ تحديث فهرس R*Tree)
+                    results = []
+                    for job in batch:
+                        try:
+                            results.extend(self._execute(conn, [job]))
+                        except Exception as job_error:
+                            results.append((job[2], None, job_error))
+
+            self.stats['batches'] += 1
+            for future, result, error in results:
+                self.stats['jobs'] += 1
+                if error is not None:
+                    self.stats['errors'] += 1
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+def get_writer(path=None):
+    """الحصول على خيط الكتابة الخاص بقاعدة البيانات (يُنشأ عند أول استخدام)"""
+    path = path or DB_PATH
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None:
+            writer = _writers[path] = DBWriter(path)
+        return writer
+
+def submit_write(func, *args):
+    """إرسال عملية كتابة إلى خيط الكتابة وإرجاع Future دون انتظار"""
+    return get_writer().submit(func, *args)
+
+def run_write(func, *args):
+    """إرسال عملية كتابة وانتظار نتيجتها"""
+    return submit_write(func, *args).result(timeout=WRITE_TIMEOUT)
+
+def _create_tables(conn):
     c = conn.cursor()
     
     # 1. جدول المستخدمين
@@ -43,88 +198,565 @@ def init_db():
                   activity_type TEXT,
                   notes TEXT,
                   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    
-    conn.commit()
-    conn.close()
+
+def init_db():
+    """تهيئة قاعدة البيانات وإنشاء الجداول (عبر خيط الكتابة مثل بقية عمليات الكتابة)"""
+    run_write(_create_tables)
     ensure_settings() # التأكد من وجود القيم الافتراضية
+    run_migrations()  # تطبيق ترحيلات المخطط (الفهارس والأعمدة الجديدة)
+
+DEFAULT_SETTINGS = [
+    ('system_name', 'نظام العقارات البلدية'),
+    ('version', '2.0.0'),
+    ('default_language', 'ar'),
+    ('currency', 'ريال سعودي'),
+    ('area_unit', 'متر مربع'),
+    ('mult_temp', '0.85'),
+    ('mult_long', '1.60'),
+    ('construction_cost_m2', '3500')
+]
+
+def _insert_default_settings(conn):
+    """إدخال الإعدادات الناقصة فقط وإرجاع عدد الصفوف المضافة"""
+    before = conn.total_changes
+    conn.executemany('INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)', DEFAULT_SETTINGS)
+    return conn.total_changes - before
 
 def ensure_settings():
-    """تأكيد وجود الإعدادات الأساسية"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    default_settings = [
-        ('system_name', 'نظام العقارات البلدية'),
-        ('version', '2.0.0'),
-        ('default_language', 'ar'),
-        ('currency', 'ريال سعودي'),
-        ('area_unit', 'متر مربع'),
-        ('mult_temp', '0.85'),
-        ('mult_long', '1.60'),
-        ('construction_cost_m2', '3500')
-    ]
-    
-    for key, value in default_settings:
-        c.execute('INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)', (key, value))
-    
-    conn.commit()
-    conn.close()
+    """تأكيد وجود الإعدادات الأساسية (لا تُبطل نسخة الإعدادات إلا عند إضافة قيم فعلاً)"""
+    if run_write(_insert_default_settings):
+        invalidate_settings_cache()
+
+# --- ترحيلات مخطط قاعدة البيانات ---
+# كل ترحيل: (رقم الإصدار، الوصف، قائمة خطوات). الخطوة إما جملة SQL أو دالة تستقبل الاتصال.
+# لا تُعدّل ترحيلاً سبق تطبيقه؛ أضف ترحيلاً جديداً برقم أعلى.
+
+def _add_column(table, column, declaration):
+    """خطوة ترحيل تضيف عموداً إذا لم يكن موجوداً"""
+    def step(conn):
+        existing = {row[1] for row in conn.execute(f'PRAGMA table_xinfo({table})')}
+        if column not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+    return step
+
+def _import_equations_json(conn):
+    """نقل المعادلات من ملف JSON القديم (إن وُجد) إلى جدول equations كإصدار أول"""
+    if not os.path.exists(EQUATIONS_JSON_PATH):
+        return
+    try:
+        with open(EQUATIONS_JSON_PATH, 'r', encoding='utf-8') as f:
+            categories = json.load(f)
+    except Exception as e:
+        print(f"Error reading {EQUATIONS_JSON_PATH}: {e}")
+        return
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    rows = [(f"{category}_{name}", category, data.get('name', category), name, formula, now)
+            for category, data in categories.items()
+            for name, formula in data.get('equations', {}).items()]
+    conn.executemany('''INSERT OR IGNORE INTO equations
+                        (id, category, category_label, name, formula, version, updated_at)
+                        VALUES (?, ?, ?, ?, ?, 1, ?)''', rows)
+    conn.execute('''INSERT OR IGNORE INTO equation_history (equation_id, version, formula, action, changed_at)
+                    SELECT id, version, formula, 'import', updated_at FROM equations''')
+
+def _deal_stats_key(row):
+    """مفتاح خلية الملخص لصف من جدول الصفقات (الشهر، نوع العقار، المنطقة)"""
+    return (f"COALESCE(strftime('%Y-%m', {row}.deal_date), strftime('%Y-%m', {row}.created_at), ''), "
+            f"COALESCE({row}.property_type, ''), COALESCE({row}.district, '')")
+
+def _deal_stats_apply(row, sign):
+    """جملة SQL تضيف (+) أو تطرح (-) صفاً من خلية الملخص المقابلة له"""
+    return f'''INSERT INTO deal_stats (month, property_type, region, deal_count, total_area, total_price)
+               VALUES ({_deal_stats_key(row)}, {sign}1, {sign}COALESCE({row}.area, 0), {sign}COALESCE({row}.price, 0))
+               ON CONFLICT (month, property_type, region) DO UPDATE SET
+                   deal_count = deal_count + excluded.deal_count,
+                   total_area = total_area + excluded.total_area,
+                   total_price = total_price + excluded.total_price;'''
+
+def _price_change(row, sign):
+    """جملة SQL تسجل صفاً (له موقع وسعر متر) في سجل تغييرات خلايا سعر المتر"""
+    return f'''INSERT INTO price_cell_changes (latitude, longitude, price_per_m2, sign)
+               SELECT {row}.latitude, {row}.longitude, {row}.price_per_m2, {sign}
+               WHERE {row}.latitude IS NOT NULL AND {row}.longitude IS NOT NULL AND {row}.price_per_m2 > 0;'''
+
+MIGRATIONS = [
+    (1, 'فهارس مسارات الوصول الشائعة لجدول الصفقات', [
+        'CREATE INDEX IF NOT EXISTS idx_deals_type_date ON deals (property_type, deal_date)',
+        'CREATE INDEX IF NOT EXISTS idx_deals_activity_date ON deals (activity_type, deal_date)',
+        'CREATE INDEX IF NOT EXISTS idx_deals_date ON deals (deal_date)',
+        'CREATE INDEX IF NOT EXISTS idx_deals_lat_lng ON deals (latitude, longitude)',
+    ]),
+    (2, 'عمود الحي وسعر المتر المحسوب', [
+        _add_column('deals', 'district', 'TEXT'),
+        # SQLite لا يسمح بإضافة عمود STORED عبر ALTER TABLE دون إعادة بناء الجدول،
+        # لذا يُضاف كعمود VIRTUAL وتُخزَّن قيمته فعلياً داخل الفهرس
+        _add_column('deals', 'price_per_m2',
+                    'REAL GENERATED ALWAYS AS (CASE WHEN area > 0 THEN price / area END) VIRTUAL'),
+        'CREATE INDEX IF NOT EXISTS idx_deals_district_type ON deals (district, property_type)',
+        'CREATE INDEX IF NOT EXISTS idx_deals_type_ppm2 ON deals (property_type, price_per_m2)',
+    ]),
+    (3, 'فهرس مكاني R*Tree لمواقع الصفقات', [
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS deals_rtree
+           USING rtree(id, min_lat, max_lat, min_lng, max_lng)''',
+        '''CREATE TRIGGER IF NOT EXISTS deals_rtree_ai AFTER INSERT ON deals
+           WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL BEGIN
+               INSERT INTO deals_rtree VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS deals_rtree_au AFTER UPDATE OF latitude, longitude ON deals BEGIN
+               DELETE FROM deals_rtree WHERE id = OLD.id;
+               INSERT INTO deals_rtree SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+               WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS deals_rtree_ad AFTER DELETE ON deals BEGIN
+               DELETE FROM deals_rtree WHERE id = OLD.id;
+           END''',
+        '''INSERT OR REPLACE INTO deals_rtree
+           SELECT id, latitude, latitude, longitude, longitude FROM deals
+           WHERE latitude IS NOT NULL AND longitude IS NOT NULL''',
+    ]),
+    (4, 'جدول ملخص الصفقات (شهر × نوع العقار × المنطقة) محدَّث بالمشغلات', [
+        '''CREATE TABLE IF NOT EXISTS deal_stats
+           (month TEXT NOT NULL,
+            property_type TEXT NOT NULL,
+            region TEXT NOT NULL,
+            deal_count INTEGER NOT NULL DEFAULT 0,
+            total_area REAL NOT NULL DEFAULT 0,
+            total_price REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (month, property_type, region))''',
+        f'''CREATE TRIGGER IF NOT EXISTS deal_stats_ai AFTER INSERT ON deals BEGIN
+               {_deal_stats_apply('NEW', '+')}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS deal_stats_au
+           AFTER UPDATE OF deal_date, created_at, property_type, district, area, price ON deals BEGIN
+               {_deal_stats_apply('OLD', '-')}
+               {_deal_stats_apply('NEW', '+')}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS deal_stats_ad AFTER DELETE ON deals BEGIN
+               {_deal_stats_apply('OLD', '-')}
+           END''',
+        'DELETE FROM deal_stats',
+        f'''INSERT INTO deal_stats (month, property_type, region, deal_count, total_area, total_price)
+           SELECT {_deal_stats_key('deals')}, COUNT(*), TOTAL(area), TOTAL(price)
+           FROM deals GROUP BY 1, 2, 3''',
+    ]),
+    (5, 'عدادات إصدار البيانات لمفاتيح التخزين المؤقت', [
+        '''CREATE TABLE IF NOT EXISTS data_versions
+           (name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0)''',
+        "INSERT OR IGNORE INTO data_versions (name, version) VALUES ('deals', 0)",
+        *[f'''CREATE TRIGGER IF NOT EXISTS deals_version_{suffix} AFTER {event} ON deals BEGIN
+                UPDATE data_versions SET version = version + 1 WHERE name = 'deals';
+            END''' for suffix, event in (('ai', 'INSERT'), ('au', 'UPDATE'), ('ad', 'DELETE'))],
+    ]),
+    (6, 'عدادات استخدام المعادلات وزمن تقييمها', [
+        '''CREATE TABLE IF NOT EXISTS equation_usage
+           (equation TEXT PRIMARY KEY,
+            usage_count INTEGER NOT NULL DEFAULT 0,
+            total_ms REAL NOT NULL DEFAULT 0,
+            last_used TIMESTAMP)''',
+        # مدرج تكراري لأزمنة التقييم (رقم الفئة من حدود equation_stats.LATENCY_BUCKETS_MS)
+        '''CREATE TABLE IF NOT EXISTS equation_latency
+           (equation TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (equation, bucket))''',
+    ]),
+    (7, 'تخزين المعادلات في جدول بإصدارات بدل ملف JSON', [
+        '''CREATE TABLE IF NOT EXISTS equations
+           (id TEXT PRIMARY KEY,
+            category TEXT NOT NULL,
+            category_label TEXT,
+            name TEXT NOT NULL,
+            formula TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 1,
+            updated_at TIMESTAMP,
+            UNIQUE (category, name))''',
+        'CREATE INDEX IF NOT EXISTS idx_equations_name ON equations (name)',
+        '''CREATE TABLE IF NOT EXISTS equation_history
+           (equation_id TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            formula TEXT,
+            action TEXT NOT NULL,
+            changed_at TIMESTAMP,
+            PRIMARY KEY (equation_id, version))''',
+        _import_equations_json,
+    ]),
+    (8, 'ذاكرة نتائج الترميز الجغرافي للعناوين', [
+        '''CREATE TABLE IF NOT EXISTS geocode_cache
+           (query TEXT PRIMARY KEY,
+            address TEXT,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            label TEXT,
+            kind TEXT,
+            source TEXT,
+            hits INTEGER NOT NULL DEFAULT 0,
+            last_used REAL NOT NULL)''',
+        'CREATE INDEX IF NOT EXISTS idx_geocode_cache_last_used ON geocode_cache (last_used)',
+    ]),
+    (9, 'خلايا سعر المتر لطبقة الخريطة الحرارية مع سجل تغييرات الصفقات', [
+        # مدرج تكراري لسعر المتر في كل خلية Geohash لكل دقة (فئات لوغاريتمية من price_heatmap)
+        '''CREATE TABLE IF NOT EXISTS price_cells
+           (precision INTEGER NOT NULL,
+            cell TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            deal_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (precision, cell, bucket)) WITHOUT ROWID''',
+        # الصفقات المضافة (+1) أو المحذوفة (-1) منذ آخر تحديث للخلايا؛ التعديل = حذف القديم وإضافة الجديد
+        '''CREATE TABLE IF NOT EXISTS price_cell_changes
+           (seq INTEGER PRIMARY KEY,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            price_per_m2 REAL NOT NULL,
+            sign INTEGER NOT NULL)''',
+        *[f'''CREATE TRIGGER IF NOT EXISTS price_cells_{suffix} {event} ON deals BEGIN
+                {body}
+            END''' for suffix, event, body in (
+            ('ai', 'AFTER INSERT', _price_change('NEW', 1)),
+            ('au', 'AFTER UPDATE OF latitude, longitude, area, price', _price_change('OLD', -1) + _price_change('NEW', 1)),
+            ('ad', 'AFTER DELETE', _price_change('OLD', -1)),
+        )],
+        '''INSERT INTO price_cell_changes (latitude, longitude, price_per_m2, sign)
+           SELECT latitude, longitude, price_per_m2, 1 FROM deals
+           WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND price_per_m2 > 0''',
+    ]),
+    (10, 'حذف نتائج دليل الأماكن المخزنة قبل حصر المطابقة في المدينة المذكورة', [
+        # قد تحتوي حياً بالاسم نفسه من مدينة أخرى؛ إعادة حلها من الدليل المحلي رخيصة
+        "DELETE FROM geocode_cache WHERE source = 'gazetteer'",
+    ]),
+    (11, 'عدادات استخدام المعادلات بمعرف المعادلة بدل اسمها', [
+        *[f'''UPDATE OR IGNORE {table} SET equation =
+                (SELECT id FROM equations e WHERE e.name = {table}.equation ORDER BY e.rowid LIMIT 1)
+            WHERE equation IN (SELECT name FROM equations)''' for table in ('equation_usage', 'equation_latency')],
+    ]),
+    (12, 'حذف مراكز المدن المخزنة بديلاً لعناوين لم يُعرف حيها', [
+        # لا يمكن تمييز البديل عن عنوان المدينة وحدها، وإعادة حل الأخير من الدليل المحلي رخيصة
+        "DELETE FROM geocode_cache WHERE source = 'gazetteer' AND kind = 'city'",
+    ]),
+]
+
+def get_schema_version(conn=None):
+    """إصدار المخطط الحالي المحفوظ في جدول الإعدادات"""
+    conn = conn or get_connection()
+    row = conn.execute(SELECT_SETTING_SQL, ('schema_version',)).fetchone()
+    return int(row[0]) if row else 0
+
+def _apply_migration(conn, version, steps):
+    # إعادة فحص الإصدار داخل المعاملة لتجنب التطبيق المزدوج من عمليتين متزامنتين
+    if get_schema_version(conn) >= version:
+        return False
+    for step in steps:
+        if callable(step):
+            step(conn)
+        else:
+            conn.execute(step)
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    conn.execute(UPSERT_SETTING_SQL, ('schema_version', str(version), now))
+    return True
+
+def run_migrations():
+    """تطبيق الترحيلات غير المطبقة بالترتيب (آمنة للتكرار عند كل تشغيل)"""
+    current = get_schema_version()
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        if version <= current:
+            continue
+        if run_write(_apply_migration, version, steps):
+            applied.append(version)
+            print(f"Applied migration {version}: {description}")
+    if applied:
+        invalidate_settings_cache()
+    return applied
+
+def _deal_params(deal_data):
+    """تحويل بيانات الصفقة إلى معاملات جملة الإدخال"""
+    params = [deal_data.get(col) for col in DEAL_COLUMNS]
+    params[DEAL_COLUMNS.index('price')] = deal_data.get('price', 0.0)
+    return tuple(params)
+
+_LAT, _LNG, _DISTRICT = (DEAL_COLUMNS.index(col) for col in ('latitude', 'longitude', 'district'))
+
+def _with_districts(rows):
+    """تعيين الحي من طبقة المضلعات للصفوف التي لها إحداثيات دون حي (دفعة متجهة واحدة)"""
+    missing = [i for i, row in enumerate(rows)
+               if row[_DISTRICT] is None and row[_LAT] is not None and row[_LNG] is not None]
+    if not missing:
+        return rows
+    names = districts.assign_districts(np.array([rows[i][_LAT] for i in missing], dtype=float),
+                                       np.array([rows[i][_LNG] for i in missing], dtype=float))
+    for i, name in zip(missing, names):
+        if name is not None:
+            rows[i] = rows[i][:_DISTRICT] + (name,) + rows[i][_DISTRICT + 1:]
+    return rows
+
+def _insert_deal(conn, params):
+    return conn.execute(INSERT_DEAL_SQL, params).lastrowid
+
+def add_deal_async(deal_data):
+    """إرسال صفقة إلى خيط الكتابة وإرجاع Future برقمها"""
+    return submit_write(_insert_deal, _with_districts([_deal_params(deal_data)])[0])
 
 def add_deal(deal_data):
     """إضافة صفقة أو موقع جديد من الخريطة إلى قاعدة البيانات"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        
-        query = '''INSERT INTO deals 
-                   (property_type, location, area, price, deal_date, latitude, longitude, activity_type, notes)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'''
-        
-        params = (
-            deal_data.get('property_type'),
-            deal_data.get('location'),
-            deal_data.get('area'),
-            deal_data.get('price', 0.0),
-            deal_data.get('deal_date'),
-            deal_data.get('latitude'),
-            deal_data.get('longitude'),
-            deal_data.get('activity_type'),
-            deal_data.get('notes')
-        )
-        
-        c.execute(query, params)
-        deal_id = c.lastrowid
-        conn.commit()
-        conn.close()
-        return deal_id
+        return add_deal_async(deal_data).result(timeout=WRITE_TIMEOUT)
     except Exception as e:
         print(f"Error in add_deal: {e}")
         return None
 
+def _insert_deals(conn, rows):
+    conn.executemany(INSERT_DEAL_SQL, rows)
+    return len(rows)
+
+def add_deals_bulk(deals, chunk_size=BULK_CHUNK_SIZE):
+    """إدخال جماعي لصفقات من أي iterable أو generator على دفعات executemany
+
+    تُقرأ الصفقات دفعة بدفعة، فلا تُحمّل كاملة في الذاكرة، وتُحضّر الدفعة التالية
+    أثناء كتابة السابقة في خيط الكتابة. تُرجع عدد الصفوف المُدخلة.
+    """
+    inserted = 0
+    pending = None
+    chunk = []
+    for deal in deals:
+        chunk.append(_deal_params(deal))
+        if len(chunk) >= chunk_size:
+            rows = _with_districts(chunk)
+            if pending is not None:
+                inserted += pending.result(timeout=WRITE_TIMEOUT)
+            pending = submit_write(_insert_deals, rows)
+            chunk = []
+    if chunk:
+        rows = _with_districts(chunk)
+        if pending is not None:
+            inserted += pending.result(timeout=WRITE_TIMEOUT)
+        pending = submit_write(_insert_deals, rows)
+    if pending is not None:
+        inserted += pending.result(timeout=WRITE_TIMEOUT)
+    return inserted
+
+def _update_districts(conn, rows):
+    conn.executemany('UPDATE deals SET district = ? WHERE id = ?', rows)
+    return len(rows)
+
+def assign_deal_districts(only_missing=True, chunk_size=BULK_CHUNK_SIZE):
+    """تعيين حي الصفقات المخزنة من طبقة المضلعات (بعد تحديث طبقة الأحياء أو لبيانات قديمة)
+
+    تُحسب الأحياء لجميع الصفقات في تمرير متجه واحد ثم تُكتب التغييرات فقط على دفعات.
+    تُرجع عدد الصفقات المحدثة.
+    """
+    query = 'SELECT id, latitude, longitude, district FROM deals WHERE latitude IS NOT NULL AND longitude IS NOT NULL'
+    if only_missing:
+        query += ' AND district IS NULL'
+    rows = get_connection().execute(query).fetchall()
+    if not rows:
+        return 0
+    ids, lats, lngs, current = zip(*rows)
+    names = districts.assign_districts(np.array(lats, dtype=float), np.array(lngs, dtype=float))
+    changes = [(name, deal_id) for deal_id, name, old in zip(ids, names, current)
+               if name is not None and name != old]
+    updated = 0
+    for i in range(0, len(changes), chunk_size):
+        updated += run_write(_update_districts, changes[i:i + chunk_size])
+    return updated
+
+# --- الاستعلامات المكانية على الصفقات (عبر فهرس deals_rtree) ---
+
+DEAL_FILTER_COLUMNS = ('property_type', 'activity_type', 'district')
+
+def _filters_sql(filters):
+    """تحويل المرشحات إلى شروط SQL (أعمدة محددة مسبقاً فقط + نطاق التاريخ)"""
+    clauses, params = [], []
+    for key, value in (filters or {}).items():
+        if value is None:
+            continue
+        if key in DEAL_FILTER_COLUMNS:
+            if isinstance(value, (list, tuple, set)):
+                clauses.append(f"d.{key} IN ({', '.join('?' * len(value))})")
+                params.extend(value)
+            else:
+                clauses.append(f"d.{key} = ?")
+                params.append(value)
+        elif key == 'date_from':
+            clauses.append("d.deal_date >= ?")
+            params.append(str(value))
+        elif key == 'date_to':
+            clauses.append("d.deal_date <= ?")
+            params.append(str(value))
+        else:
+            raise ValueError(f"مرشح غير مدعوم: {key}")
+    return ''.join(f" AND {c}" for c in clauses), params
+
+def _rows_to_dicts(cursor):
+    columns = [col[0] for col in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def _bbox_cursor(south, west, north, east, filters=None, limit=None, columns='d.*'):
+    where, params = _filters_sql(filters)
+    # R*Tree يخزن القيم بدقة float32 (مقرّبة للخارج)، لذلك يُستخدم للترشيح الأولي
+    # ثم يُطبَّق الشرط الدقيق على أعمدة الجدول نفسها. CROSS JOIN يُلزم SQLite بالبدء
+    # من الفهرس المكاني بدل فهارس نوع العقار عند وجود مرشحات
+    query = f'''SELECT {columns} FROM deals_rtree r CROSS JOIN deals d ON d.id = r.id
+                WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lng >= ? AND r.min_lng <= ?
+                  AND d.latitude BETWEEN ? AND ? AND d.longitude BETWEEN ? AND ?{where}'''
+    args = [south, north, west, east, south, north, west, east] + params
+    if limit is not None:
+        query += ' LIMIT ?'
+        args.append(int(limit))
+    return get_connection().execute(query, args)
+
+def get_deals_in_bbox(south, west, north, east, filters=None, limit=None, columns='d.*'):
+    """جلب الصفقات داخل مستطيل الإحداثيات (مثل حدود عرض الخريطة)"""
+    return _rows_to_dicts(_bbox_cursor(south, west, north, east, filters, limit, columns))
+
+# أعمدة محسوبة داخل SQLite يمكن طلبها بالاسم مع أعمدة جدول الصفقات
+DERIVED_DEAL_COLUMNS = {
+    'deal_julian': 'julianday(d.deal_date)',  # تاريخ الصفقة كرقم يوم جولياني
+}
+
+def load_deals_in_bbox(south, west, north, east, columns, filters=None, limit=None):
+    """الصفقات داخل المستطيل كـ DataFrame بأعمدة محددة (للمعالجة المتجهة دون قواميس لكل صف)
+
+    columns: أسماء أعمدة جدول الصفقات أو أسماء من DERIVED_DEAL_COLUMNS.
+    """
+    selected = ', '.join(DERIVED_DEAL_COLUMNS.get(col, f"d.{col}") for col in columns)
+    cursor = _bbox_cursor(south, west, north, east, filters, limit, selected)
+    return pd.DataFrame.from_records(cursor.fetchall(), columns=list(columns))
+
+def load_deals_by_ids(ids, columns):
+    """صفقات محددة بأرقامها كـ DataFrame بنفس ترتيب ids"""
+    ids = [int(i) for i in ids]
+    if not ids:
+        return pd.DataFrame(columns=list(columns))
+    cursor = get_connection().execute(
+        f"SELECT {', '.join(columns)} FROM deals WHERE id IN ({', '.join('?' * len(ids))})", ids)
+    frame = pd.DataFrame.from_records(cursor.fetchall(), columns=list(columns))
+    return frame.set_index('id', drop=False).loc[ids].reset_index(drop=True)
+
+def nearest_deals(lat, lng, k=10, filters=None, start_radius_km=1.0):
+    """أقرب k صفقة لنقطة معينة مع المسافة بالكيلومتر (distance_km)
+
+    يبحث في مستطيل يتوسع تدريجياً حول النقطة؛ تكون النتيجة دقيقة عندما يوجد k صفقة
+    على مسافة لا تتجاوز نصف قطر البحث لأن المستطيل يحيط بالدائرة كاملة (بنفس نصف قطر
+    الأرض المستخدم في حساب المسافة).
+    """
+    radius = start_radius_km
+    while True:
+        south, west, north, east = geo.bbox_from_radius(lat, lng, radius)
+        covers_world = radius >= math.pi * geo.EARTH_RADIUS_KM
+        if covers_world:
+            south, west, north, east = -90.0, -180.0, 90.0, 180.0
+        candidates = get_deals_in_bbox(south, west, north, east, filters)
+        if candidates:
+            dist = geo.haversine_km(lat, lng,
+                                 np.fromiter((d['latitude'] for d in candidates), float, len(candidates)),
+                                 np.fromiter((d['longitude'] for d in candidates), float, len(candidates)))
+            if covers_world or np.count_nonzero(dist <= radius) >= k:
+                order = np.argsort(dist, kind='stable')[:k]
+                result = []
+                for i in order:
+                    deal = candidates[i]
+                    deal['distance_km'] = float(dist[i])
+                    result.append(deal)
+                return result
+        elif covers_world:
+            return []
+        radius *= 4
+
+# --- ملخص الصفقات للوحة التحكم ---
+
+def get_deal_stats(since_month=None):
+    """جلب خلايا ملخص الصفقات (عدد الصفوف بعدد الخلايا وليس بعدد الصفقات)"""
+    query = '''SELECT month, property_type, region, deal_count, total_area, total_price
+               FROM deal_stats WHERE deal_count > 0'''
+    args = []
+    if since_month:
+        query += ' AND month >= ?'
+        args.append(since_month)
+    return _rows_to_dicts(get_connection().execute(query, args))
+
+def get_data_version():
+    """بصمة إصدار البيانات (تتغير مع أي إضافة أو تعديل أو حذف في الجداول المتتبعة)"""
+    rows = get_connection().execute('SELECT name, version FROM data_versions ORDER BY name').fetchall()
+    return ';'.join(f"{name}:{version}" for name, version in rows)
+
+def get_recent_deals(limit=5):
+    """آخر الصفقات المضافة"""
+    return _rows_to_dicts(get_connection().execute(
+        '''SELECT id, location, property_type, area, price, deal_date, district
+           FROM deals ORDER BY id DESC LIMIT ?''', (int(limit),)))
+
+def load_deals_frame(columns=None, filters=None):
+    """تحميل الصفقات كـ DataFrame (لتطبيق المعادلات والتحليل على البيانات كاملة)"""
+    selected = ', '.join(f"d.{col}" for col in columns) if columns else 'd.*'
+    where, params = _filters_sql(filters)
+    query = f"SELECT {selected} FROM deals d WHERE 1 = 1{where}"
+    return pd.read_sql_query(query, get_connection(), params=params)
+
 # --- الدوال المطلوبة لعمل صفحة الإدارة (Admin Panel) ---
 
+# نسخة من جدول الإعدادات في الذاكرة مشتركة بين جميع الجلسات (الخيوط) في العملية،
+# تُعاد قراءتها فقط عندما يتغير عداد الإصدار الذي ترفعه دوال الكتابة
+_settings_version = 0
+_settings_snapshot = (None, -1, {})  # (مسار قاعدة البيانات، الإصدار، القيم)
+_settings_lock = threading.Lock()
+
+def invalidate_settings_cache():
+    """رفع إصدار الإعدادات لإجبار الجلسات على إعادة قراءة النسخة عند الطلب التالي"""
+    global _settings_version
+    with _settings_lock:
+        _settings_version += 1
+
+def _load_settings():
+    """إرجاع نسخة الإعدادات الحالية (قراءة الجدول كاملاً مرة واحدة لكل إصدار)"""
+    global _settings_snapshot
+    path, version, values = _settings_snapshot
+    current = _settings_version
+    if path == DB_PATH and version == current:
+        return values
+    # يُقرأ الإصدار قبل الجدول: أي تحديث متزامن يرفع العداد فتُعاد القراءة لاحقاً
+    values = dict(get_connection().execute('SELECT key, value FROM settings').fetchall())
+    _settings_snapshot = (DB_PATH, current, values)
+    return values
+
+def _parse_setting_value(value):
+    """تحويل القيمة النصية المخزنة إلى int أو float إن أمكن"""
+    if not isinstance(value, str):
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
 def get_setting(key, default=None):
     """جلب قيمة إعداد معين من قاعدة البيانات"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('SELECT value FROM settings WHERE key = ?', (key,))
-        row = c.fetchone()
-        conn.close()
-        return row[0] if row else default
+        return _load_settings().get(key, default)
     except Exception as e:
         return default
 
+def get_settings(keys=None, defaults=None):
+    """جلب مجموعة إعدادات دفعة واحدة كقيم مُحوّلة (float/int) من نفس النسخة"""
+    defaults = defaults or {}
+    try:
+        values = _load_settings()
+    except Exception as e:
+        values = {}
+    keys = values.keys() | defaults.keys() if keys is None else keys
+    return {key: _parse_setting_value(values.get(key, defaults.get(key))) for key in keys}
+
+def _upsert_setting(conn, params):
+    conn.execute(UPSERT_SETTING_SQL, params)
+
 def update_setting(key, value):
     """تحديث أو إضافة إعداد جديد"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        c.execute('''INSERT OR REPLACE INTO settings (key, value, updated_at) 
-                     VALUES (?, ?, ?)''', (key, str(value), now))
-        conn.commit()
-        conn.close()
+        run_write(_upsert_setting, (key, str(value), now))
+        invalidate_settings_cache()
         return True
     except Exception as e:
         print(f"Error updating setting: {e}")
@@ -0,0 +1,165 @@
+"""
+استيراد الصفقات التاريخية من ملفات CSV / Excel على دفعات دون تحميل الملف كاملاً
+التشغيل من سطر الأوامر: python -m modules.deal_importer deals.xlsx
+"""
+import os
+import sys
+import time
+import pandas as pd
+from modules.db import DEAL_COLUMNS, BULK_CHUNK_SIZE, add_deals_bulk
+
+IMPORT_CHUNK_SIZE = BULK_CHUNK_SIZE
+MAX_REJECTED_ROWS = 500  # الحد الأقصى لتفاصيل الصفوف المرفوضة المحفوظة في التقرير
+
+# أسماء الأعمدة العربية الشائعة في جداول البلديات ومقابلها في جدول deals
+COLUMN_ALIASES = {
+    'نوع العقار': 'property_type',
+    'الموقع': 'location',
+    'اسم الموقع': 'location',
+    'المساحة': 'area',
+    'المساحة (م²)': 'area',
+    'السعر': 'price',
+    'القيمة': 'price',
+    'تاريخ الصفقة': 'deal_date',
+    'التاريخ': 'deal_date',
+    'خط العرض': 'latitude',
+    'خط الطول': 'longitude',
+    'النشاط': 'activity_type',
+    'نوع النشاط': 'activity_type',
+    'ملاحظات': 'notes',
+    'الحي': 'district',
+}
+
+NUMERIC_COLUMNS = ('area', 'price', 'latitude', 'longitude')
+
+def map_columns(columns):
+    """مطابقة عناوين الملف مع أعمدة جدول الصفقات"""
+    mapping = {}
+    for col in columns:
+        key = str(col).strip()
+        target = key if key in DEAL_COLUMNS else COLUMN_ALIASES.get(key)
+        if target is None:
+            target = key.lower() if key.lower() in DEAL_COLUMNS else None
+        if target is not None and target not in mapping.values():
+            mapping[col] = target
+    return mapping
+
+def iter_file_chunks(file, filename, chunk_size=IMPORT_CHUNK_SIZE):
+    """قراءة الملف على شكل DataFrames متتالية بحجم chunk_size"""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.csv':
+        yield from pd.read_csv(file, chunksize=chunk_size, dtype=str, encoding='utf-8-sig')
+    elif ext in ('.xlsx', '.xlsm'):
+        # openpyxl في وضع القراءة فقط يقرأ الصفوف تدريجياً بدل تحميل الورقة كاملة
+        from openpyxl import load_workbook
+        wb = load_workbook(file, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    yield pd.DataFrame(chunk, columns=header)
+                    chunk = []
+            if chunk:
+                yield pd.DataFrame(chunk, columns=header)
+        finally:
+            wb.close()
+    else:
+        raise ValueError(f"صيغة الملف غير مدعومة: {ext}")
+
+def clean_chunk(df, first_row=2):
+    """تنظيف دفعة من الصفوف وإرجاع (صفقات صالحة، صفوف مرفوضة)
+
+    first_row: رقم أول صف في الملف (بعد سطر العناوين) لاستخدامه في تقرير الرفض.
+    """
+    df = df.rename(columns=map_columns(df.columns))
+    df = df.reindex(columns=list(DEAL_COLUMNS))
+    row_numbers = pd.RangeIndex(first_row, first_row + len(df))
+    df.index = row_numbers
+
+    raw = df[list(NUMERIC_COLUMNS)]
+    for col in NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    df['price'] = df['price'].fillna(0.0)
+    raw_dates = df['deal_date']
+    dates = pd.to_datetime(raw_dates, errors='coerce')
+    has_date = raw_dates.notna() & (raw_dates.astype(str).str.strip() != '')
+    # الصيغة تُستنتج من أول قيمة، فتُعاد محاولة القيم الفاشلة كلٌ على حدة قبل رفضها
+    retry = has_date & dates.isna()
+    if retry.any():
+        dates[retry] = pd.to_datetime(raw_dates[retry], errors='coerce', format='mixed')
+    df['deal_date'] = dates.dt.strftime('%Y-%m-%d')
+
+    reasons = pd.Series('', index=row_numbers)
+    reasons[df['area'].isna() | (df['area'] <= 0)] = 'مساحة غير صالحة'
+    reasons[df['price'] < 0] = 'سعر سالب'
+    reasons[has_date & dates.isna()] = 'تاريخ غير صالح'
+    bad_coords = (
+        (raw['latitude'].notna() & df['latitude'].isna())
+        | (raw['longitude'].notna() & df['longitude'].isna())
+        | (df['latitude'].abs() > 90) | (df['longitude'].abs() > 180)
+    )
+    reasons[bad_coords] = 'إحداثيات غير صالحة'
+
+    rejected_mask = reasons != ''
+    rejected = [{'row': int(n), 'reason': r} for n, r in reasons[rejected_mask].items()]
+
+    valid = df[~rejected_mask].astype(object).where(df[~rejected_mask].notna(), None)
+    return valid.to_dict('records'), rejected
+
+def import_deals_file(file, filename=None, chunk_size=IMPORT_CHUNK_SIZE, progress_callback=None):
+    """استيراد ملف صفقات إلى قاعدة البيانات عبر add_deals_bulk
+
+    progress_callback(report) تُستدعى بعد كل دفعة بتقرير يحتوي على عدد الصفوف
+    المقروءة والمرفوضة والمعدل بالصف/ثانية.
+    """
+    filename = filename or getattr(file, 'name', str(file))
+    report = {'rows_read': 0, 'inserted': 0, 'rejected': 0, 'rejected_rows': [],
+              'elapsed': 0.0, 'rows_per_sec': 0.0}
+    start = time.perf_counter()
+
+    def valid_deals():
+        next_row = 2
+        for df in iter_file_chunks(file, filename, chunk_size):
+            deals, rejected = clean_chunk(df, next_row)
+            next_row += len(df)
+            report['rows_read'] += len(df)
+            report['rejected'] += len(rejected)
+            room = MAX_REJECTED_ROWS - len(report['rejected_rows'])
+            report['rejected_rows'].extend(rejected[:max(room, 0)])
+            report['elapsed'] = time.perf_counter() - start
+            report['rows_per_sec'] = report['rows_read'] / report['elapsed'] if report['elapsed'] else 0.0
+            if progress_callback:
+                progress_callback(report)
+            yield from deals
+
+    report['inserted'] = add_deals_bulk(valid_deals(), chunk_size)
+    report['elapsed'] = time.perf_counter() - start
+    report['rows_per_sec'] = report['rows_read'] / report['elapsed'] if report['elapsed'] else 0.0
+    return report
+
+def main(argv=None):
+    from modules.db import init_db
+
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("الاستخدام: python -m modules.deal_importer <ملف.csv|ملف.xlsx> ...")
+        return 1
+
+    init_db()
+    for path in argv:
+        def show(report):
+            print(f"\r{path}: {report['rows_read']:,} صف | مرفوض {report['rejected']:,} | "
+                  f"{report['rows_per_sec']:,.0f} صف/ث", end='', flush=True)
+        report = import_deals_file(path, progress_callback=show)
+        print(f"\n✅ تم إدخال {report['inserted']:,} صفقة خلال {report['elapsed']:.1f} ث")
+        for item in report['rejected_rows'][:20]:
+            print(f"  ⚠️ الصف {item['row']}: {item['reason']}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
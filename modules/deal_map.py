@@ -0,0 +1,195 @@
+"""
+طبقة الصفقات على خريطة التقييم: جلب الصفقات الواقعة داخل حدود العرض الحالية (مع هامش) عبر
+فهرس R*Tree وتجميعها في خلايا شبكة حسب مستوى التقريب (NumPy)، مع خريطة أساس مُعدة مرة واحدة لكل عملية
+"""
+import copy
+import math
+import threading
+import folium
+import numpy as np
+import pandas as pd
+import streamlit as st
+from streamlit_folium import generate_leaflet_string, st_folium
+from modules.cache import LRUCache
+from modules.db import get_data_version, load_deals_by_ids, load_deals_in_bbox
+from modules.price_heatmap import build_heatmap_layer, get_heatmap_cells
+
+MAP_CENTER = (24.7136, 46.6753)
+DEFAULT_ZOOM = 12
+DEFAULT_MAP_SIZE_PX = (800, 400)   # حجم تقريبي للخريطة قبل أن تعيد أول حدود للعرض
+TILE_SIZE_PX = 256
+CLUSTER_CELL_PX = 64               # حجم خلية التجميع على الشاشة
+MAX_MARKERS = 400                  # عند تجاوزه تُضاعف الخلية حتى يقل عدد العلامات
+VIEWPORT_PADDING = 0.5             # هامش حول حدود العرض (نسبة من أبعادها) لتقليل الجلب عند التحريك
+SNAP_CELLS = 4                     # تقريب حدود الجلب لمضاعفات الخلايا لزيادة إصابات الذاكرة
+DEAL_MAP_CACHE_ENTRIES = 256
+POINT_COLUMNS = ('id', 'latitude', 'longitude', 'price_per_m2')
+SINGLE_DEAL_COLUMNS = ('id', 'location', 'district', 'property_type')
+
+_cluster_cache = LRUCache(DEAL_MAP_CACHE_ENTRIES, sizeof=lambda _: 1)
+_base_map = None
+_base_map_lock = threading.Lock()
+
+def cell_size_deg(zoom):
+    """حجم خلية التجميع بالدرجات عند مستوى التقريب (CLUSTER_CELL_PX بكسل تقريباً)"""
+    return CLUSTER_CELL_PX * 360.0 / (TILE_SIZE_PX * 2 ** max(int(zoom), 0))
+
+def default_bounds(center=MAP_CENTER, zoom=DEFAULT_ZOOM, size_px=DEFAULT_MAP_SIZE_PX):
+    """حدود العرض التقريبية (south, west, north, east) لخريطة لم تُرسل حدودها بعد"""
+    deg_per_px = 360.0 / (TILE_SIZE_PX * 2 ** zoom)
+    half_lng = size_px[0] * deg_per_px / 2
+    half_lat = size_px[1] * deg_per_px * math.cos(math.radians(center[0])) / 2
+    return center[0] - half_lat, center[1] - half_lng, center[0] + half_lat, center[1] + half_lng
+
+def _fetch_bounds(bounds, cell):
+    """حدود الجلب: حدود العرض مع الهامش مقربة للخارج إلى شبكة ثابتة (فالخلايا على الأطراف كاملة)"""
+    south, west, north, east = bounds
+    pad_lat, pad_lng = (north - south) * VIEWPORT_PADDING, (east - west) * VIEWPORT_PADDING
+    step = cell * SNAP_CELLS
+    south = max(math.floor((south - pad_lat + 90) / step) * step - 90, -90.0)
+    north = min(math.ceil((north + pad_lat + 90) / step) * step - 90, 90.0)
+    west = max(math.floor((west - pad_lng + 180) / step) * step - 180, -180.0)
+    east = min(math.ceil((east + pad_lng + 180) / step) * step - 180, 180.0)
+    return south, west, north, east
+
+def _filters_key(filters):
+    return repr(sorted((filters or {}).items()))
+
+def _data_version():
+    try:
+        return get_data_version()
+    except Exception as e:
+        print(f"Error reading data version: {e}")
+        return None
+
+def load_points(bounds, filters=None):
+    """مواقع الصفقات وسعر المتر داخل المستطيل (عبر فهرس R*Tree) كمصفوفات NumPy"""
+    frame = load_deals_in_bbox(*bounds, POINT_COLUMNS, filters)
+    return {'id': frame['id'].to_numpy(dtype=np.int64),
+            'latitude': frame['latitude'].to_numpy(dtype=float),
+            'longitude': frame['longitude'].to_numpy(dtype=float),
+            'price_per_m2': frame['price_per_m2'].to_numpy(dtype=float)}
+
+def cluster_points(points, bounds, cell):
+    """تجميع النقاط داخل المستطيل في خلايا شبكة ثابتة (cell درجة) مبدؤها (‎-90، ‎-180)
+
+    يعيد DataFrame: deal_count ومركز الصفقات ومتوسط سعر المتر (للقيم المتوفرة) ورقم أول صفقة في الخلية.
+    """
+    south, west, north, east = bounds
+    lats, lngs = points['latitude'], points['longitude']
+    inside = (lats >= south) & (lats <= north) & (lngs >= west) & (lngs <= east)
+    lats, lngs = lats[inside], lngs[inside]
+    ids, price = points['id'][inside], points['price_per_m2'][inside]
+    if not len(lats):
+        return pd.DataFrame(columns=['deal_count', 'latitude', 'longitude', 'price_per_m2', 'id'])
+    columns = int(np.ceil(360.0 / cell)) + 1
+    codes = (np.floor((lats + 90) / cell).astype(np.int64) * columns
+             + np.floor((lngs + 180) / cell).astype(np.int64))
+    _, first, inverse, counts = np.unique(codes, return_index=True, return_inverse=True, return_counts=True)
+    priced = np.isfinite(price)
+    priced_count = np.bincount(inverse, weights=priced)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_price = np.bincount(inverse, weights=np.where(priced, price, 0.0)) / priced_count
+    return pd.DataFrame({
+        'deal_count': counts,
+        'latitude': np.bincount(inverse, weights=lats) / counts,
+        'longitude': np.bincount(inverse, weights=lngs) / counts,
+        'price_per_m2': mean_price,
+        'id': ids[first],
+    })
+
+def load_clusters(bounds, zoom, filters=None):
+    """خلايا الصفقات داخل حدود العرض عند مستوى التقريب مع بيانات الصفقات المنفردة
+
+    تُجلب صفقات حدود الجلب (حدود العرض مع الهامش) مرة واحدة، ثم تُضاعف الخلية حتى لا يتجاوز
+    عدد الخلايا MAX_MARKERS، فيبقى حجم الطبقة محدوداً مهما كثرت الصفقات.
+    """
+    cell = cell_size_deg(zoom)
+    fetch_bounds = _fetch_bounds(bounds, cell)
+    points = load_points(fetch_bounds, filters)
+    while True:
+        clusters = cluster_points(points, fetch_bounds, cell)
+        if len(clusters) <= MAX_MARKERS:
+            break
+        cell *= 2
+    single_ids = clusters.loc[clusters['deal_count'] == 1, 'id']
+    details = load_deals_by_ids(single_ids, SINGLE_DEAL_COLUMNS)
+    return clusters.merge(details, on='id', how='left')
+
+def get_clusters(bounds, zoom, filters=None):
+    """خلايا الصفقات لحدود العرض، مخزنة حسب (حدود الجلب، التقريب، المرشحات، إصدار البيانات)"""
+    zoom = int(zoom)
+    key = (_fetch_bounds(bounds, cell_size_deg(zoom)), zoom, _filters_key(filters), _data_version())
+    return _cluster_cache.get_or_build(key, lambda: load_clusters(bounds, zoom, filters))
+
+def _marker(row):
+    price = f"{row.price_per_m2:,.0f} ريال/م²" if pd.notna(row.price_per_m2) and row.price_per_m2 else "—"
+    location = (row.latitude, row.longitude)
+    if row.deal_count == 1:
+        name = row.location or row.district or f"#{row.id}"
+        return folium.CircleMarker(location, radius=6, color='#1f6f5c', fill=True, fill_opacity=0.8,
+                                   weight=1, tooltip=f"{name} | {row.property_type or ''} | {price}")
+    size = 24 + 6 * min(int(math.log10(row.deal_count)), 4)
+    html = (f'<div style="width:{size}px;height:{size}px;line-height:{size}px;border-radius:50%;'
+            f'background:rgba(31,111,92,0.8);color:#fff;text-align:center;font-size:11px;">'
+            f'{row.deal_count:,}</div>')
+    return folium.Marker(location, icon=folium.DivIcon(html=html, icon_size=(size, size),
+                                                       icon_anchor=(size // 2, size // 2)),
+                         tooltip=f"{row.deal_count:,} صفقة | متوسط {price}")
+
+def build_deal_layer(clusters):
+    """طبقة folium بعلامة لكل خلية (دائرة للصفقة المنفردة ورقم العدد للمجموعات)"""
+    layer = folium.FeatureGroup(name="الصفقات")
+    for row in clusters.itertuples(index=False):
+        layer.add_child(_marker(row))
+    return layer
+
+def get_base_map():
+    """قالب خريطة الأساس (بدون صفقات) يُبنى ويُجهز مرة واحدة لكل عملية
+
+    st_folium يعدّل الخريطة التي يستقبلها (يضيف إليها طبقة الصفقات ويعيد تحويلها)، لذا تأخذ
+    كل جلسة نسخة من القالب بدل مشاركة الكائن نفسه.
+    """
+    global _base_map
+    if _base_map is None:
+        with _base_map_lock:
+            if _base_map is None:
+                m = folium.Map(location=MAP_CENTER, zoom_start=DEFAULT_ZOOM)
+                m.add_child(folium.LatLngPopup())
+                # أول تحويل للنص يعدّل بنية الخريطة، لذا يُجرى هنا فيبقى نص كل نسخة (ومفتاح المكوّن
+                # المشتق منه) ثابتاً في كل تشغيل ولا يُعاد إنشاء الخريطة في المتصفح
+                m.get_root().render()
+                generate_leaflet_string(m)
+                _base_map = m
+    return _base_map
+
+def _viewport(map_state):
+    """حدود العرض والتقريب من آخر قيمة أعادتها st_folium (أو القيم الافتراضية)"""
+    bounds = (map_state or {}).get('bounds') or {}
+    south_west, north_east = bounds.get('_southWest') or {}, bounds.get('_northEast') or {}
+    zoom = (map_state or {}).get('zoom') or DEFAULT_ZOOM
+    if south_west.get('lat') is None or north_east.get('lat') is None:
+        return default_bounds(zoom=zoom), zoom
+    return (south_west['lat'], south_west['lng'], north_east['lat'], north_east['lng']), zoom
+
+def render_deal_map(key="deal_map", height=400, filters=None, price_heatmap=False):
+    """عرض الخريطة مع طبقة الصفقات لحدود العرض الحالية وإرجاع بيانات st_folium
+
+    تُستخدم الحدود التي أعادتها الخريطة في التشغيل السابق (st.session_state[key])، وتُرسل
+    الطبقات عبر feature_group_to_add فلا يُعاد بناء الخريطة نفسها في المتصفح.
+    price_heatmap: إضافة طبقة وسيط سعر المتر تحت طبقة الصفقات.
+    """
+    bounds, zoom = _viewport(st.session_state.get(key))
+    layers = []
+    if price_heatmap:
+        try:
+            layers.append(build_heatmap_layer(get_heatmap_cells(bounds, zoom)))
+        except Exception as e:
+            print(f"Error loading price heatmap: {e}")
+    try:
+        layers.append(build_deal_layer(get_clusters(bounds, zoom, filters)))
+    except Exception as e:
+        print(f"Error loading deal layer: {e}")
+    return st_folium(copy.deepcopy(get_base_map()), key=key, height=height, use_container_width=True,
+                     feature_group_to_add=layers or None, render=False,
+                     returned_objects=["last_clicked", "bounds", "zoom"])
@@ -0,0 +1,250 @@
+"""
+طبقة مضلعات الأحياء والبلديات (GeoJSON محلي) مع فهرس شجري لمستطيلات الإحاطة (R-Tree مُعبأ بطريقة STR)
+واختبار متجه لوقوع النقاط داخل المضلعات، لتحديد حي كل نقرة على الخريطة أو صفقة مستوردة دون حلقة على المضلعات
+"""
+import json
+import threading
+import numpy as np
+
+DISTRICTS_PATH = 'assets/districts_sa.geojson'
+DISTRICT_LEVEL = 'district'
+MUNICIPALITY_LEVEL = 'municipality'
+NODE_CAPACITY = 8          # عدد الأبناء في كل عقدة من الشجرة
+PIP_BLOCK = 1 << 20        # أقصى حجم لمصفوفة (نقاط × أضلاع) في كل خطوة من اختبار الاحتواء
+SMALL_BATCH = 16           # الدفعات الأصغر (نقرة على الخريطة) تُمرَّر على الشجرة بقيم Python مباشرة
+
+def _rings(geometry):
+    """حلقات المضلع (الخارجية والثقوب) لـ Polygon أو MultiPolygon كمصفوفات (lng, lat)"""
+    if geometry['type'] == 'Polygon':
+        polygons = [geometry['coordinates']]
+    elif geometry['type'] == 'MultiPolygon':
+        polygons = geometry['coordinates']
+    else:
+        raise ValueError(f"نوع هندسة غير مدعوم: {geometry['type']}")
+    return [[np.asarray(ring, dtype=float)[:, :2] for ring in polygon] for polygon in polygons]
+
+def _str_pack(boxes, capacity):
+    """ترتيب STR: شرائح حسب مركز خط الطول ثم فرز كل شريحة حسب مركز خط العرض"""
+    n = len(boxes)
+    n_nodes = -(-n // capacity)
+    per_slice = capacity * int(np.ceil(np.sqrt(n_nodes)))
+    cx = (boxes[:, 0] + boxes[:, 2]) / 2
+    cy = (boxes[:, 1] + boxes[:, 3]) / 2
+    order = np.argsort(cx, kind='stable')
+    for start in range(0, n, per_slice):
+        part = order[start:start + per_slice]
+        order[start:start + per_slice] = part[np.argsort(cy[part], kind='stable')]
+    return order
+
+class PolygonIndex:
+    """فهرس مضلعات بمستطيلات إحاطة في شجرة مُعبأة (المستويات من الجذر إلى الأوراق)
+
+    features: قائمة قواميس تحتوي properties و geometry (بصيغة GeoJSON).
+    """
+
+    def __init__(self, features, node_capacity=NODE_CAPACITY):
+        self.properties = [dict(f.get('properties') or {}) for f in features]
+        self.levels = np.array([p.get('level', DISTRICT_LEVEL) for p in self.properties], dtype=object)
+        self.edges = []
+        n = len(features)
+        self.boxes = np.empty((n, 4))   # (min_lng, min_lat, max_lng, max_lat)
+        self.areas = np.empty(n)
+        for i, feature in enumerate(features):
+            polygons = _rings(feature['geometry'])
+            rings = [ring for polygon in polygons for ring in polygon]
+            points = np.concatenate(rings)
+            self.boxes[i] = (*points.min(axis=0), *points.max(axis=0))
+            # المساحة (بوحدة الدرجات) للحلقات الخارجية فقط؛ تكفي لتفضيل المضلع الأصغر عند التداخل
+            self.areas[i] = sum(abs(np.dot(p[0][:-1, 0], p[0][1:, 1]) - np.dot(p[0][1:, 0], p[0][:-1, 1])) / 2
+                                for p in polygons)
+            closed = [ring if np.array_equal(ring[0], ring[-1]) else np.vstack([ring, ring[:1]]) for ring in rings]
+            start = np.concatenate([ring[:-1] for ring in closed])
+            end = np.concatenate([ring[1:] for ring in closed])
+            self.edges.append((start[:, 0], start[:, 1], end[:, 0], end[:, 1]))
+        self._names = np.array([p.get('name') for p in self.properties] + [None], dtype=object)
+        self._build_tree(node_capacity)
+
+    @classmethod
+    def from_geojson(cls, path=DISTRICTS_PATH):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f)['features'])
+
+    def _build_tree(self, capacity):
+        # كل مستوى: (مستطيلات العقد، بداية الأبناء، عدد الأبناء) والأبناء متتالون في المستوى الأدنى
+        self.tree, self._py_tree = [], []
+        if not len(self.boxes):
+            self.order = np.empty(0, dtype=np.intp)
+            return
+        self.order = _str_pack(self.boxes, capacity)
+        boxes = self.boxes[self.order]
+        while True:
+            starts = np.arange(0, len(boxes), capacity)
+            counts = np.minimum(capacity, len(boxes) - starts)
+            node_boxes = np.column_stack([
+                np.minimum.reduceat(boxes[:, 0], starts), np.minimum.reduceat(boxes[:, 1], starts),
+                np.maximum.reduceat(boxes[:, 2], starts), np.maximum.reduceat(boxes[:, 3], starts),
+            ])
+            self.tree.insert(0, (node_boxes, starts, counts))
+            if len(node_boxes) == 1:
+                break
+            order = _str_pack(node_boxes, capacity)
+            # إعادة ترتيب العقد يتطلب نقل نطاقات أبنائها معها
+            node_boxes, starts, counts = node_boxes[order], starts[order], counts[order]
+            self.tree[0] = (node_boxes, starts, counts)
+            boxes = node_boxes
+        # نسخة بقيم Python للتجوال: (مستطيل العقدة، أرقام أبنائها) ومستطيلات المضلعات في المستوى الأخير
+        self._py_tree = [[(*box, list(range(start, start + count)))
+                          for box, start, count in zip(b.tolist(), s.tolist(), c.tolist())]
+                         for b, s, c in self.tree]
+        self._py_tree[-1] = [(*box, self.order[children].tolist()) for *box, children in self._py_tree[-1]]
+        self._py_tree.append([(*box, None) for box in self.boxes.tolist()])
+
+    def __len__(self):
+        return len(self.properties)
+
+    def candidates(self, lats, lngs):
+        """أزواج (رقم النقطة، رقم المضلع) التي تقع فيها النقطة داخل مستطيل إحاطة المضلع
+
+        تُرتَّب النقاط حسب خط الطول مرة واحدة، ثم تنزل كل عقدة بالنقاط الواقعة في مستطيلها فقط:
+        شريحة خط الطول بالبحث الثنائي ثم قناع خط العرض، فلا تُختبر النقطة إلا في العقد التي تغطيها.
+        """
+        lats, lngs = np.atleast_1d(np.asarray(lats, dtype=float)), np.atleast_1d(np.asarray(lngs, dtype=float))
+        if len(lats) <= SMALL_BATCH:
+            return self._small_candidates(lats, lngs)
+        found_points, found_features = [], []
+        if self.tree:
+            order = np.argsort(lngs, kind='stable')
+            self._descend(0, 0, order, lngs[order], lats[order], found_points, found_features)
+        if not found_points:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        return np.concatenate(found_points), np.concatenate(found_features)
+
+    def _small_candidates(self, lats, lngs):
+        found_points, found_features = [], []
+        if not self.tree:
+            return np.array(found_points, dtype=np.intp), np.array(found_features, dtype=np.intp)
+        for i, (lat, lng) in enumerate(zip(lats.tolist(), lngs.tolist())):
+            stack = [(0, 0)]
+            while stack:
+                depth, node = stack.pop()
+                min_lng, min_lat, max_lng, max_lat, children = self._py_tree[depth][node]
+                if not (min_lng <= lng <= max_lng and min_lat <= lat <= max_lat):
+                    continue
+                if children is None:
+                    found_points.append(i)
+                    found_features.append(node)
+                else:
+                    stack.extend((depth + 1, child) for child in children)
+        return np.array(found_points, dtype=np.intp), np.array(found_features, dtype=np.intp)
+
+    def _descend(self, depth, node, points, xs, ys, found_points, found_features):
+        min_lng, min_lat, max_lng, max_lat, children = self._py_tree[depth][node]
+        lo, hi = np.searchsorted(xs, min_lng, side='left'), np.searchsorted(xs, max_lng, side='right')
+        if lo >= hi:
+            return
+        points, xs, ys = points[lo:hi], xs[lo:hi], ys[lo:hi]
+        mask = (ys >= min_lat) & (ys <= max_lat)
+        if not mask.all():
+            points, xs, ys = points[mask], xs[mask], ys[mask]
+            if not len(points):
+                return
+        if children is None:
+            found_points.append(points)
+            found_features.append(np.full(len(points), node, dtype=np.intp))
+            return
+        for child in children:
+            self._descend(depth + 1, child, points, xs, ys, found_points, found_features)
+
+    def contains(self, lats, lngs, level=None):
+        """أزواج (رقم النقطة، رقم المضلع) للنقاط الواقعة فعلاً داخل المضلع (قاعدة زوجي-فردي للأضلاع)
+
+        level: حصر الاختبار في مضلعات مستوى واحد (district أو municipality).
+        """
+        lats, lngs = np.atleast_1d(np.asarray(lats, dtype=float)), np.atleast_1d(np.asarray(lngs, dtype=float))
+        points, features = self.candidates(lats, lngs)
+        if level is not None:
+            keep = self.levels[features] == level
+            points, features = points[keep], features[keep]
+        if len(points) <= SMALL_BATCH:
+            inside = np.array([self._inside(f, lngs[p:p + 1], lats[p:p + 1])[0]
+                               for p, f in zip(points.tolist(), features.tolist())], dtype=bool)
+            return points[inside], features[inside]
+        inside = np.zeros(len(points), dtype=bool)
+        order = np.argsort(features, kind='stable')
+        bounds = np.flatnonzero(np.diff(features[order])) + 1
+        for group in np.split(order, bounds):
+            feature = features[group[0]]
+            step = max(PIP_BLOCK // len(self.edges[feature][0]), 1)
+            for i in range(0, len(group), step):
+                block = points[group[i:i + step]]
+                inside[group[i:i + step]] = self._inside(feature, lngs[block], lats[block])
+        return points[inside], features[inside]
+
+    def _inside(self, feature, px, py):
+        """اختبار الشعاع لنقاط مقابل جميع أضلاع المضلع دفعة واحدة (مصفوفة نقاط × أضلاع)"""
+        x1, y1, x2, y2 = self.edges[feature]
+        px, py = px[:, None], py[:, None]
+        crosses = (y1 > py) != (y2 > py)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+        return np.count_nonzero(crosses & (px < x_cross), axis=1) % 2 == 1
+
+    def locate(self, lats, lngs, level=DISTRICT_LEVEL):
+        """رقم المضلع (من المستوى المحدد) الذي يحتوي كل نقطة، أو ‎-1؛ عند التداخل يُختار الأصغر مساحة"""
+        lats = np.atleast_1d(np.asarray(lats, dtype=float))
+        points, features = self.contains(lats, lngs, level)
+        return self._smallest(len(lats), points, features)
+
+    def _smallest(self, n, points, features):
+        """لكل نقطة المضلع الأصغر مساحة من بين المضلعات التي تحتويها"""
+        result = np.full(n, -1, dtype=np.intp)
+        if len(points) <= SMALL_BATCH:
+            for p, f in zip(points.tolist(), features.tolist()):
+                if result[p] < 0 or self.areas[f] < self.areas[result[p]]:
+                    result[p] = f
+        else:
+            order = np.lexsort((self.areas[features], points))
+            first = np.unique(points[order], return_index=True)[1]
+            result[points[order][first]] = features[order][first]
+        return result
+
+    def names(self, indexes):
+        """أسماء المضلعات لمصفوفة أرقام (None للرقم ‎-1)"""
+        return self._names[np.asarray(indexes)]
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_district_index():
+    """تحميل طبقة الأحياء مرة واحدة لكل عملية (فهرس فارغ إذا تعذر قراءة الملف)"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                try:
+                    _index = PolygonIndex.from_geojson(DISTRICTS_PATH)
+                except Exception as e:
+                    print(f"Error loading district polygons: {e}")
+                    _index = PolygonIndex([])
+    return _index
+
+def assign_districts(lats, lngs):
+    """اسم الحي لكل نقطة (مصفوفة object، و None خارج جميع الأحياء)"""
+    index = get_district_index()
+    return index.names(index.locate(lats, lngs, DISTRICT_LEVEL))
+
+def locate_point(lat, lng):
+    """الحي والبلدية والمدينة لنقطة واحدة (مثل نقرة على الخريطة)"""
+    index = get_district_index()
+    points, features = index.contains(lat, lng)
+    levels = index.levels[features]
+    district = int(index._smallest(1, points[levels == DISTRICT_LEVEL], features[levels == DISTRICT_LEVEL])[0])
+    municipality = int(index._smallest(1, points[levels == MUNICIPALITY_LEVEL],
+                                       features[levels == MUNICIPALITY_LEVEL])[0])
+    district_props = index.properties[district] if district >= 0 else {}
+    municipality_props = index.properties[municipality] if municipality >= 0 else {}
+    return {
+        'district': district_props.get('name'),
+        'municipality': municipality_props.get('name'),
+        'city': district_props.get('city') or municipality_props.get('city'),
+    }
@@ -1,29 +1,128 @@
 import streamlit as st
-import json
+import threading
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from modules import db, formula_engine, equation_stats
+from modules.formula_engine import FormulaError, FormulaCycleError, MissingVariablesError
+
+# مفتاح داخلي لتقييم نص معادلة غير محفوظة ضمن شبكة المعادلات (الأسماء التي تبدأ بـ _ لا تُستخدم كمتغيرات)
+ADHOC_FORMULA = '__formula__'
+
+class EquationConflictError(Exception):
+    """تم تعديل المعادلة من جلسة أخرى بعد قراءتها (الإصدار المتوقع لا يطابق المخزن)"""
+
+class EquationNameError(ValueError):
+    """اسم المعادلة مستخدم في فئة أخرى (المعادلات تشير إلى بعضها بالاسم عبر جميع الفئات)"""
+
+# فهرس المعادلات في الذاكرة مشترك بين جميع الجلسات في العملية، يُعاد بناؤه فقط
+# عندما يتغير عداد الإصدار الذي ترفعه دوال الكتابة (بنفس أسلوب نسخة الإعدادات في db)
+_equations_version = 0
+_equations_snapshot = (None, -1, None)  # (مسار قاعدة البيانات، الإصدار، الفهرس)
+_equations_lock = threading.Lock()
+_seeded_paths = set()
+
+def invalidate_equations_cache():
+    """رفع إصدار المعادلات لإجبار الجلسات على إعادة بناء الفهرس عند الطلب التالي"""
+    global _equations_version
+    with _equations_lock:
+        _equations_version += 1
+
+def _build_index(rows):
+    """بناء فهارس البحث من صفوف جدول equations (بترتيب الإدخال)"""
+    index = {'categories': {}, 'by_id': {}, 'by_name': {}, 'formulas': {}}
+    for eq_id, category, label, name, formula, version, updated_at in rows:
+        index['categories'].setdefault(category, {'name': label or category, 'equations': {}})
+        index['categories'][category]['equations'][name] = formula
+        index['by_id'][eq_id] = {'id': eq_id, 'category': category, 'name': name, 'formula': formula,
+                                 'version': version, 'updated_at': updated_at}
+        index['by_name'].setdefault(name, eq_id)
+        index['formulas'].setdefault(name, formula)
+    return index
+
+def _load_equations():
+    """إرجاع فهرس المعادلات الحالي (قراءة الجدول مرة واحدة لكل إصدار)"""
+    global _equations_snapshot
+    path, version, index = _equations_snapshot
+    current = _equations_version
+    if path == db.DB_PATH and version == current:
+        return index
+    rows = db.get_connection().execute(
+        '''SELECT id, category, category_label, name, formula, version, updated_at
+           FROM equations ORDER BY rowid''').fetchall()
+    index = _build_index(rows)
+    _equations_snapshot = (db.DB_PATH, current, index)
+    return index
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def _next_version(conn, eq_id):
+    row = conn.execute('SELECT MAX(version) FROM equation_history WHERE equation_id = ?', (eq_id,)).fetchone()
+    return (row[0] or 0) + 1
+
+def _check_version(conn, eq_id, expected_version):
+    if expected_version is None:
+        return
+    row = conn.execute('SELECT version FROM equations WHERE id = ?', (eq_id,)).fetchone()
+    stored = row[0] if row else None
+    if stored != expected_version:
+        raise EquationConflictError(f"المعادلة {eq_id} تغيرت (الإصدار الحالي {stored})")
+
+def _save_equation(conn, category, label, name, formula, expected_version=None):
+    """إدخال أو تحديث صف معادلة واحد مع تسجيل الإصدار في السجل (داخل خيط الكتابة)"""
+    eq_id = f"{category}_{name}"
+    _check_version(conn, eq_id, expected_version)
+    version, now = _next_version(conn, eq_id), _now()
+    existed = conn.execute('SELECT 1 FROM equations WHERE id = ?', (eq_id,)).fetchone() is not None
+    conn.execute('''INSERT INTO equations (id, category, category_label, name, formula, version, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (id) DO UPDATE SET
+                        formula = excluded.formula, version = excluded.version, updated_at = excluded.updated_at''',
+                 (eq_id, category, label, name, formula, version, now))
+    conn.execute('''INSERT INTO equation_history (equation_id, version, formula, action, changed_at)
+                    VALUES (?, ?, ?, ?, ?)''', (eq_id, version, formula, 'update' if existed else 'create', now))
+    return version
+
+def _delete_equation(conn, eq_id, expected_version=None):
+    _check_version(conn, eq_id, expected_version)
+    if conn.execute('DELETE FROM equations WHERE id = ?', (eq_id,)).rowcount == 0:
+        return False
+    conn.execute('''INSERT INTO equation_history (equation_id, version, formula, action, changed_at)
+                    VALUES (?, ?, NULL, 'delete', ?)''', (eq_id, _next_version(conn, eq_id), _now()))
+    return True
+
+def _seed_equations(conn, categories):
+    """إدخال المعادلات الافتراضية مرة واحدة فقط (قاعدة بيانات جديدة دون أي سجل معادلات)"""
+    if conn.execute('SELECT 1 FROM equation_history LIMIT 1').fetchone() is not None:
+        return False
+    for category, data in categories.items():
+        for name, formula in data['equations'].items():
+            _save_equation(conn, category, data['name'], name, formula)
+    return True
 
 class EquationManager:
-    """مدير معادلات التقييم"""
+    """مدير معادلات التقييم (مخزنة في جدول equations بقاعدة البيانات، صف لكل معادلة)"""
     
     def __init__(self):
-        self.equations_file = 'data/equations.json'
         self.load_equations()
     
+    @property
+    def equations(self):
+        """المعادلات مجمعة حسب الفئة: {الفئة: {'name': ..., 'equations': {الاسم: النص}}}"""
+        return _load_equations()['categories']
+    
     def load_equations(self):
-        """تحميل المعادلات من الملف"""
+        """تحميل المعادلات من قاعدة البيانات (وإدخال الافتراضية في أول تشغيل)"""
         try:
-            with open(self.equations_file, 'r', encoding='utf-8') as f:
-                self.equations = json.load(f)
-        except:
-            self.equations = self.get_default_equations()
-            self.save_equations()
-    
-    def save_equations(self):
-        """حفظ المعادلات إلى الملف"""
-        with open(self.equations_file, 'w', encoding='utf-8') as f:
-            json.dump(self.equations, f, ensure_ascii=False, indent=2)
+            if db.DB_PATH not in _seeded_paths:
+                if db.run_write(_seed_equations, self.get_default_equations()):
+                    invalidate_equations_cache()
+                _seeded_paths.add(db.DB_PATH)
+            return _load_equations()['categories']
+        except Exception as e:
+            print(f"Error loading equations: {e}")
+            return {}
     
     def get_default_equations(self):
         """المعادلات الافتراضية"""
@@ -32,6 +131,7 @@ class EquationManager:
                 "name": "معادلات التقييم العقاري",
                 "equations": {
                     "market_value": "area * market_rate * condition_factor",
+                    "property_value": "market_value",
                     "income_approach": "net_income / cap_rate",
                     "cost_approach": "(land_value + construction_cost) - depreciation",
                     "comparative": "avg_comparable_price * adjustment_factors"
@@ -49,6 +149,7 @@ class EquationManager:
             "investment": {
                 "name": "معادلات الاستثمار",
                 "equations": {
+                    "net_profit": "total_revenue - total_cost",
                     "roi": "(net_profit / investment_cost) * 100",
                     "irr": "solve_npv(cash_flows, 0)",
                     "payback_period": "investment_cost / annual_cash_flow",
@@ -64,58 +165,218 @@ class EquationManager:
     def get_equations_by_type(self, eq_type):
         """الحصول على معادلات حسب النوع"""
         eqs = []
+        usage = equation_stats.get_usage_stats()
         for category, data in self.equations.items():
             for name, formula in data['equations'].items():
+                eq_id = f"{category}_{name}"
                 eqs.append({
-                    'id': f"{category}_{name}",
+                    'id': eq_id,
                     'category': category,
                     'name': name,
                     'formula': formula,
-                    'usage_count': np.random.randint(1, 100)
+                    'usage_count': usage.get(eq_id, {}).get('usage_count', 0),
+                    'p50_ms': usage.get(eq_id, {}).get('p50_ms'),
+                    'p95_ms': usage.get(eq_id, {}).get('p95_ms'),
+                    'last_used': usage.get(eq_id, {}).get('last_used')
                 })
         return eqs
     
-    def add_equation(self, eq_type, name, formula):
-        """إضافة معادلة جديدة"""
-        if eq_type not in self.equations:
-            self.equations[eq_type] = {
-                "name": eq_type,
-                "equations": {}
-            }
-        
-        self.equations[eq_type]['equations'][name] = formula
-        self.save_equations()
+    def get_equation(self, eq_id):
+        """صف المعادلة (id, category, name, formula, version, updated_at) باسمها أو بمعرفها"""
+        index = _load_equations()
+        return index['by_id'].get(index['by_name'].get(eq_id, eq_id))
     
-    def update_equation(self, eq_id, new_formula):
-        """تحديث معادلة"""
-        for category in self.equations.values():
-            if eq_id in category['equations']:
-                category['equations'][eq_id] = new_formula
-                self.save_equations()
-                return True
-        return False
+    def find_equation(self, eq_id):
+        """البحث عن معادلة باسمها أو بمعرفها (category_name)، وإرجاع (الفئة، الاسم)"""
+        row = self.get_equation(eq_id)
+        return None if row is None else (row['category'], row['name'])
     
-    def delete_equation(self, eq_id):
-        """حذف معادلة"""
-        for category in self.equations.values():
-            if eq_id in category['equations']:
-                del category['equations'][eq_id]
-                self.save_equations()
-                return True
+    def get_formula(self, eq_id):
+        """نص المعادلة حسب اسمها أو معرفها"""
+        row = self.get_equation(eq_id)
+        return None if row is None else row['formula']
+    
+    def get_formula_map(self):
+        """قاموس اسم المعادلة ← نصها عبر جميع الفئات (مشترك؛ لا يُعدّل مباشرة)
+
+        الاسم فريد عبر الفئات (يرفضه add_equation إن وُجد في فئة أخرى) فهو مفتاح شبكة الاعتماد.
+        """
+        return _load_equations()['formulas']
+    
+    def get_equation_dependencies(self, eq_id):
+        """المعادلات التي تعتمد عليها المعادلة مرتبة طوبولوجياً (بدونها)"""
+        formulas = self.get_formula_map()
+        name = self._resolve_name(eq_id)
+        return formula_engine.evaluation_order([name], formulas)[:-1]
+    
+    def _check_name(self, category, name):
+        """رفض اسم موجود في فئة أخرى: وإلا لأشار الاسم في المعادلات وفي شبكة الاعتماد إلى معادلتين"""
+        index = _load_equations()
+        eq_id = index['by_name'].get(name)
+        if eq_id is not None and index['by_id'][eq_id]['category'] != category:
+            raise EquationNameError(f"اسم المعادلة {name} مستخدم في الفئة {index['by_id'][eq_id]['category']}")
+
+    def _check_dependencies(self, name, formula):
+        """رفض الحفظ إذا كانت المعادلة الجديدة تُنشئ حلقة اعتماد مع المعادلات الحالية (FormulaCycleError)"""
+        formulas = dict(self.get_formula_map())
+        formulas[name] = formula
+        formula_engine.evaluation_order([name], formulas)
+
+    def _resolve_name(self, eq_id):
+        found = self.find_equation(eq_id)
+        if found is None:
+            raise KeyError(f"المعادلة غير موجودة: {eq_id}")
+        return found[1]
+    
+    def _record_usage(self, timings):
+        """تسجيل زمن كل معادلة حُسبت في الشبكة تحت معرفها (المعادلات غير المحفوظة لا تُسجل)"""
+        by_name = _load_equations()['by_name']
+        equation_stats.record({by_name[name]: sec for name, sec in timings.items() if name in by_name})
+
+    def compile_equation(self, eq_id):
+        """النسخة المترجمة من المعادلة (تُحلَّل مرة واحدة وتُخزَّن حسب نصها)"""
+        formula = self.get_formula(eq_id)
+        if formula is None:
+            raise KeyError(f"المعادلة غير موجودة: {eq_id}")
+        return formula_engine.compile_formula(formula)
+    
+    def get_equation_variables(self, eq_id):
+        """المتغيرات الأساسية المطلوبة لتقييم المعادلة (بعد حل المعادلات التي تعتمد عليها)"""
+        formulas = self.get_formula_map()
+        order = formula_engine.evaluation_order([self._resolve_name(eq_id)], formulas)
+        return sorted(formula_engine.input_variables(order, formulas))
+    
+    def evaluate_equation(self, eq_id, variables):
+        """تقييم معادلة محفوظة بقاموس المتغيرات (مع حساب المعادلات التي تعتمد عليها)"""
+        return self.evaluate_equations([eq_id], variables)[self._resolve_name(eq_id)]
+    
+    def evaluate_equations(self, eq_ids, variables):
+        """تقييم عدة معادلات مترابطة معاً؛ كل معادلة مشتركة تُحسب مرة واحدة فقط"""
+        names = [self._resolve_name(eq_id) for eq_id in eq_ids]
+        timings = {}
+        results = formula_engine.evaluate_graph(names, self.get_formula_map(), variables, timings)
+        self._record_usage(timings)
+        return {name: results[name] if name in results else variables[name] for name in names}
+    
+    def evaluate_on_frame(self, eq_id, data, column_map=None, params=None, output=None):
+        """تطبيق معادلة محفوظة على جميع صفوف DataFrame أو قاموس مصفوفات دفعة واحدة
+
+        المعادلات التي تعتمد عليها تُحسب مرة واحدة لكامل الدفعة. إذا حُدد output وكان
+        data من نوع DataFrame تُعاد نسخة منه مع عمود النتيجة الجديد.
+        """
+        name = self._resolve_name(eq_id)
+        result = self.evaluate_equations_on_frame([name], data, column_map, params)[name]
+        if isinstance(data, pd.DataFrame):
+            result = result.rename(name)
+            if output:
+                return data.assign(**{output: result})
+        return result
+    
+    def evaluate_equations_on_frame(self, eq_ids, data, column_map=None, params=None):
+        """تقييم عدة معادلات مترابطة على جدول كامل وإرجاع قاموس الأعمدة الناتجة"""
+        column_map = column_map or {}
+        params = params or {}
+        formulas = self.get_formula_map()
+        names = [self._resolve_name(eq_id) for eq_id in eq_ids]
+        # معادلة وسيطة موجودة كعمود أو معامل تُؤخذ قيمتها مباشرة بدل حسابها
+        provided = {n for n in formulas if n in params or column_map.get(n, n) in data}
+        order = formula_engine.evaluation_order([n for n in names if n not in provided], formulas, provided)
+        inputs = formula_engine.input_variables(order, formulas) | (provided & set(names))
+        values = formula_engine.resolve_columns(inputs, data, column_map, params)
+        timings = {}
+        results = formula_engine.evaluate_graph(names, formulas, values, timings)
+        self._record_usage(timings)
+        return {name: formula_engine.as_column(results.get(name, values.get(name)), data) for name in names}
+    
+    def evaluate_on_deals(self, eq_id, column_map=None, params=None, filters=None, output=None):
+        """تطبيق معادلة على صفقات قاعدة البيانات (مع مرشحات اختيارية)"""
+        from modules.db import load_deals_frame
+        deals = load_deals_frame(filters=filters)
+        return self.evaluate_on_frame(eq_id, deals, column_map, params, output or self.find_equation(eq_id)[1])
+    
+    def add_equation(self, eq_type, name, formula, label=None):
+        """إضافة معادلة جديدة (أو إصدار جديد لمعادلة موجودة بنفس الاسم في الفئة)؛ الاسم المستخدم في فئة أخرى يُرفض"""
+        self._check_name(eq_type, name)
+        formula_engine.compile_formula(formula)  # التحقق من صحة المعادلة قبل الحفظ
+        self._check_dependencies(name, formula)
+        old = self.get_equation(f"{eq_type}_{name}")
+        if label is None:
+            label = self.equations.get(eq_type, {}).get('name', eq_type)
+        version = db.run_write(_save_equation, eq_type, label, name, formula)
+        if old is not None and old['category'] == eq_type and old['name'] == name:
+            formula_engine.invalidate(old['formula'])
+        invalidate_equations_cache()
+        return version
+    
+    def update_equation(self, eq_id, new_formula, expected_version=None):
+        """تحديث معادلة؛ عند تمرير expected_version يُرفض التحديث إذا عدلتها جلسة أخرى"""
+        row = self.get_equation(eq_id)
+        if row is None:
+            return False
+        formula_engine.compile_formula(new_formula)
+        self._check_dependencies(row['name'], new_formula)
+        label = self.equations[row['category']]['name']
+        try:
+            db.run_write(_save_equation, row['category'], label, row['name'], new_formula, expected_version)
+        except EquationConflictError as e:
+            print(f"Error updating equation: {e}")
+            return False
+        finally:
+            invalidate_equations_cache()
+        formula_engine.invalidate(row['formula'])
+        return True
+    
+    def delete_equation(self, eq_id, expected_version=None):
+        """حذف معادلة (يبقى سجل إصداراتها محفوظاً)"""
+        row = self.get_equation(eq_id)
+        if row is None:
+            return False
+        try:
+            deleted = db.run_write(_delete_equation, row['id'], expected_version)
+        except EquationConflictError as e:
+            print(f"Error deleting equation: {e}")
+            return False
+        finally:
+            invalidate_equations_cache()
+        formula_engine.invalidate(row['formula'])
+        return deleted
+    
+    def get_equation_history(self, eq_id):
+        """سجل إصدارات المعادلة من الأحدث إلى الأقدم (يشمل المعادلات المحذوفة بمعرفها)"""
+        row = self.get_equation(eq_id)
+        key = row['id'] if row else eq_id
+        cursor = db.get_connection().execute(
+            '''SELECT version, formula, action, changed_at FROM equation_history
+               WHERE equation_id = ? ORDER BY version DESC''', (key,))
+        columns = [col[0] for col in cursor.description]
+        return [dict(zip(columns, r)) for r in cursor.fetchall()]
+    
+    def restore_equation(self, eq_id, version):
+        """استعادة نص إصدار سابق لمعادلة موجودة كإصدار جديد"""
+        if self.get_equation(eq_id) is None:
+            return False
+        for entry in self.get_equation_history(eq_id):
+            if entry['version'] == version and entry['formula'] is not None:
+                return self.update_equation(eq_id, entry['formula'])
         return False
     
     def test_equation(self, eq_id, variables=None):
-        """اختبار المعادلة"""
+        """اختبار المعادلة (بمعرفها أو بنص المعادلة مباشرة)"""
         if variables is None:
             variables = {"area": 1000, "market_rate": 50, "condition_factor": 0.8}
         
+        formula = self.get_formula(eq_id) or eq_id
         try:
-            # تنفيذ المعادلة
-            if "area * market_rate * condition_factor" in eq_id:
-                result = variables.get('area', 0) * variables.get('market_rate', 0) * variables.get('condition_factor', 1)
-                return f"✅ النتيجة: {result:,.2f}"
-            else:
-                return "⚠️ معادلة تجريبية - تحتاج تطبيق"
+            formulas = dict(self.get_formula_map())
+            formulas[ADHOC_FORMULA] = formula
+            order = formula_engine.evaluation_order([ADHOC_FORMULA], formulas, variables.keys())
+            missing = formula_engine.input_variables(order, formulas) - variables.keys()
+            if missing:
+                return f"⚠️ متغيرات ناقصة: {', '.join(sorted(missing))}"
+            result = formula_engine.evaluate_graph([ADHOC_FORMULA], formulas, variables)[ADHOC_FORMULA]
+            if np.ndim(result) == 0:
+                return f"✅ النتيجة: {float(result):,.2f}"
+            return f"✅ النتيجة: {np.round(np.asarray(result, dtype=float), 2).tolist()}"
         except Exception as e:
             return f"❌ خطأ: {str(e)}"
     
@@ -131,5 +392,10 @@ class EquationManager:
         return self.get_equation_count()  # في الإصدار الحالي، جميعها نشطة
     
     def get_usage_rate(self):
-        """معدل استخدام المعادلات"""
-        return 85.5  # نسبة افتراضية
+        """معدل استخدام المعادلات: نسبة المعادلات التي قُيّمت مرة واحدة على الأقل"""
+        equations = _load_equations()['by_id']
+        if not equations:
+            return 0.0
+        usage = equation_stats.get_usage_stats()
+        used = sum(1 for eq_id in equations if usage.get(eq_id, {}).get('usage_count', 0) > 0)
+        return round(used / len(equations) * 100, 1)
@@ -0,0 +1,148 @@
+"""
+عدادات استخدام المعادلات وزمن تقييمها
+تُجمَّع في الذاكرة عند كل تقييم (دون أي عملية إدخال/إخراج) ثم تُكتب إلى SQLite
+على دفعات كل FLUSH_INTERVAL ثانية عبر خيط الكتابة المشترك
+"""
+import atexit
+import bisect
+import threading
+import time
+from datetime import datetime
+import numpy as np
+from modules.db import get_connection, run_write
+
+FLUSH_INTERVAL = 30  # ثوانٍ بين كل كتابتين إلى قاعدة البيانات
+
+# حدود فئات زمن التقييم بالمللي ثانية (تباعد لوغاريتمي من 1 ميكروثانية إلى 100 ثانية).
+# لا تُعدّل هذه الحدود بعد تخزين بيانات، فرقم الفئة هو المخزن في جدول equation_latency
+LATENCY_BUCKETS_MS = [float(x) for x in np.geomspace(1e-3, 1e5, 81)]
+
+UPSERT_USAGE_SQL = '''INSERT INTO equation_usage (equation, usage_count, total_ms, last_used)
+                      VALUES (?, ?, ?, ?)
+                      ON CONFLICT (equation) DO UPDATE SET
+                          usage_count = usage_count + excluded.usage_count,
+                          total_ms = total_ms + excluded.total_ms,
+                          last_used = MAX(COALESCE(last_used, ''), excluded.last_used)'''
+UPSERT_LATENCY_SQL = '''INSERT INTO equation_latency (equation, bucket, count) VALUES (?, ?, ?)
+                        ON CONFLICT (equation, bucket) DO UPDATE SET count = count + excluded.count'''
+
+_pending = {}  # معرف المعادلة (الفئة_الاسم) -> {'count', 'total_ms', 'last_used', 'buckets': {فئة: عدد}}
+_lock = threading.Lock()
+_flusher = None
+_stop = threading.Event()
+
+def _new_entry():
+    return {'count': 0, 'total_ms': 0.0, 'last_used': 0.0, 'buckets': {}}
+
+def _merge(target, entry):
+    target['count'] += entry['count']
+    target['total_ms'] += entry['total_ms']
+    target['last_used'] = max(target['last_used'], entry['last_used'])
+    for bucket, n in entry['buckets'].items():
+        target['buckets'][bucket] = target['buckets'].get(bucket, 0) + n
+
+def record(timings):
+    """تسجيل تقييم واحد لكل معادلة في timings (معرف المعادلة -> زمن حسابها وحدها بالثواني) في الذاكرة فقط"""
+    now = time.time()
+    with _lock:
+        for eq_id, elapsed_sec in timings.items():
+            elapsed_ms = elapsed_sec * 1000.0
+            bucket = bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)
+            entry = _pending.get(eq_id)
+            if entry is None:
+                entry = _pending[eq_id] = _new_entry()
+            entry['count'] += 1
+            entry['total_ms'] += elapsed_ms
+            entry['last_used'] = now
+            entry['buckets'][bucket] = entry['buckets'].get(bucket, 0) + 1
+    if _flusher is None:
+        _start_flusher()
+
+def _write_usage(conn, usage_rows, latency_rows):
+    conn.executemany(UPSERT_USAGE_SQL, usage_rows)
+    conn.executemany(UPSERT_LATENCY_SQL, latency_rows)
+
+def flush():
+    """كتابة العدادات المتراكمة إلى قاعدة البيانات في معاملة واحدة، وإرجاع عدد المعادلات"""
+    global _pending
+    with _lock:
+        batch, _pending = _pending, {}
+    if not batch:
+        return 0
+    usage_rows, latency_rows = [], []
+    for name, entry in batch.items():
+        last_used = datetime.fromtimestamp(entry['last_used']).strftime("%Y-%m-%d %H:%M:%S")
+        usage_rows.append((name, entry['count'], entry['total_ms'], last_used))
+        latency_rows.extend((name, bucket, n) for bucket, n in entry['buckets'].items())
+    try:
+        run_write(_write_usage, usage_rows, latency_rows)
+    except Exception as e:
+        print(f"Error flushing equation usage: {e}")
+        # إعادة العدادات إلى الذاكرة لمحاولة الكتابة في الدورة التالية
+        with _lock:
+            for name, entry in batch.items():
+                _merge(_pending.setdefault(name, _new_entry()), entry)
+        return 0
+    return len(batch)
+
+def _flush_loop():
+    while not _stop.wait(FLUSH_INTERVAL):
+        flush()
+
+def _start_flusher():
+    global _flusher
+    with _lock:
+        if _flusher is not None:
+            return
+        _flusher = threading.Thread(target=_flush_loop, name='equation-stats-flusher', daemon=True)
+        _flusher.start()
+    atexit.register(flush)
+
+def _percentile(buckets, q):
+    """النسبة المئوية q من المدرج التكراري (الحد الأعلى للفئة التي تبلغها)"""
+    total = sum(buckets.values())
+    if not total:
+        return None
+    target = q / 100.0 * total
+    cumulative = 0
+    for bucket in sorted(buckets):
+        cumulative += buckets[bucket]
+        if cumulative >= target:
+            return LATENCY_BUCKETS_MS[min(bucket, len(LATENCY_BUCKETS_MS) - 1)]
+    return LATENCY_BUCKETS_MS[-1]
+
+def get_usage_stats():
+    """إحصاءات الاستخدام لكل معادلة: المخزنة في قاعدة البيانات مضافاً إليها غير المكتوبة بعد
+
+    تعيد قاموساً: معرف المعادلة -> usage_count, avg_ms, p50_ms, p95_ms, last_used
+    """
+    merged = {}
+    try:
+        conn = get_connection()
+        for name, count, total_ms, last_used in conn.execute(
+                'SELECT equation, usage_count, total_ms, last_used FROM equation_usage'):
+            entry = merged.setdefault(name, _new_entry())
+            entry['count'] += count
+            entry['total_ms'] += total_ms
+            if last_used:
+                entry['last_used'] = datetime.strptime(last_used, "%Y-%m-%d %H:%M:%S").timestamp()
+        for name, bucket, count in conn.execute('SELECT equation, bucket, count FROM equation_latency'):
+            buckets = merged.setdefault(name, _new_entry())['buckets']
+            buckets[bucket] = buckets.get(bucket, 0) + count
+    except Exception as e:
+        print(f"Error loading equation usage: {e}")
+    with _lock:
+        for name, entry in _pending.items():
+            _merge(merged.setdefault(name, _new_entry()), entry)
+
+    stats = {}
+    for name, entry in merged.items():
+        stats[name] = {
+            'usage_count': entry['count'],
+            'avg_ms': entry['total_ms'] / entry['count'] if entry['count'] else None,
+            'p50_ms': _percentile(entry['buckets'], 50),
+            'p95_ms': _percentile(entry['buckets'], 95),
+            'last_used': datetime.fromtimestamp(entry['last_used']).strftime("%Y-%m-%d %H:%M:%S")
+                         if entry['last_used'] else None,
+        }
+    return stats
@@ -1,7 +1,9 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import plotly.graph_objects as go
 from modules.valuation_methods import apply_valuation_method
+from modules import simulation, sensitivity, comparables
 
 def render_evaluation_module(user_role):
     st.markdown('<div class="main-header"><h2>📊 نظام التقييم العقاري العلمي</h2></div>', unsafe_allow_html=True)
@@ -31,12 +33,153 @@ def render_new_valuation_form():
 
 def render_comparables_database_full():
     st.subheader("🗃️ قاعدة بيانات الصفقات المقارنة")
-    df = pd.DataFrame({'رقم الصفقة': ['#101', '#102'], 'المنطقة': ['النخيل', 'الياسمين'], 'سعر المتر': [1200, 1150]})
-    st.dataframe(df, use_container_width=True)
+    c1, c2, c3 = st.columns(3)
+    lat = c1.number_input("خط العرض", value=24.7136, format="%.6f")
+    lng = c2.number_input("خط الطول", value=46.6753, format="%.6f")
+    area = c3.number_input("مساحة الموقع (م²)", value=1000.0, min_value=1.0)
+    c1, c2, c3 = st.columns(3)
+    p_type = c1.selectbox("نوع العقار", ["تجاري", "سكني", "صناعي"], key="comp_type")
+    activity = c2.text_input("النشاط (اختياري)")
+    k = c3.slider("عدد الصفقات المقارنة", 3, 30, comparables.DEFAULT_K)
+
+    subject = {'latitude': lat, 'longitude': lng, 'area': area,
+               'property_type': p_type, 'activity_type': activity or None}
+    try:
+        found = comparables.find_comparables(subject, k=k)
+    except Exception as e:
+        st.error(f"❌ تعذر البحث عن الصفقات المقارنة: {e}")
+        return
+    if found.empty:
+        st.info("لا توجد صفقات مسجلة بعد")
+        return
+
+    adjusted = comparables.adjust_comparables(subject, found)
+    valuation = comparables.comparables_valuation(subject, adjusted)
+    c1, c2 = st.columns(2)
+    c1.metric("سعر المتر الموزون بعد التعديل", f"{valuation['total_value'] / area:,.0f} ريال")
+    c2.metric("القيمة التقديرية", f"{valuation['total_value']:,.0f} ريال")
+
+    st.dataframe(
+        adjusted[['rank', 'id', 'location', 'district', 'property_type', 'area', 'price_per_m2',
+                  'distance_km', 'age_years', 'adj_time', 'adj_area', 'adj_location', 'adjusted_price_per_m2']],
+        column_config={
+            'rank': "الترتيب", 'id': "رقم الصفقة", 'location': "الموقع", 'district': "الحي",
+            'property_type': "النوع", 'area': st.column_config.NumberColumn("المساحة", format="%.0f"),
+            'price_per_m2': st.column_config.NumberColumn("سعر المتر", format="%.0f"),
+            'distance_km': st.column_config.NumberColumn("المسافة (كم)", format="%.2f"),
+            'age_years': st.column_config.NumberColumn("عمر الصفقة (سنة)", format="%.1f"),
+            'adj_time': st.column_config.NumberColumn("تعديل الزمن %", format="%.1f"),
+            'adj_area': st.column_config.NumberColumn("تعديل المساحة %", format="%.1f"),
+            'adj_location': st.column_config.NumberColumn("تعديل الموقع %", format="%.1f"),
+            'adjusted_price_per_m2': st.column_config.NumberColumn("سعر المتر المعدل", format="%.0f"),
+        },
+        use_container_width=True,
+        hide_index=True,
+    )
 
 def render_sensitivity_tool_fixed():
     st.subheader("📈 أداة تحليل الحساسية")
+    mode = st.radio("نوع التحليل", ["تغير بنسبة ثابتة", "تحليل الإعصار", "محاكاة مونت كارلو"], horizontal=True)
+    if mode == "محاكاة مونت كارلو":
+        render_monte_carlo_tool()
+        return
+    if mode == "تحليل الإعصار":
+        render_tornado_tool()
+        return
     base_val = st.number_input("القيمة الأساسية", value=1000000.0)
     factor = st.slider("نسبة التغير %", -25, 25, 0)
     new_val = base_val * (1 + factor/100)
     st.markdown(f"**القيمة بعد التأثير:** :blue[{new_val:,.2f} ريال]")
+
+def render_tornado_tool():
+    """تأثير تغيير كل مدخل منفرداً على القيمة، وشبكة لمدخلين معاً"""
+    c1, c2, c3 = st.columns(3)
+    annual_income = c1.number_input("الدخل السنوي (ريال)", value=500000.0)
+    discount_rate = c2.number_input("معدل الخصم %", value=10.0) / 100
+    growth_rate = c3.number_input("النمو السنوي %", value=2.0) / 100
+    years = st.number_input("سنوات التدفق", value=20, min_value=1, max_value=99)
+    inputs = {'annual_income': annual_income, 'discount_rate': discount_rate,
+              'growth_rate': growth_rate, 'forecast_years': years}
+
+    result = sensitivity.run_sensitivity('dcf', inputs, grid_params=('discount_rate', 'growth_rate'))
+    st.metric("القيمة الأساسية", f"{result['base_value']:,.0f} ريال")
+
+    frame = result['tornado']
+    labels = frame['parameter'].map(lambda name: sensitivity.PARAMETERS[name][0])
+    fig = go.Figure()
+    for side, color in ((frame['change'] < 0, '#dc2626'), (frame['change'] > 0, '#16a34a')):
+        fig.add_trace(go.Bar(y=labels[side], x=frame['value_change'][side], orientation='h',
+                             marker_color=color, text=frame['change'][side].map('{:+g}'.format),
+                             showlegend=False))
+    fig.update_layout(barmode='overlay', xaxis_title="التغير في القيمة (ريال)", height=320)
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.dataframe(pd.DataFrame(result['sensitivity_scenarios']).rename(columns={
+        'scenario': 'السيناريو', 'input_change': 'التغير في المدخلات',
+        'value_change': 'التغير في القيمة', 'adjusted_value': 'القيمة المعدلة'}),
+        use_container_width=True, hide_index=True)
+
+    grid = result['grid']
+    heatmap = go.Figure(go.Heatmap(z=grid.to_numpy(), x=[f"{c * 100:+.1f}" for c in grid.columns],
+                                   y=[f"{r * 100:+.1f}" for r in grid.index], colorscale='Blues'))
+    heatmap.update_layout(xaxis_title="تغير معدل الخصم (نقطة)", yaxis_title="تغير النمو (نقطة)", height=360)
+    st.plotly_chart(heatmap, use_container_width=True)
+
+# عناوين مدخلات المحاكاة وصيغة عرضها (النسب تُدخل كنسبة مئوية)
+SIMULATION_INPUT_LABELS = {
+    'rent': ("الإيجار السنوي (ريال)", False),
+    'occupancy': ("نسبة الإشغال %", True),
+    'growth': ("النمو السنوي %", True),
+    'discount_rate': ("معدل الخصم %", True),
+    'construction_cost': ("تكلفة البناء (ريال)", False),
+}
+
+def render_monte_carlo_tool():
+    """محاكاة مونت كارلو: توزيع مثلثي (أدنى / الأرجح / أعلى) لكل مدخل"""
+    with st.form("monte_carlo_form"):
+        c1, c2, c3 = st.columns(3)
+        method = c1.selectbox("المنهجية", list(simulation.SIMULATION_METHODS),
+                              format_func=simulation.SIMULATION_METHODS.get)
+        n_draws = c2.selectbox("عدد السحبات", [100_000, 250_000, 500_000, 1_000_000], format_func="{:,}".format)
+        seed = c3.number_input("البذرة (لتكرار النتائج)", value=simulation.SIMULATION_SEED, step=1)
+        c1, c2, c3 = st.columns(3)
+        years = c1.number_input("سنوات التدفق", value=20, min_value=1, max_value=99)
+        profit_margin = c2.number_input("ربح المطور %", value=20.0) / 100
+        threshold = c3.number_input("حد القيمة الأدنى (ريال)", value=0.0)
+
+        inputs = {}
+        for name, (label, percent) in SIMULATION_INPUT_LABELS.items():
+            default = simulation.DEFAULT_INPUTS[name]
+            scale = 100 if percent else 1
+            st.markdown(f"**{label}**")
+            cols = st.columns(3)
+            low, mode, high = (cols[i].number_input(caption, value=float(default[key] * scale), key=f"mc_{name}_{key}")
+                               for i, (caption, key) in enumerate((("أدنى", 'low'), ("الأرجح", 'mode'), ("أعلى", 'high'))))
+            inputs[name] = {'dist': 'triangular', 'low': low / scale, 'mode': mode / scale, 'high': high / scale}
+
+        submitted = st.form_submit_button("🎲 تشغيل المحاكاة")
+
+    if not submitted:
+        return
+    try:
+        result = simulation.run_simulation(method, inputs, n_draws, int(seed), threshold or None,
+                                           years=int(years), profit_margin=profit_margin)
+    except ValueError as e:
+        st.error(f"❌ {e}")
+        return
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("P5", f"{result['p5']:,.0f}")
+    c2.metric("P50 (الوسيط)", f"{result['p50']:,.0f}")
+    c3.metric("P95", f"{result['p95']:,.0f}")
+    if result['prob_below'] is not None:
+        c4.metric("احتمال النزول عن الحد", f"{result['prob_below'] * 100:.1f}%")
+
+    edges = np.asarray(result['histogram']['edges'])
+    fig = go.Figure(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=result['histogram']['counts'],
+                           width=np.diff(edges), marker_color='#1e3a8a'))
+    for key, color in (('p5', '#dc2626'), ('p50', '#16a34a'), ('p95', '#dc2626')):
+        fig.add_vline(x=result[key], line_dash='dash', line_color=color, annotation_text=key.upper())
+    fig.update_layout(xaxis_title="القيمة (ريال)", yaxis_title="عدد السحبات", bargap=0, height=360)
+    st.plotly_chart(fig, use_container_width=True)
+    st.caption(f"{result['n_draws']:,} سحبة | البذرة {result['seed']} | {result['elapsed'] * 1000:,.0f} مللي ثانية")
@@ -0,0 +1,131 @@
+"""
+نواة الحسابات المالية: صافي القيمة الحالية، معدل العائد الداخلي، فترة الاسترداد والعائد على الاستثمار
+جميع الدوال تقبل متجه تدفقات واحداً (T,) أو مصفوفة (N, T) لعدة عروض دفعة واحدة،
+حيث العمود t هو تدفق السنة t (العمود 0 = الاستثمار الأولي غالباً بقيمة سالبة).
+"""
+import numpy as np
+import pandas as pd
+
+IRR_TOL = 1e-10
+IRR_MAX_ITER = 100
+# أسعار الخصم المستخدمة للبحث عن فترة تحتوي الجذر قبل نيوتن
+IRR_BRACKET_GRID = np.concatenate([np.linspace(-0.99, 1.0, 200), np.linspace(1.1, 10.0, 90)])
+
+def _as_flows(cash_flows):
+    flows = np.asarray(cash_flows, dtype=float)
+    if flows.ndim == 0:
+        raise ValueError("التدفقات النقدية يجب أن تكون متجهاً أو مصفوفة")
+    return flows
+
+def _scalar_or_array(result):
+    return float(result) if np.ndim(result) == 0 else result
+
+def npv(rate, cash_flows):
+    """صافي القيمة الحالية Σ CF_t / (1 + rate)^t
+
+    rate: قيمة مفردة أو مصفوفة قابلة للبث مع أبعاد العروض (N,).
+    """
+    flows = _as_flows(cash_flows)
+    rate = np.asarray(rate, dtype=float)
+    t = np.arange(flows.shape[-1])
+    discount = (1 + rate[..., None]) ** -t
+    return _scalar_or_array(np.sum(flows * discount, axis=-1))
+
+def _npv_and_derivative(rate, flows, t):
+    discount = (1 + rate[..., None]) ** -t
+    value = np.sum(flows * discount, axis=-1)
+    derivative = np.sum(-t * flows * discount / (1 + rate[..., None]), axis=-1)
+    return value, derivative
+
+def solve_npv(cash_flows, target=0.0):
+    """سعر الخصم الذي يجعل صافي القيمة الحالية مساوياً لـ target (IRR عند target = 0)
+
+    نيوتن-رافسون محمي بفترة تحتوي الجذر: أي خطوة تخرج عن الفترة تُستبدل بتنصيف.
+    يعيد NaN للعروض التي لا يغير فيها NPV إشارته ضمن نطاق البحث.
+    """
+    flows = _as_flows(cash_flows)
+    single = flows.ndim == 1
+    if flows.shape[-1] < 2:
+        return np.nan if single else np.full(flows.shape[:-1], np.nan)
+    shape = flows.shape[:-1]
+    flows = flows.reshape(-1, flows.shape[-1]).copy()
+    flows[:, 0] -= target  # NPV(r) - target = NPV بعد طرح target من تدفق السنة 0
+    t = np.arange(flows.shape[-1])
+
+    # 1. إيجاد أول تغير في الإشارة على شبكة الأسعار (لكل عرض)
+    grid = IRR_BRACKET_GRID
+    values = flows @ ((1 + grid[None, :]) ** -t[:, None])
+    signs = np.sign(values)
+    change = (signs[:, :-1] * signs[:, 1:]) <= 0
+    found = change.any(axis=1)
+    first = np.argmax(change, axis=1)
+    lo = grid[first]
+    hi = grid[first + 1]
+    f_lo = values[np.arange(len(flows)), first]
+
+    # 2. نيوتن محمي بالتنصيف
+    rate = (lo + hi) / 2
+    active = found.copy()
+    for _ in range(IRR_MAX_ITER):
+        if not active.any():
+            break
+        f, df = _npv_and_derivative(rate, flows, t)
+        same_side = np.sign(f) == np.sign(f_lo)
+        lo = np.where(same_side, rate, lo)
+        f_lo = np.where(same_side, f, f_lo)
+        hi = np.where(same_side, hi, rate)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            newton = rate - f / df
+        inside = np.isfinite(newton) & (newton > lo) & (newton < hi)
+        new_rate = np.where(inside, newton, (lo + hi) / 2)
+        converged = (np.abs(new_rate - rate) < IRR_TOL) | (f == 0)
+        rate = np.where(active, new_rate, rate)
+        active &= ~converged
+
+    rate = np.where(found, rate, np.nan)
+    return float(rate[0]) if single else rate.reshape(shape)
+
+def irr(cash_flows):
+    """معدل العائد الداخلي"""
+    return solve_npv(cash_flows, 0.0)
+
+def payback_period(cash_flows, discount_rate=None):
+    """فترة الاسترداد بالسنوات (مع استيفاء خطي داخل السنة)، NaN إن لم يُسترد الاستثمار
+
+    عند تمرير discount_rate تُحسب فترة الاسترداد المخصومة.
+    """
+    flows = _as_flows(cash_flows)
+    if discount_rate is not None:
+        t = np.arange(flows.shape[-1])
+        flows = flows * (1 + np.asarray(discount_rate, dtype=float)[..., None]) ** -t
+    cumulative = np.cumsum(flows, axis=-1)
+    recovered = (cumulative >= 0) & (np.arange(flows.shape[-1]) > 0)
+    has_payback = recovered.any(axis=-1)
+    year = np.argmax(recovered, axis=-1)
+    prev_cum = np.take_along_axis(cumulative, np.maximum(year - 1, 0)[..., None], axis=-1)[..., 0]
+    flow = np.take_along_axis(flows, year[..., None], axis=-1)[..., 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        period = (year - 1) + (-prev_cum) / flow
+    period = np.where(cumulative[..., 0] >= 0, 0.0, period)
+    return _scalar_or_array(np.where(has_payback | (cumulative[..., 0] >= 0), period, np.nan))
+
+def roi(cash_flows):
+    """العائد على الاستثمار % = صافي الربح / تكلفة الاستثمار × 100"""
+    flows = _as_flows(cash_flows)
+    investment = -np.sum(np.minimum(flows, 0), axis=-1)
+    net_profit = np.sum(flows, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = np.where(investment > 0, net_profit / investment * 100, np.nan)
+    return _scalar_or_array(result)
+
+def evaluate_cash_flows(cash_flows, discount_rate):
+    """تقييم عرض أو مجموعة عروض دفعة واحدة (لفرز عروض لجنة الاستثمار)"""
+    flows = np.atleast_2d(_as_flows(cash_flows))
+    return pd.DataFrame({
+        'npv': np.atleast_1d(npv(discount_rate, flows)),
+        'irr': np.atleast_1d(irr(flows)),
+        'payback_period': np.atleast_1d(payback_period(flows)),
+        'discounted_payback': np.atleast_1d(payback_period(flows, discount_rate)),
+        'roi': np.atleast_1d(roi(flows)),
+    })
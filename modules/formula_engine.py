@@ -0,0 +1,247 @@
+"""
+محرك المعادلات الآمن: تحليل نص المعادلة عبر AST بقائمة عناصر مسموحة ثم ترجمتها مرة واحدة
+إلى دالة Python قابلة للاستدعاء، مع تخزين النسخ المترجمة حسب بصمة نص المعادلة
+"""
+import ast
+import functools
+import hashlib
+import time
+import numpy as np
+import pandas as pd
+from modules.cache import LRUCache
+from modules import finance
+
+FORMULA_CACHE_SIZE = 1024  # عدد المعادلات المترجمة المحتفظ بها
+
+def _variadic(ufunc):
+    """min/max لأي عدد من المعاملات (عنصراً بعنصر) دون تمرير معاملات إضافية مثل out للدالة العامة"""
+    return lambda *args: functools.reduce(ufunc, args)
+
+# الدوال المتاحة داخل المعادلات: تُغلَّف دوال NumPy العامة (ufuncs) حتى لا يصل إليها المعامل
+# الموضعي out فتكتب المعادلة في مصفوفات المستدعي
+FUNCTIONS = {
+    'abs': lambda x: np.abs(x),
+    'min': _variadic(np.minimum),
+    'max': _variadic(np.maximum),
+    'round': lambda x, decimals=0: np.round(x, int(decimals)),
+    'sqrt': lambda x: np.sqrt(x),
+    'log': lambda x: np.log(x),
+    'exp': lambda x: np.exp(x),
+    'sum': lambda x: np.sum(x),
+    'where': lambda condition, x, y: np.where(condition, x, y),
+    'npv': finance.npv,
+    'irr': finance.irr,
+    'solve_npv': finance.solve_npv,
+    'payback': finance.payback_period,
+    'roi': finance.roi,
+}
+
+# عدد المعاملات المسموح لكل دالة (أدنى، أقصى)؛ None = بلا حد أقصى
+FUNCTION_ARITY = {
+    'abs': (1, 1), 'min': (2, None), 'max': (2, None), 'round': (1, 2),
+    'sqrt': (1, 1), 'log': (1, 1), 'exp': (1, 1), 'sum': (1, 1), 'where': (3, 3),
+    'npv': (2, 2), 'irr': (1, 1), 'solve_npv': (1, 2), 'payback': (1, 2), 'roi': (1, 1),
+}
+
+ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant, ast.Name, ast.Load, ast.Call,
+    ast.Compare, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod, ast.FloorDiv,
+    ast.UAdd, ast.USub, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq,
+)
+
+class FormulaError(ValueError):
+    """معادلة غير صالحة أو تحتوي عناصر غير مسموحة"""
+
+class MissingVariablesError(KeyError):
+    """متغيرات مطلوبة للمعادلة غير متوفرة"""
+
+    def __init__(self, missing):
+        self.missing = sorted(missing)
+        super().__init__(f"متغيرات ناقصة: {', '.join(self.missing)}")
+
+    def __str__(self):
+        return self.args[0]
+
+class FormulaCycleError(FormulaError):
+    """حلقة اعتماد بين المعادلات"""
+
+    def __init__(self, cycle):
+        self.cycle = list(cycle)
+        super().__init__(f"حلقة اعتماد بين المعادلات: {' → '.join(self.cycle)}")
+
+class CompiledFormula:
+    """معادلة مترجمة جاهزة للتقييم المتكرر دون إعادة التحليل"""
+
+    def __init__(self, formula, code, variables, functions):
+        self.formula = formula
+        self.code = code
+        self.variables = frozenset(variables)
+        self.functions = frozenset(functions)
+
+    def missing_variables(self, values):
+        return self.variables - values.keys()
+
+    def evaluate(self, values):
+        """تقييم المعادلة بقاموس القيم (قيم مفردة أو مصفوفات NumPy)"""
+        missing = self.missing_variables(values)
+        if missing:
+            raise MissingVariablesError(missing)
+        namespace = dict(FUNCTIONS)
+        namespace.update((name, values[name]) for name in self.variables)
+        return eval(self.code, {'__builtins__': {}}, namespace)
+
+    def __call__(self, **values):
+        return self.evaluate(values)
+
+def formula_key(formula):
+    """بصمة نص المعادلة المستخدمة مفتاحاً للتخزين"""
+    return hashlib.sha1(formula.strip().encode('utf-8')).hexdigest()
+
+def _validate(tree):
+    variables, functions = set(), set()
+    call_targets = {id(node.func) for node in ast.walk(tree) if isinstance(node, ast.Call)}
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise FormulaError(f"عنصر غير مسموح في المعادلة: {type(node).__name__}")
+        if isinstance(node, ast.Constant) and (isinstance(node.value, bool) or not isinstance(node.value, (int, float))):
+            raise FormulaError("القيم الثابتة يجب أن تكون أرقاماً")
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+                raise FormulaError(f"دالة غير مسموحة: {ast.unparse(node.func)}")
+            if node.keywords:
+                raise FormulaError("المعاملات المسماة غير مدعومة في المعادلات")
+            low, high = FUNCTION_ARITY[node.func.id]
+            if len(node.args) < low or (high is not None and len(node.args) > high):
+                expected = f"{low} على الأقل" if high is None else (str(low) if low == high else f"{low} إلى {high}")
+                raise FormulaError(f"الدالة {node.func.id} تقبل {expected} من المعاملات (مُرِّر {len(node.args)})")
+            functions.add(node.func.id)
+        elif isinstance(node, ast.Name) and id(node) not in call_targets:
+            if node.id in FUNCTIONS:
+                raise FormulaError(f"اسم الدالة {node.id} لا يُستخدم كمتغير")
+            if node.id.startswith('_'):
+                raise FormulaError(f"اسم متغير غير مسموح: {node.id}")
+            variables.add(node.id)
+    return variables, functions
+
+def parse_formula(formula):
+    """تحليل المعادلة والتحقق منها وترجمتها (دون تخزين)"""
+    if not isinstance(formula, str) or not formula.strip():
+        raise FormulaError("المعادلة فارغة")
+    try:
+        tree = ast.parse(formula.strip(), mode='eval')
+    except SyntaxError as e:
+        raise FormulaError(f"صيغة غير صحيحة: {e.msg}") from e
+    variables, functions = _validate(tree)
+    # الأرقام الصحيحة تُحوَّل إلى float حتى لا تنتج الأُسس أعداداً صحيحة ضخمة (مثل 9**9**9)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant):
+            node.value = float(node.value)
+    code = compile(tree, '<formula>', 'eval')
+    return CompiledFormula(formula, code, variables, functions)
+
+_compiled = LRUCache(FORMULA_CACHE_SIZE, sizeof=lambda _: 1)
+
+def compile_formula(formula):
+    """إرجاع النسخة المترجمة من المعادلة (تُحلَّل مرة واحدة لكل نص)"""
+    return _compiled.get_or_build(formula_key(formula), lambda: parse_formula(formula))
+
+def invalidate(formula):
+    """حذف النسخة المترجمة لمعادلة (عند تعديلها أو حذفها)"""
+    _compiled.pop(formula_key(formula))
+
+def evaluate_formula(formula, values):
+    return compile_formula(formula).evaluate(values)
+
+def resolve_columns(names, data, column_map=None, params=None):
+    """جمع قيم المتغيرات من أعمدة الجدول أو المعاملات المفردة (params تتقدم على الأعمدة)"""
+    column_map = column_map or {}
+    params = params or {}
+    values, missing = {}, set()
+    for name in names:
+        if name in params:
+            values[name] = params[name]
+            continue
+        column = column_map.get(name, name)
+        if column in data:
+            values[name] = np.asarray(data[column], dtype=float)
+        else:
+            missing.add(name)
+    if missing:
+        raise MissingVariablesError(missing)
+    return values
+
+def as_column(result, data):
+    """تحويل نتيجة التقييم إلى عمود بطول الجدول (بث القيم المفردة)"""
+    n_rows = len(data) if isinstance(data, pd.DataFrame) else len(next(iter(data.values()), []))
+    result = np.asarray(result, dtype=float)
+    if result.ndim == 0:
+        result = np.full(n_rows, float(result))
+    if isinstance(data, pd.DataFrame):
+        return pd.Series(result, index=data.index)
+    return result
+
+def evaluation_order(targets, formulas, provided=()):
+    """ترتيب طوبولوجي للمعادلات اللازمة لحساب targets مع كشف الحلقات
+
+    formulas: قاموس اسم المعادلة ← نصها. المتغير الذي يطابق اسم معادلة أخرى يُعد اعتماداً عليها،
+    إلا إذا كانت قيمته ممررة مسبقاً ضمن provided فلا تُحسب ولا تُتبع اعتماداتها.
+    """
+    order, state, path = [], {}, []
+
+    def visit(name):
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise FormulaCycleError(path[path.index(name):] + [name])
+        state[name] = 'visiting'
+        path.append(name)
+        for dep in sorted(compile_formula(formulas[name]).variables):
+            if dep in formulas and dep != name and dep not in provided:
+                visit(dep)
+        path.pop()
+        state[name] = 'done'
+        order.append(name)
+
+    for target in targets:
+        visit(target)
+    return order
+
+def input_variables(order, formulas):
+    """المتغيرات الأساسية (غير المعادلات) المطلوبة لحساب سلسلة معادلات"""
+    needed = set()
+    for name in order:
+        needed |= compile_formula(formulas[name]).variables
+    return needed - set(order)
+
+def evaluate_graph(targets, formulas, values, timings=None):
+    """حساب مجموعة معادلات مترابطة بالترتيب الطوبولوجي
+
+    كل معادلة وسيطة تُحسب مرة واحدة لكل استدعاء وتُعاد نتيجتها لكل من يعتمد عليها
+    (القيم الممررة في values تتقدم على المعادلات بنفس الاسم). تعيد قاموس جميع النتائج المحسوبة.
+    إذا مُرر قاموس timings يُسجَّل فيه زمن حساب كل معادلة وحدها بالثواني.
+    """
+    order = evaluation_order([t for t in targets if t not in values], formulas, values.keys())
+    missing = input_variables(order, formulas) - values.keys()
+    if missing:
+        raise MissingVariablesError(missing)
+    memo = dict(values)
+    for name in order:
+        start = time.perf_counter()
+        memo[name] = compile_formula(formulas[name]).evaluate(memo)
+        if timings is not None:
+            timings[name] = time.perf_counter() - start
+    return {name: memo[name] for name in order}
+
+def evaluate_columns(formula, data, column_map=None, params=None):
+    """تقييم المعادلة على جدول كامل دفعة واحدة (عملية متجهة بدل حلقة على الصفوف)
+
+    data: DataFrame أو dict من المصفوفات. column_map يربط اسم المتغير في المعادلة
+    باسم العمود عند اختلافهما، وparams قيم مفردة تُبث على جميع الصفوف وتتقدم على
+    الأعمدة بنفس الاسم. تعيد Series بنفس فهرس DataFrame، أو مصفوفة لقاموس المصفوفات.
+    """
+    compiled = compile_formula(formula)
+    values = resolve_columns(compiled.variables, data, column_map, params)
+    return as_column(compiled.evaluate(values), data)
+
+def cache_info():
+    return _compiled.info()
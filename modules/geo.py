@@ -0,0 +1,151 @@
+"""
+أدوات جغرافية متجهة (NumPy): مسافة هافرساين، الترميز الجغرافي Geohash، ومستطيل الإحاطة حول نقطة
+جميع الدوال تقبل قيماً مفردة أو مصفوفات إحداثيات قابلة للبث، فلا يحتاج المستدعي لحلقة على الصفقات
+"""
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = EARTH_RADIUS_KM * np.pi / 180  # نفس نصف القطر المستخدم في haversine_km
+BBOX_MARGIN = 1e-9                              # هامش نسبي يضمن احتواء الدائرة رغم أخطاء التقريب
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_MAX_PRECISION = 12  # 60 بت تتسع في uint64
+
+_GEOHASH_CHARS = np.frombuffer(GEOHASH_ALPHABET.encode('ascii'), dtype=np.uint8)
+_GEOHASH_VALUES = np.full(256, 255, dtype=np.uint8)
+_GEOHASH_VALUES[_GEOHASH_CHARS] = np.arange(32, dtype=np.uint8)
+_GEOHASH_VALUES[np.frombuffer(GEOHASH_ALPHABET.upper().encode('ascii'), dtype=np.uint8)] = np.arange(32, dtype=np.uint8)
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """مسافة الدائرة العظمى بالكيلومتر بين نقاط قابلة للبث
+
+    نقطة إلى عدة نقاط: haversine_km(lat, lng, lats, lngs)
+    أزواج متقابلة: haversine_km(lats_a, lngs_a, lats_b, lngs_b)
+    """
+    lat1, lng1 = np.radians(lat1), np.radians(lng1)
+    lat2, lng2 = np.radians(lat2), np.radians(lng2)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def pairwise_haversine_km(lats1, lngs1, lats2=None, lngs2=None):
+    """مصفوفة المسافات (N × M) بين مجموعتي نقاط (أو بين نقاط المجموعة الأولى نفسها)"""
+    lats1, lngs1 = np.asarray(lats1, dtype=float), np.asarray(lngs1, dtype=float)
+    if lats2 is None:
+        lats2, lngs2 = lats1, lngs1
+    lats2, lngs2 = np.asarray(lats2, dtype=float), np.asarray(lngs2, dtype=float)
+    return haversine_km(lats1[:, None], lngs1[:, None], lats2[None, :], lngs2[None, :])
+
+def bbox_from_radius(lat, lng, radius_km):
+    """مستطيل (south, west, north, east) يحيط بدائرة نصف قطرها radius_km حول كل نقطة
+
+    يحوي المستطيل الدائرة كاملة: امتداد خط الطول هو الامتداد الفعلي للدائرة العظمى
+    asin(sin(d) / cos(lat)) وليس التقريب d / cos(lat) الأصغر منه، مع هامش صغير لأخطاء التقريب.
+    خط العرض يُقص على ±90، وإذا بلغت الدائرة أحد القطبين أو عبرت خط الطول ±180 يغطي المستطيل
+    جميع خطوط الطول (مستطيل واحد لا يلتف حول خط التاريخ، والقص يُسقط صفقات الجهة الأخرى).
+    تعيد قيماً مفردة لمدخلات مفردة ومصفوفات لمدخلات مصفوفة.
+    """
+    lat, lng, radius_km = np.asarray(lat, dtype=float), np.asarray(lng, dtype=float), np.asarray(radius_km, dtype=float)
+    dlat = radius_km / KM_PER_DEG_LAT * (1 + BBOX_MARGIN)
+    south, north = np.maximum(lat - dlat, -90.0), np.minimum(lat + dlat, 90.0)
+    angle = np.radians(dlat)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.sin(np.minimum(angle, np.pi / 2)) / np.cos(np.radians(lat))
+        dlng = np.degrees(np.arcsin(np.clip(ratio, -1.0, 1.0))) * (1 + BBOX_MARGIN)
+    full = (north >= 90.0) | (south <= -90.0) | ~(ratio < 1.0) | (lng - dlng < -180.0) | (lng + dlng > 180.0)
+    west, east = np.where(full, -180.0, lng - dlng), np.where(full, 180.0, lng + dlng)
+    result = (south, west, north, east)
+    if lat.ndim == 0 and lng.ndim == 0 and radius_km.ndim == 0:
+        return tuple(float(x) for x in result)
+    return result
+
+def _quantize(values, low, high, bits):
+    """تحويل القيم إلى أعداد صحيحة بـ bits بت (مكافئ للتنصيف المتكرر في Geohash)"""
+    cells = np.uint64(1) << np.uint64(bits)
+    scaled = np.floor((values - low) / (high - low) * float(cells))
+    return np.clip(scaled, 0, float(cells) - 1).astype(np.uint64)
+
+def geohash_encode(lats, lngs, precision=7):
+    """ترميز Geohash لمصفوفات الإحداثيات (يعيد مصفوفة نصوص، أو نصاً لنقطة مفردة)"""
+    if not 1 <= precision <= GEOHASH_MAX_PRECISION:
+        raise ValueError(f"دقة Geohash يجب أن تكون بين 1 و {GEOHASH_MAX_PRECISION}")
+    scalar = np.ndim(lats) == 0 and np.ndim(lngs) == 0
+    lats, lngs = np.broadcast_arrays(np.asarray(lats, dtype=float), np.asarray(lngs, dtype=float))
+    shape = lats.shape
+    lats, lngs = lats.ravel(), lngs.ravel()
+
+    total_bits = 5 * precision
+    lng_bits, lat_bits = (total_bits + 1) // 2, total_bits // 2
+    lng_q = _quantize(lngs, -180.0, 180.0, lng_bits)
+    lat_q = _quantize(lats, -90.0, 90.0, lat_bits)
+
+    # دمج البتات بالتناوب بدءاً بخط الطول (البت الأعلى أولاً)
+    code = np.zeros(len(lats), dtype=np.uint64)
+    for i in range(total_bits):
+        if i % 2 == 0:
+            bit = (lng_q >> np.uint64(lng_bits - 1 - i // 2)) & np.uint64(1)
+        else:
+            bit = (lat_q >> np.uint64(lat_bits - 1 - i // 2)) & np.uint64(1)
+        code = (code << np.uint64(1)) | bit
+
+    shifts = np.arange(precision - 1, -1, -1, dtype=np.uint64) * np.uint64(5)
+    digits = ((code[:, None] >> shifts[None, :]) & np.uint64(31)).astype(np.intp)
+    chars = np.ascontiguousarray(_GEOHASH_CHARS[digits])
+    result = chars.view(f'S{precision}').ravel().astype(str).reshape(shape)
+    return str(result) if scalar else result
+
+def geohash_decode(hashes, with_error=False):
+    """فك ترميز Geohash إلى مركز الخلية (lats, lngs)، ومع with_error نصف أبعاد الخلية أيضاً
+
+    تقبل نصاً واحداً أو مصفوفة نصوص بأطوال مختلفة.
+    """
+    scalar = isinstance(hashes, str)
+    hashes = np.atleast_1d(np.asarray(hashes, dtype=str))
+    shape = hashes.shape
+    # مصفوفة بايتات (N × أطول رمز)؛ الرموز الأقصر تُكمَّل بأصفار
+    width = max(hashes.dtype.itemsize // 4, 1)
+    try:
+        raw = hashes.ravel().astype(f'S{width}')
+    except UnicodeEncodeError as e:
+        raise ValueError("رمز Geohash يحتوي أحرفاً غير صالحة") from e
+    raw = np.ascontiguousarray(raw).view(np.uint8).reshape(-1, width)
+    n = len(raw)
+    lats, lngs = np.empty(n), np.empty(n)
+    lat_err, lng_err = np.empty(n), np.empty(n)
+    lengths = np.count_nonzero(raw, axis=1)
+
+    for precision in np.unique(lengths):
+        mask = lengths == precision
+        precision = int(precision)
+        if not 1 <= precision <= GEOHASH_MAX_PRECISION:
+            raise ValueError(f"طول Geohash غير مدعوم: {precision}")
+        values = _GEOHASH_VALUES[raw[mask, :precision]]
+        if (values == 255).any():
+            raise ValueError("رمز Geohash يحتوي أحرفاً غير صالحة")
+        code = np.zeros(len(values), dtype=np.uint64)
+        for j in range(precision):
+            code = (code << np.uint64(5)) | values[:, j].astype(np.uint64)
+
+        total_bits = 5 * precision
+        lng_bits, lat_bits = (total_bits + 1) // 2, total_bits // 2
+        lng_q = np.zeros(len(code), dtype=np.uint64)
+        lat_q = np.zeros(len(code), dtype=np.uint64)
+        for i in range(total_bits):
+            bit = (code >> np.uint64(total_bits - 1 - i)) & np.uint64(1)
+            if i % 2 == 0:
+                lng_q = (lng_q << np.uint64(1)) | bit
+            else:
+                lat_q = (lat_q << np.uint64(1)) | bit
+
+        lng_size = 360.0 / 2.0 ** lng_bits
+        lat_size = 180.0 / 2.0 ** lat_bits
+        lngs[mask] = -180.0 + (lng_q.astype(float) + 0.5) * lng_size
+        lats[mask] = -90.0 + (lat_q.astype(float) + 0.5) * lat_size
+        lng_err[mask], lat_err[mask] = lng_size / 2, lat_size / 2
+
+    lats, lngs = lats.reshape(shape), lngs.reshape(shape)
+    lat_err, lng_err = lat_err.reshape(shape), lng_err.reshape(shape)
+    if scalar:
+        lats, lngs, lat_err, lng_err = float(lats[0]), float(lngs[0]), float(lat_err[0]), float(lng_err[0])
+    if with_error:
+        return lats, lngs, lat_err, lng_err
+    return lats, lngs
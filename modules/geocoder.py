@@ -0,0 +1,295 @@
+"""
+الترميز الجغرافي للعناوين دون اتصال: دليل أماكن محلي (مدن وأحياء وشوارع) مفهرس بالأسماء
+العربية بعد توحيد كتابتها وبالبادئات، مع ذاكرة نتائج دائمة في SQLite (إخراج الأقدم استخداماً)
+ومزوّد خارجي اختياري يُستدعى فقط للعناوين التي لم تُحل محلياً
+"""
+import bisect
+import re
+import threading
+import time
+import pandas as pd
+from modules.cache import LRUCache
+from modules.db import get_connection, submit_write
+
+GAZETTEER_PATH = 'assets/gazetteer_sa.csv'
+GEOCODE_CACHE_MAX_ROWS = 50_000    # الحد الأقصى لصفوف ذاكرة النتائج في قاعدة البيانات
+GEOCODE_MEMORY_ENTRIES = 4096      # نتائج محفوظة في ذاكرة العملية أمام قاعدة البيانات
+SQL_IN_CHUNK = 500                 # عدد المعاملات في كل استعلام IN
+MIN_PREFIX_LENGTH = 3              # أقل طول لمطابقة البادئة
+
+_TASHKEEL = re.compile('[ؐ-ًؚ-ٰٟۖ-ۭـ]')
+_PUNCTUATION = re.compile(r'[^\w\s,]')
+_NORMALIZE_TABLE = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا', 'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+    '،': ',', '؛': ',', '-': ' ', '_': ' ',
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+    **{chr(0x06F0 + i): str(i) for i in range(10)},
+})
+# كلمات تصف نوع المكان ولا تميزه (تُحذف قبل المطابقة)
+PLACE_WORDS = {'حي', 'شارع', 'طريق', 'مدينه', 'منطقه', 'محافظه', 'المملكه', 'السعوديه', 'مملكه', 'سعوديه',
+               'district', 'street', 'st', 'road', 'rd', 'city', 'saudi', 'arabia', 'ksa'}
+
+def normalize_arabic(text):
+    """توحيد كتابة العنوان: إزالة التشكيل والتطويل، توحيد الألف والياء والتاء المربوطة،
+    الأرقام العربية، حذف "ال" التعريف وكلمات نوع المكان. الأجزاء تبقى مفصولة بفواصل."""
+    text = _TASHKEEL.sub('', str(text)).translate(_NORMALIZE_TABLE).lower()
+    text = _PUNCTUATION.sub(' ', text)
+    parts = []
+    for part in text.split(','):
+        words = []
+        for word in part.split():
+            if word in PLACE_WORDS or word == 'al':
+                continue
+            if word.startswith('ال') and len(word) > 3:
+                word = word[2:]
+            words.append(word)
+        if words:
+            parts.append(' '.join(words))
+    return ','.join(parts)
+
+class Gazetteer:
+    """دليل الأماكن المحلي مع فهرس للأسماء الموحدة وقائمة مرتبة للبحث بالبادئة"""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.by_key = {}
+        self.cities = {}
+        for i, entry in enumerate(entries):
+            for name in entry['names']:
+                key = normalize_arabic(name).replace(',', ' ')
+                if not key:
+                    continue
+                self.by_key.setdefault(key, []).append(i)
+                if entry['kind'] == 'city':
+                    self.cities.setdefault(key, entry)
+        self.keys = sorted(self.by_key)
+
+    @classmethod
+    def load(cls, path=GAZETTEER_PATH):
+        frame = pd.read_csv(path, comment='#', dtype=str, encoding='utf-8-sig').fillna('')
+        entries = []
+        for row in frame.itertuples(index=False):
+            aliases = [a.strip() for a in row.aliases.split('|') if a.strip()]
+            entries.append({
+                'name': row.name, 'kind': row.kind, 'city': row.city,
+                'latitude': float(row.latitude), 'longitude': float(row.longitude),
+                'names': [row.name, *aliases],
+            })
+        return cls(entries)
+
+    def _pick(self, indexes, city):
+        """أفضل مدخل من المرشحين (المدن ثم الأحياء ثم الشوارع)، أو None
+
+        عند تحديد مدينة في العنوان لا يُقبل إلا مدخل داخلها، فلا يُعاد حي بالاسم نفسه في مدينة أخرى.
+        """
+        rank = {'city': 0, 'district': 1, 'street': 2}
+        candidates = [self.entries[i] for i in indexes]
+        if city is not None:
+            candidates = [e for e in candidates if e['city'] == city['name']]
+            if not candidates:
+                return None
+        return min(candidates, key=lambda e: rank.get(e['kind'], 3))
+
+    def lookup(self, key, city=None):
+        """مطابقة تامة للاسم الموحد ثم مطابقة بالبادئة؛ تعيد (المدخل، نوع المطابقة) أو (None, None)"""
+        if key in self.by_key:
+            entry = self._pick(self.by_key[key], city)
+            if entry is not None:
+                return entry, 'exact'
+        if len(key) < MIN_PREFIX_LENGTH:
+            return None, None
+        start = bisect.bisect_left(self.keys, key)
+        indexes = []
+        for k in self.keys[start:]:
+            if not k.startswith(key):
+                break
+            indexes.extend(self.by_key[k])
+        entry = self._pick(indexes, city) if indexes else None
+        if entry is not None:
+            return entry, 'prefix'
+        return None, None
+
+    def _find_city(self, parts):
+        for part in parts:
+            if part in self.cities:
+                return self.cities[part], part
+        # اسم المدينة داخل جزء أطول (مثل "النخيل الرياض")
+        for part in parts:
+            words = part.split()
+            for size in (2, 1):
+                for i in range(len(words) - size + 1):
+                    key = ' '.join(words[i:i + size])
+                    if key in self.cities:
+                        return self.cities[key], key
+        return None, None
+
+    def resolve(self, normalized):
+        """حل عنوان موحد (أجزاء مفصولة بفواصل) إلى مدخل من الدليل
+
+        إذا ذُكرت مدينة مع أجزاء لم تُعرف في الدليل يُعاد مركز المدينة بنوع المطابقة 'city'
+        (نتيجة تقريبية)، أما العنوان المكون من اسم المدينة وحده فمطابقته 'exact'.
+        """
+        parts = [p for p in normalized.split(',') if p]
+        if not parts:
+            return None
+        city, city_key = self._find_city(parts)
+        unresolved = False
+        for part in parts:
+            if part == city_key:
+                continue
+            if city_key and city_key in part:
+                part = ' '.join(part.replace(city_key, ' ').split())
+                if not part:
+                    continue
+            entry, match = self.lookup(part, city)
+            if entry is not None:
+                return _result(entry, 'gazetteer', match)
+            unresolved = True
+        if city is not None:
+            return _result(city, 'gazetteer', 'city' if unresolved else 'exact')
+        return None
+
+def _result(entry, source, match=None):
+    label = entry['name'] if not entry.get('city') else f"{entry['name']}، {entry['city']}"
+    return {'latitude': entry['latitude'], 'longitude': entry['longitude'], 'label': label,
+            'kind': entry.get('kind'), 'source': source, 'match': match}
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+_memory = LRUCache(GEOCODE_MEMORY_ENTRIES, sizeof=lambda _: 1)
+_remote_provider = None
+
+def get_gazetteer():
+    """تحميل دليل الأماكن مرة واحدة لكل عملية"""
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer.load()
+    return _gazetteer
+
+def set_remote_provider(provider):
+    """تعيين مزوّد خارجي اختياري: دالة تستقبل العنوان وتعيد (lat, lng) أو None (None لإلغائه)"""
+    global _remote_provider
+    _remote_provider = provider
+
+def nominatim_provider(user_agent='hmmc-valuation', timeout=5, country_codes='sa'):
+    """مزوّد Nominatim (يتطلب geopy واتصالاً بالإنترنت) بمهلة محددة"""
+    from geopy.geocoders import Nominatim
+    geolocator = Nominatim(user_agent=user_agent, timeout=timeout)
+
+    def provider(address):
+        location = geolocator.geocode(address, country_codes=country_codes)
+        return (location.latitude, location.longitude) if location else None
+    return provider
+
+def _remote_lookup(address):
+    """نتيجة المزوّد الخارجي للعنوان أو None (الأخطاء لا توقف الترميز)"""
+    try:
+        coords = _remote_provider(address)
+    except Exception as e:
+        print(f"Error in remote geocoder: {e}")
+        return None
+    if not coords:
+        return None
+    return {'latitude': float(coords[0]), 'longitude': float(coords[1]), 'label': address,
+            'kind': None, 'source': 'remote', 'match': None}
+
+def _load_cached(keys):
+    found = {}
+    conn = get_connection()
+    keys = list(keys)
+    for i in range(0, len(keys), SQL_IN_CHUNK):
+        chunk = keys[i:i + SQL_IN_CHUNK]
+        rows = conn.execute(
+            f'''SELECT query, latitude, longitude, label, kind FROM geocode_cache
+                WHERE query IN ({', '.join('?' * len(chunk))})''', chunk).fetchall()
+        for query, lat, lng, label, kind in rows:
+            found[query] = {'latitude': lat, 'longitude': lng, 'label': label, 'kind': kind,
+                            'source': 'cache', 'match': None}
+    return found
+
+def _store_results(conn, new_rows, touched, now, max_rows):
+    """إضافة النتائج الجديدة وتحديث آخر استخدام للنتائج المقروءة ثم إخراج الأقدم استخداماً"""
+    conn.executemany('''INSERT INTO geocode_cache (query, address, latitude, longitude, label, kind, source, hits, last_used)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)
+                        ON CONFLICT (query) DO UPDATE SET
+                            latitude = excluded.latitude, longitude = excluded.longitude,
+                            label = excluded.label, kind = excluded.kind, source = excluded.source,
+                            last_used = excluded.last_used''',
+                     [(*row, now) for row in new_rows])
+    conn.executemany('UPDATE geocode_cache SET hits = hits + 1, last_used = ? WHERE query = ?',
+                     [(now, key) for key in touched])
+    excess = conn.execute('SELECT COUNT(*) FROM geocode_cache').fetchone()[0] - max_rows
+    if excess > 0:
+        conn.execute('''DELETE FROM geocode_cache WHERE query IN
+                        (SELECT query FROM geocode_cache ORDER BY last_used LIMIT ?)''', (excess,))
+
+def geocode_many(addresses, use_remote=True):
+    """ترميز قائمة عناوين دفعة واحدة؛ تعيد قائمة بنفس الترتيب (قاموس النتيجة أو None)
+
+    الترتيب: ذاكرة العملية ← ذاكرة قاعدة البيانات (استعلام واحد) ← دليل الأماكن المحلي ←
+    المزوّد الخارجي إن وُجد. النتائج الجديدة وتحديث آخر استخدام تُكتب في عملية كتابة واحدة
+    غير متزامنة، فلا ينتظر المستدعي قاعدة البيانات. إذا لم يُعرف من العنوان إلا مدينته يُجرَّب
+    المزوّد الخارجي أولاً، ومركز المدينة البديل لا يُخزن كي يُعاد حل العنوان في المرة التالية.
+    """
+    keys = [normalize_arabic(a) if a else '' for a in addresses]
+    results, pending = {}, {}
+    for key, address in zip(keys, addresses):
+        if not key or key in results or key in pending:
+            continue
+        cached = _memory.get(key)
+        if cached is not None:
+            results[key] = cached
+        else:
+            pending[key] = address
+
+    touched, new_rows = [], []
+    if pending:
+        try:
+            stored = _load_cached(pending)
+        except Exception as e:
+            print(f"Error reading geocode cache: {e}")
+            stored = {}
+        for key, result in stored.items():
+            results[key] = _memory.put(key, result)
+            touched.append(key)
+            del pending[key]
+
+    gazetteer = get_gazetteer() if pending else None
+    for key, address in pending.items():
+        result = gazetteer.resolve(key)
+        approximate = result is not None and result['match'] == 'city'
+        if (result is None or approximate) and use_remote and _remote_provider is not None:
+            remote = _remote_lookup(address)
+            if remote is not None:
+                result, approximate = remote, False
+        if result is None:
+            continue
+        if approximate:
+            results[key] = result
+            continue
+        results[key] = _memory.put(key, result)
+        new_rows.append((key, address, result['latitude'], result['longitude'],
+                         result['label'], result['kind'], result['source']))
+
+    if new_rows or touched:
+        try:
+            submit_write(_store_results, new_rows, touched, time.time(), GEOCODE_CACHE_MAX_ROWS)
+        except Exception as e:
+            print(f"Error writing geocode cache: {e}")
+    return [dict(results[key]) if key in results else None for key in keys]
+
+def geocode(address, use_remote=True):
+    """ترميز عنوان واحد إلى قاموس (latitude, longitude, label, kind, source) أو None"""
+    return geocode_many([address], use_remote)[0]
+
+def get_coordinates_from_address(address):
+    """(خط العرض، خط الطول) للعنوان أو None"""
+    result = geocode(address)
+    return (result['latitude'], result['longitude']) if result else None
+
+def clear_cache():
+    """مسح ذاكرة النتائج (بعد تحديث دليل الأماكن مثلاً)"""
+    _memory.clear()
+    submit_write(lambda conn: conn.execute('DELETE FROM geocode_cache')).result()
@@ -0,0 +1,179 @@
+"""
+طبقة حرارية لوسيط سعر المتر من الصفقات: خلايا Geohash بعدة دقات، لكل خلية مدرج تكراري
+لسعر المتر (فئات لوغاريتمية) مخزن في price_cells ويُحدَّث تدريجياً من سجل تغييرات الصفقات
+بدل إعادة حسابه من جميع الصفوف في كل عرض
+"""
+import math
+import threading
+import branca.colormap
+import folium
+import numpy as np
+import pandas as pd
+from modules import db, geo
+from modules.cache import LRUCache
+from modules.db import get_connection, get_data_version, run_write
+
+HEATMAP_PRECISIONS = (4, 5, 6)     # خلايا ~39×20 كم و ~4.9×4.9 كم و ~1.2×0.6 كم
+PRICE_BUCKET_MIN = 1.0             # ريال/م²؛ الأقل منه يُحسب في الفئة الأولى
+PRICE_BUCKET_RATIO = 1.05          # كل فئة أكبر من سابقتها بـ 5% (خطأ الوسيط ≤ ~2.5%)
+PRICE_BUCKETS = math.ceil(math.log(1e6 / PRICE_BUCKET_MIN) / math.log(PRICE_BUCKET_RATIO))
+DRAIN_BATCH = 50000                # عدد التغييرات المعالجة في كل عملية كتابة
+MIN_CELL_PX = 24                   # أدق دقة يكون عرض خليتها على الشاشة بهذا الحجم على الأقل
+MAX_CELLS = 600                    # عند تجاوزه داخل حدود العرض تُستخدم دقة أخشن
+TILE_SIZE_PX = 256
+HEATMAP_CACHE_ENTRIES = 8          # نسخ الخلايا (لكل دقة × إصدار بيانات)
+HEATMAP_COLORS = ('#ffffb2', '#fecc5c', '#fd8d3c', '#f03b20', '#bd0026')
+
+UPSERT_CELL_SQL = '''INSERT INTO price_cells (precision, cell, bucket, deal_count) VALUES (?, ?, ?, ?)
+                     ON CONFLICT (precision, cell, bucket) DO UPDATE SET
+                         deal_count = deal_count + excluded.deal_count'''
+DELETE_EMPTY_CELL_SQL = '''DELETE FROM price_cells
+                           WHERE precision = ? AND cell = ? AND bucket = ? AND deal_count <= 0'''
+
+_cells_cache = LRUCache(HEATMAP_CACHE_ENTRIES, sizeof=lambda _: 1)
+_refreshed_version = (None, None)  # (مسار قاعدة البيانات، الإصدار) آخر تطبيق للتغييرات
+_refresh_lock = threading.Lock()
+
+def price_bucket(price_per_m2):
+    """رقم الفئة اللوغاريتمية لسعر المتر (مصفوفة أعداد صحيحة)"""
+    price = np.maximum(np.asarray(price_per_m2, dtype=float), PRICE_BUCKET_MIN)
+    buckets = np.floor(np.log(price / PRICE_BUCKET_MIN) / math.log(PRICE_BUCKET_RATIO))
+    return np.clip(buckets, 0, PRICE_BUCKETS - 1).astype(np.int64)
+
+def bucket_price(buckets):
+    """سعر المتر الممثل للفئة (المتوسط الهندسي لحديها)"""
+    return PRICE_BUCKET_MIN * PRICE_BUCKET_RATIO ** (np.asarray(buckets, dtype=float) + 0.5)
+
+def aggregate_changes(lats, lngs, price_per_m2, signs, precisions=HEATMAP_PRECISIONS):
+    """تجميع التغييرات إلى صفوف (الدقة، الخلية، الفئة، التغير في العدد) لكل الدقات
+
+    يُرمَّز Geohash مرة واحدة بأدق دقة، وخلايا الدقات الأخشن بادئات منه.
+    """
+    if not len(lats):
+        return []
+    hashes = geo.geohash_encode(lats, lngs, max(precisions))
+    buckets = price_bucket(price_per_m2)
+    signs = np.asarray(signs, dtype=np.int64)
+    rows = []
+    for precision in precisions:
+        cells, cell_index = np.unique(hashes.astype(f'U{precision}'), return_inverse=True)
+        codes, inverse = np.unique(cell_index * PRICE_BUCKETS + buckets, return_inverse=True)
+        deltas = np.bincount(inverse, weights=signs).astype(np.int64)
+        changed = deltas != 0
+        rows.extend(zip([precision] * int(changed.sum()), cells[codes[changed] // PRICE_BUCKETS].tolist(),
+                        (codes[changed] % PRICE_BUCKETS).tolist(), deltas[changed].tolist()))
+    return rows
+
+def _drain_changes(conn, limit):
+    """نقل دفعة من سجل التغييرات إلى خلايا سعر المتر داخل معاملة واحدة (تعيد عدد التغييرات)"""
+    changes = conn.execute('''SELECT seq, latitude, longitude, price_per_m2, sign
+                              FROM price_cell_changes ORDER BY seq LIMIT ?''', (limit,)).fetchall()
+    if not changes:
+        return 0
+    values = np.array(changes, dtype=float)
+    rows = aggregate_changes(values[:, 1], values[:, 2], values[:, 3], values[:, 4])
+    conn.executemany(UPSERT_CELL_SQL, rows)
+    emptied = [row[:3] for row in rows if row[3] < 0]
+    if emptied:
+        conn.executemany(DELETE_EMPTY_CELL_SQL, emptied)
+    conn.execute('DELETE FROM price_cell_changes WHERE seq <= ?', (changes[-1][0],))
+    return len(changes)
+
+def refresh_price_cells(batch_size=DRAIN_BATCH):
+    """تطبيق تغييرات الصفقات المعلقة على خلايا سعر المتر (تعيد عدد التغييرات المطبقة)"""
+    total = 0
+    while True:
+        drained = run_write(_drain_changes, batch_size)
+        total += drained
+        if drained < batch_size:
+            return total
+
+def _current_version():
+    """(مسار قاعدة البيانات، إصدار البيانات) بعد التأكد من تطبيق التغييرات المعلقة (مرة واحدة لكل إصدار)
+
+    المفتاح يشمل المسار كنسخة الإعدادات في db، فلا يتخطى إصدار مماثل من قاعدة أخرى التحديث.
+    """
+    global _refreshed_version
+    version = (db.DB_PATH, get_data_version())
+    if version != _refreshed_version:
+        with _refresh_lock:
+            if version != _refreshed_version:
+                refresh_price_cells()
+                _refreshed_version = version
+    return version
+
+def _load_cells(precision):
+    """قراءة مدرجات خلايا الدقة وحساب العدد ووسيط سعر المتر لكل خلية"""
+    rows = get_connection().execute('''SELECT cell, bucket, deal_count FROM price_cells
+                                       WHERE precision = ? AND deal_count > 0
+                                       ORDER BY cell, bucket''', (precision,)).fetchall()
+    if not rows:
+        return pd.DataFrame(columns=['cell', 'latitude', 'longitude', 'lat_error', 'lng_error',
+                                     'deal_count', 'median_price_per_m2'])
+    cells, buckets, counts = zip(*rows)
+    cells, buckets, counts = np.array(cells), np.array(buckets), np.array(counts, dtype=np.int64)
+    # الصفوف مرتبة حسب (الخلية، الفئة): فئة الصفقة رقم k في الخلية أول فئة يبلغ عندها العدد التراكمي k
+    new_cell = np.r_[True, cells[1:] != cells[:-1]]
+    starts = np.flatnonzero(new_cell)
+    group = np.cumsum(new_cell) - 1
+    cumulative = np.cumsum(counts)
+    within = cumulative - np.r_[0, cumulative[starts[1:] - 1]][group]
+    totals = np.add.reduceat(counts, starts)
+
+    def rank_price(ranks):
+        reached = np.flatnonzero(within >= ranks[group])
+        _, first = np.unique(group[reached], return_index=True)
+        return bucket_price(buckets[reached[first]])
+
+    # للعدد الزوجي يكون الوسيط متوسط الصفقتين الوسطيين
+    medians = (rank_price((totals + 1) // 2) + rank_price(totals // 2 + 1)) / 2
+    lats, lngs, lat_error, lng_error = geo.geohash_decode(cells[starts], with_error=True)
+    return pd.DataFrame({'cell': cells[starts], 'latitude': lats, 'longitude': lngs,
+                         'lat_error': lat_error, 'lng_error': lng_error,
+                         'deal_count': totals, 'median_price_per_m2': medians})
+
+def get_price_cells(precision):
+    """خلايا الدقة مع وسيط سعر المتر، مشتركة بين الجلسات ومحدثة عند تغير إصدار البيانات"""
+    version = _current_version()
+    return _cells_cache.get_or_build((precision, version), lambda: _load_cells(precision))
+
+def precision_for_zoom(zoom):
+    """أدق دقة في HEATMAP_PRECISIONS لا يقل عرض خليتها على الشاشة عن MIN_CELL_PX"""
+    deg_per_px = 360.0 / (TILE_SIZE_PX * 2 ** max(int(zoom), 0))
+    for precision in sorted(HEATMAP_PRECISIONS, reverse=True):
+        if 360.0 / 2 ** math.ceil(5 * precision / 2) >= MIN_CELL_PX * deg_per_px:
+            return precision
+    return min(HEATMAP_PRECISIONS)
+
+def get_heatmap_cells(bounds, zoom):
+    """خلايا وسيط سعر المتر المتقاطعة مع حدود العرض (south, west, north, east)
+
+    تُستخدم دقة أخشن إن تجاوز عدد الخلايا MAX_CELLS.
+    """
+    south, west, north, east = bounds
+    precisions = [p for p in sorted(HEATMAP_PRECISIONS, reverse=True) if p <= precision_for_zoom(zoom)]
+    for precision in precisions:
+        cells = get_price_cells(precision)
+        visible = cells[(cells['latitude'] + cells['lat_error'] >= south)
+                        & (cells['latitude'] - cells['lat_error'] <= north)
+                        & (cells['longitude'] + cells['lng_error'] >= west)
+                        & (cells['longitude'] - cells['lng_error'] <= east)]
+        if len(visible) <= MAX_CELLS or precision == precisions[-1]:
+            return visible.head(MAX_CELLS)
+
+def build_heatmap_layer(cells):
+    """طبقة folium بمستطيل ملون لكل خلية حسب وسيط سعر المتر (مقياس الألوان من خلايا العرض)"""
+    layer = folium.FeatureGroup(name="وسيط سعر المتر")
+    if not len(cells):
+        return layer
+    low, high = np.percentile(cells['median_price_per_m2'], [5, 95])
+    colormap = branca.colormap.LinearColormap(HEATMAP_COLORS, vmin=low, vmax=max(high, low + 1))
+    for row in cells.itertuples(index=False):
+        color = colormap(min(max(row.median_price_per_m2, low), high))
+        folium.Rectangle(
+            [(row.latitude - row.lat_error, row.longitude - row.lng_error),
+             (row.latitude + row.lat_error, row.longitude + row.lng_error)],
+            color=color, weight=0, fill=True, fill_color=color, fill_opacity=0.55,
+            tooltip=f"وسيط سعر المتر {row.median_price_per_m2:,.0f} ريال/م² | {row.deal_count:,} صفقة",
+        ).add_to(layer)
+    return layer
@@ -5,17 +5,10 @@ from datetime import datetime
 from fpdf import FPDF
 import base64
 from io import BytesIO
-import arabic_reshaper
-from bidi.algorithm import get_display
+from modules.arabic_text import fix_arabic, fix_arabic_lines, page_label
 
-# --- دالة مساعدة لمعالجة النصوص العربية ---
-def fix_arabic(text):
-    """تحويل النص العربي ليكون متوافقاً مع مكتبة FPDF (تشكيل وعكس الاتجاه)"""
-    if not text:
-        return ""
-    # إعادة تشكيل الحروف (Shaping) ثم عكس الاتجاه (Bidi)
-    reshaped_text = arabic_reshaper.reshape(text)
-    return get_display(reshaped_text)
+# عنوان الرأس ثابت في كل صفحة فيُشكَّل مرة واحدة عند تحميل الوحدة
+REPORT_TITLE = fix_arabic('تقرير التقييم العقاري المهني')
 
 class PDFReport(FPDF):
     """فئة مخصصة لتوليد تقارير PDF تدعم العربية والـ Unicode """
@@ -37,26 +30,24 @@ class PDFReport(FPDF):
             pass 
         
         self.set_font('DejaVu', '', 16)
-        title = fix_arabic('تقرير التقييم العقاري المهني')
-        self.cell(0, 10, title, 0, 1, 'C')
+        self.cell(0, 10, REPORT_TITLE, 0, 1, 'C')
         self.ln(10)
 
     def footer(self):
         """تذييل الصفحة مع رقم الصفحة """
         self.set_y(-15)
         self.set_font('DejaVu', '', 8)
-        page_num = fix_arabic(f'الصفحة {self.page_no()}')
-        self.cell(0, 10, page_num, 0, 0, 'C')
+        self.cell(0, 10, page_label(self.page_no()), 0, 0, 'C')
 
     def add_arabic_content(self, text):
         """إضافة نصوص عربية متعددة الأسطر مع الحفاظ على التنسيق """
         self.set_font('DejaVu', '', 12)
-        # تقسيم النص لأسطر ومعالجة كل سطر على حدة
-        for line in text.split('\n'):
+        # تقسيم النص لأسطر وتشكيلها دفعة واحدة (الأسطر المكررة تُعالج مرة واحدة)
+        lines = text.split('\n')
+        for line, processed_line in zip(lines, fix_arabic_lines(lines)):
             if not line.strip():
                 self.ln(5)
                 continue
-            processed_line = fix_arabic(line)
             self.multi_cell(w=0, h=10, txt=processed_line, align='R')
 
 def render_report_module(user_role):
@@ -3,6 +3,7 @@
 """
 from datetime import datetime
 import json
+from modules.sensitivity import run_sensitivity
 
 class ProfessionalValuationReport:
     """فئة لتوليد بيانات التقارير المهنية المهيكلة """
@@ -78,15 +79,30 @@ class ProfessionalValuationReport:
         
         # تحديد التسميات حسب الغرض 
         value_label = "القيمة الإيجارية المقترحة" if "إيجار" in purpose else "القيمة السوقية المقدرة"
+        method = self.valuation_data.get('valuation_method', 'sales_comparison')
         
-        return {
-            'methodology': self.valuation_data.get('valuation_method', 'sales_comparison'),
+        analysis = {
+            'methodology': method,
             'final_valuation': {
                 'value': results.get('final_value', 0),
                 'value_label': value_label,
                 'currency': "ريال سعودي"
-            }
+            },
+            'sensitivity_scenarios': self.valuation_data.get('sensitivity_scenarios', []),
+            'sensitivity_grid': None
         }
+        
+        # تحليل الحساسية من مدخلات المنهجية (إن توفرت) بدل جدول فارغ في التقرير
+        inputs = self.valuation_data.get('valuation_inputs')
+        if inputs and not analysis['sensitivity_scenarios']:
+            try:
+                sensitivity = run_sensitivity(method, inputs, grid_params=self.valuation_data.get('sensitivity_grid'))
+                analysis['sensitivity_scenarios'] = sensitivity['sensitivity_scenarios']
+                if sensitivity['grid'] is not None:
+                    analysis['sensitivity_grid'] = json.loads(sensitivity['grid'].to_json(orient='split'))
+            except Exception as e:
+                print(f"Error in sensitivity analysis: {e}")
+        return analysis
 
     def _generate_disclaimers_standards(self):
         """إخلاء المسؤولية والالتزام بالمعايير الدولية """
@@ -0,0 +1,153 @@
+"""
+محرك تحليل الحساسية: تحليل الإعصار (Tornado) بتغيير مدخل واحد في كل مرة،
+وشبكة ثنائية الأبعاد لمدخلين معاً. جميع السيناريوهات تُقيَّم في استدعاء متجه واحد
+لمنهجية التقييم، وتُحوَّل إلى صفوف sensitivity_scenarios التي يعرضها قالب التقرير.
+"""
+import numpy as np
+import pandas as pd
+from modules.valuation_methods import INPUT_DEFAULTS, METHOD_LABELS, BatchValuationMethods
+
+# المدخلات القابلة للتغيير: (التسمية، نوع التغيير، التغييرات الافتراضية)
+# relative: نسبة من القيمة الأساسية (0.1 = +10%)، points: إضافة مباشرة للقيمة (0.01 = +1 نقطة مئوية)،
+# percent: إضافة مباشرة لمدخل مقاس أصلاً بالنسبة المئوية (5 = +5%)
+PARAMETERS = {
+    'annual_income': ('الدخل السنوي', 'relative', (-0.2, -0.1, 0.1, 0.2)),
+    'discount_rate': ('معدل الخصم', 'points', (-0.02, -0.01, 0.01, 0.02)),
+    'growth_rate': ('معدل النمو', 'points', (-0.01, -0.005, 0.005, 0.01)),
+    'gdv': ('قيمة التطوير الإجمالية', 'relative', (-0.2, -0.1, 0.1, 0.2)),
+    'construction_cost': ('تكلفة البناء', 'relative', (-0.2, -0.1, 0.1, 0.2)),
+    'developer_profit': ('ربح المطور', 'points', (-0.05, -0.025, 0.025, 0.05)),
+    'base_price': ('سعر المتر', 'relative', (-0.2, -0.1, 0.1, 0.2)),
+    'land_area': ('المساحة', 'relative', (-0.1, -0.05, 0.05, 0.1)),
+    'adjustment_pct': ('مجموع التعديلات', 'percent', (-10, -5, 5, 10)),
+}
+
+# المدخلات التي يُحسب تأثيرها افتراضياً لكل منهجية
+METHOD_PARAMETERS = {
+    'dcf': ('annual_income', 'discount_rate', 'growth_rate'),
+    'residual': ('gdv', 'construction_cost', 'developer_profit'),
+    'sales_comparison': ('base_price', 'land_area', 'adjustment_pct'),
+}
+
+SENSITIVITY_DEFAULTS = dict(INPUT_DEFAULTS, growth_rate=0.02, adjustment_pct=0.0)
+
+def _base_inputs(base_inputs):
+    return {name: float(base_inputs.get(name, default)) for name, default in SENSITIVITY_DEFAULTS.items()}
+
+def value_inputs(method, inputs):
+    """تقييم المنهجية على مدخلات قابلة للبث (قيم مفردة أو مصفوفات من أي أبعاد)"""
+    bvm = BatchValuationMethods()
+    if method == 'dcf':
+        return bvm.dcf_method(inputs['annual_income'], inputs['discount_rate'],
+                              inputs['forecast_years'], inputs['growth_rate'])
+    if method == 'residual':
+        return bvm.residual_method(inputs['gdv'], inputs['construction_cost'], inputs['developer_profit'])
+    if method == 'sales_comparison':
+        return bvm.sales_comparison_method(inputs['base_price'], inputs['adjustment_pct']) * inputs['land_area']
+    raise ValueError(f"منهجية غير مدعومة: {method}")
+
+def apply_change(name, base, changes):
+    """قيم المدخل بعد تطبيق التغييرات حسب نوعه (نسبي أو نقاط)"""
+    changes = np.asarray(changes, dtype=float)
+    if PARAMETERS[name][1] == 'relative':
+        return base * (1 + changes)
+    return base + changes
+
+def tornado(method, base_inputs, parameters=None):
+    """تغيير مدخل واحد في كل مرة مع تثبيت البقية
+
+    parameters: قائمة أسماء المدخلات أو قاموس اسم ← قائمة التغييرات (الافتراضي حسب المنهجية).
+    تعيد (القيمة الأساسية، DataFrame بأعمدة parameter, change, input_value, value,
+    value_change, value_change_pct) مرتبة حسب المدى الأكبر تأثيراً أولاً.
+    """
+    base = _base_inputs(base_inputs)
+    if parameters is None:
+        parameters = METHOD_PARAMETERS[method]
+    if not isinstance(parameters, dict):
+        parameters = {name: PARAMETERS[name][2] for name in parameters}
+
+    # صف 0 للقيمة الأساسية ثم كتلة صفوف لكل مدخل؛ كل عمود مدخل ثابت عدا كتلته
+    blocks = [(name, np.asarray(changes, dtype=float)) for name, changes in parameters.items()]
+    n_rows = 1 + sum(len(changes) for _, changes in blocks)
+    columns = {name: np.full(n_rows, value) for name, value in base.items()}
+    labels, change_values, input_values = [], [], []
+    row = 1
+    for name, changes in blocks:
+        varied = apply_change(name, base[name], changes)
+        columns[name][row:row + len(changes)] = varied
+        labels.extend([name] * len(changes))
+        change_values.extend(changes.tolist())
+        input_values.extend(varied.tolist())
+        row += len(changes)
+
+    values = np.asarray(value_inputs(method, columns), dtype=float)
+    base_value = float(values[0])
+    values = values[1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change_pct = np.where(base_value != 0, (values - base_value) / abs(base_value) * 100, np.nan)
+    result = pd.DataFrame({
+        'parameter': labels,
+        'change': change_values,
+        'input_value': input_values,
+        'value': values,
+        'value_change': values - base_value,
+        'value_change_pct': change_pct,
+    })
+    swing = result.groupby('parameter')['value'].agg(lambda v: v.max() - v.min())
+    result['swing'] = result['parameter'].map(swing)
+    result = result.sort_values(['swing', 'parameter', 'change'], ascending=[False, True, True], kind='stable')
+    return base_value, result.drop(columns='swing').reset_index(drop=True)
+
+def grid(method, base_inputs, x_param, y_param, x_changes=None, y_changes=None):
+    """شبكة قيم لمدخلين معاً (y في الصفوف × x في الأعمدة) بتقييم متجه واحد
+
+    تعيد DataFrame: الفهرس تغييرات y والأعمدة تغييرات x والخلايا القيمة الناتجة.
+    """
+    base = _base_inputs(base_inputs)
+    x_changes = np.asarray(PARAMETERS[x_param][2] if x_changes is None else x_changes, dtype=float)
+    y_changes = np.asarray(PARAMETERS[y_param][2] if y_changes is None else y_changes, dtype=float)
+    inputs = dict(base)
+    inputs[x_param] = apply_change(x_param, base[x_param], x_changes)[None, :]
+    inputs[y_param] = apply_change(y_param, base[y_param], y_changes)[:, None]
+    values = np.broadcast_to(value_inputs(method, inputs), (len(y_changes), len(x_changes)))
+    frame = pd.DataFrame(np.asarray(values, dtype=float), index=y_changes, columns=x_changes)
+    frame.index.name, frame.columns.name = y_param, x_param
+    return frame
+
+def format_change(name, change):
+    """نص التغير في المدخل كما يظهر في التقرير"""
+    kind = PARAMETERS[name][1]
+    if kind == 'relative':
+        return f"{change * 100:+.1f}%"
+    if kind == 'percent':
+        return f"{change:+.1f}%"
+    return f"{change * 100:+.2f} نقطة"
+
+def scenario_rows(tornado_frame, currency="ريال"):
+    """تحويل نتائج الإعصار إلى صفوف sensitivity_scenarios لقالب التقرير"""
+    rows = []
+    for item in tornado_frame.itertuples(index=False):
+        label = PARAMETERS[item.parameter][0]
+        value_change = "—" if np.isnan(item.value_change_pct) else f"{item.value_change_pct:+.1f}%"
+        rows.append({
+            'scenario': f"{label} {format_change(item.parameter, item.change)}",
+            'input_change': format_change(item.parameter, item.change),
+            'value_change': value_change,
+            'adjusted_value': f"{item.value:,.0f} {currency}",
+        })
+    return rows
+
+def run_sensitivity(method, base_inputs, parameters=None, grid_params=None):
+    """تحليل حساسية كامل لتقييم واحد
+
+    grid_params: (x_param, y_param) اختيارياً لإضافة شبكة ثنائية الأبعاد للرسم.
+    تعيد قاموساً: method, base_value, tornado (DataFrame), sensitivity_scenarios, grid.
+    """
+    base_value, frame = tornado(method, base_inputs, parameters)
+    return {
+        'method': METHOD_LABELS.get(method, method),
+        'base_value': base_value,
+        'tornado': frame,
+        'sensitivity_scenarios': scenario_rows(frame),
+        'grid': grid(method, base_inputs, *grid_params) if grid_params else None,
+    }
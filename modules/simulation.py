@@ -0,0 +1,113 @@
+"""
+محاكاة مونت كارلو متجهة لتحليل حساسية التقييم
+كل مدخل (الإيجار، النمو، معدل الخصم، الإشغال، تكلفة البناء) يُعطى توزيعاً احتمالياً،
+وتُسحب جميع العينات وتُمرر عبر منهجية التقييم في عملية NumPy واحدة دون حلقات.
+"""
+import time
+import numpy as np
+from modules.valuation_methods import ValuationMethods, BatchValuationMethods
+
+SIMULATION_SEED = 2024     # البذرة الافتراضية حتى تتكرر نتائج التقارير
+DEFAULT_DRAWS = 100_000
+MAX_DRAWS = 2_000_000
+HISTOGRAM_BINS = 50
+PERCENTILES = (5, 50, 95)
+
+SIMULATION_METHODS = {
+    'dcf': 'التدفقات النقدية المخصومة',
+    'residual': 'القيمة المتبقية',
+}
+
+# ترتيب سحب المدخلات ثابت حتى تعطي نفس البذرة نفس العينات لكل مدخل
+INPUT_ORDER = ('rent', 'occupancy', 'growth', 'discount_rate', 'construction_cost')
+
+# توزيعات افتراضية (مثلثية: أدنى، الأرجح، أعلى)
+DEFAULT_INPUTS = {
+    'rent': {'dist': 'triangular', 'low': 400_000, 'mode': 500_000, 'high': 600_000},
+    'occupancy': {'dist': 'triangular', 'low': 0.75, 'mode': 0.90, 'high': 0.98},
+    'growth': {'dist': 'triangular', 'low': 0.0, 'mode': 0.02, 'high': 0.04},
+    'discount_rate': {'dist': 'triangular', 'low': 0.08, 'mode': 0.10, 'high': 0.12},
+    'construction_cost': {'dist': 'triangular', 'low': 2_000_000, 'mode': 2_500_000, 'high': 3_200_000},
+}
+
+def draw(rng, spec, n):
+    """سحب n عينة من توزيع المدخل
+
+    spec: رقم ثابت، أو قاموس بالمفتاح dist:
+    fixed(value) | uniform(low, high) | triangular(low, mode, high) | normal(mean, std, [low], [high])
+    (قيم normal تُقص على الحدود low/high إن وُجدت).
+    """
+    if not isinstance(spec, dict):
+        return np.full(n, float(spec))
+    dist = spec.get('dist', 'fixed')
+    if dist == 'fixed':
+        return np.full(n, float(spec['value']))
+    if dist == 'uniform':
+        return rng.uniform(spec['low'], spec['high'], n)
+    if dist == 'triangular':
+        if spec['low'] == spec['high']:
+            return np.full(n, float(spec['low']))
+        return rng.triangular(spec['low'], spec['mode'], spec['high'], n)
+    if dist == 'normal':
+        values = rng.normal(spec['mean'], spec['std'], n)
+        if 'low' in spec or 'high' in spec:
+            values = np.clip(values, spec.get('low', -np.inf), spec.get('high', np.inf))
+        return values
+    raise ValueError(f"توزيع غير مدعوم: {dist}")
+
+def draw_inputs(inputs, n_draws, seed=SIMULATION_SEED):
+    """سحب عينات جميع المدخلات بمولد واحد ذي بذرة ثابتة"""
+    rng = np.random.default_rng(seed)
+    specs = dict(DEFAULT_INPUTS, **(inputs or {}))
+    return {name: draw(rng, specs[name], n_draws) for name in INPUT_ORDER}
+
+def value_samples(method, samples, years=20, profit_margin=0.2):
+    """تمرير العينات عبر منهجية التقييم دفعة واحدة
+
+    dcf: القيمة الحالية لصافي الإيجار (الإيجار × الإشغال) لعدد years من السنوات.
+    residual: القيمة الحالية للإيجار كقيمة تطوير إجمالية ناقصاً تكلفة البناء مع ربح المطور.
+    """
+    income = samples['rent'] * samples['occupancy']
+    present_value = ValuationMethods().dcf_method(income, samples['discount_rate'], years, samples['growth'])
+    if method == 'dcf':
+        return np.asarray(present_value, dtype=float)
+    if method == 'residual':
+        return BatchValuationMethods().residual_method(present_value, samples['construction_cost'], profit_margin)
+    raise ValueError(f"منهجية غير مدعومة في المحاكاة: {method}")
+
+def summarize(values, threshold=None, bins=HISTOGRAM_BINS):
+    """ملخص توزيع القيم: المتوسط والانحراف والنسب المئوية والمدرج واحتمال النزول عن threshold"""
+    p5, p50, p95 = np.percentile(values, PERCENTILES)
+    counts, edges = np.histogram(values, bins=bins)
+    summary = {
+        'mean': float(values.mean()),
+        'std': float(values.std()),
+        'p5': float(p5),
+        'p50': float(p50),
+        'p95': float(p95),
+        'histogram': {'counts': counts.tolist(), 'edges': edges.tolist()},
+        'threshold': threshold,
+        'prob_below': None,
+    }
+    if threshold is not None:
+        summary['prob_below'] = float(np.count_nonzero(values < threshold) / len(values))
+    return summary
+
+def run_simulation(method='dcf', inputs=None, n_draws=DEFAULT_DRAWS, seed=SIMULATION_SEED,
+                   threshold=None, years=20, profit_margin=0.2, bins=HISTOGRAM_BINS, keep_values=False):
+    """تشغيل محاكاة مونت كارلو كاملة وإرجاع ملخص النتائج
+
+    نفس (inputs, n_draws, seed) تعطي نفس النتائج تماماً، فتبقى أرقام التقرير قابلة للتكرار.
+    keep_values=True يضيف مصفوفة القيم الكاملة تحت المفتاح values.
+    """
+    n_draws = int(n_draws)
+    if not 0 < n_draws <= MAX_DRAWS:
+        raise ValueError(f"عدد السحبات يجب أن يكون بين 1 و {MAX_DRAWS:,}")
+    start = time.perf_counter()
+    samples = draw_inputs(inputs, n_draws, seed)
+    values = value_samples(method, samples, years, profit_margin)
+    result = summarize(values, threshold, bins)
+    result.update(method=method, n_draws=n_draws, seed=seed, elapsed=time.perf_counter() - start)
+    if keep_values:
+        result['values'] = values
+    return result
@@ -1,15 +1,6 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-import arabic_reshaper
-from bidi.algorithm import get_display
-
-# --- دالة معالجة النصوص العربية ---
-def fix_arabic(text):
-    if not text:
-        return ""
-    reshaped_text = arabic_reshaper.reshape(text)
-    return get_display(reshaped_text)
 
 class SiteRentalValuation:
     """نظام تحديد القيمة الإيجارية للموقع المتوافق مع اللوائح البلدية"""
@@ -1,4 +1,61 @@
+import math
 import numpy as np
+import pandas as pd
+
+METHOD_LABELS = {
+    'sales_comparison': 'مقارنة المبيعات',
+    'residual': 'القيمة المتبقية',
+    'dcf': 'التدفقات النقدية',
+}
+
+# القيم الافتراضية لمدخلات كل منهجية (نفس القيم المستخدمة في apply_valuation_method)
+INPUT_DEFAULTS = {
+    'base_price': 0,
+    'land_area': 1,
+    'gdv': 0,
+    'construction_cost': 0,
+    'developer_profit': 0.2,
+    'annual_income': 0,
+    'discount_rate': 0.1,
+    'forecast_years': 10,
+}
+
+# أقل فرق بين معامل النمو والخصم قبل استخدام تقريب المتسلسلة بدل الصيغة المغلقة
+DCF_SERIES_EPS = 1e-8
+
+def _int_power(base, exponent):
+    """رفع مصفوفة لأُس صحيح غير سالب (مصفوفة) بالتربيع المتكرر
+
+    تعتمد على الضرب فقط، فتعطي نتيجة مطابقة حرفياً بغض النظر عن حجم المصفوفة،
+    بخلاف np.power التي قد تختلف في آخر بت بين المسار المتجه والمفرد.
+    """
+    base, exponent = np.broadcast_arrays(np.asarray(base, dtype=float), np.asarray(exponent, dtype=np.int64))
+    result = np.ones(base.shape)
+    base = base.copy()
+    exponent = exponent.copy()
+    while np.any(exponent > 0):
+        odd = (exponent & 1).astype(bool)
+        result = np.where(odd, result * base, result)
+        base = base * base
+        exponent >>= 1
+    return result
+
+def _dcf_scalar(income, rate, years, growth):
+    """نفس عمليات ValuationMethods.dcf_method لقيم مفردة دون كلفة NumPy"""
+    n = max(math.trunc(years), 0.0)
+    q = (1 + growth) / (1 + rate)
+    delta = q - 1
+    if abs(delta) < DCF_SERIES_EPS:
+        series = n + n * (n - 1) / 2 * delta
+    else:
+        power, base, exponent = 1.0, q, int(n)
+        while exponent > 0:
+            if exponent & 1:
+                power = power * base
+            base = base * base
+            exponent >>= 1
+        series = (power - 1) / delta
+    return income / (1 + rate) * series + 0.0
 
 class ValuationMethods:
     """منهجيات التقييم العقاري العلمية وفق المعايير الدولية IVS"""
@@ -13,9 +70,48 @@ class ValuationMethods:
         return max(0, gdv - (const_cost * (1 + profit_margin)))
 
     def dcf_method(self, annual_income, discount_rate, years, growth_rate=0.02):
-        """معادلة التدفقات النقدية المخصومة NPV"""
-        pv = sum([(annual_income * (1 + growth_rate)**t) / (1 + discount_rate)**(t+1) for t in range(int(years))])
-        return pv
+        """معادلة التدفقات النقدية المخصومة NPV
+
+        PV = Σ I·(1+g)^t / (1+r)^(t+1) للسنوات t = 0..n-1، محسوبة بصيغة المتسلسلة
+        الهندسية المغلقة بدل الحلقة. تقبل جميع المدخلات مصفوفات NumPy قابلة للبث
+        (مثلاً income[:, None] مع discount_rate[None, :] لشبكة سيناريوهات كاملة)،
+        وتعيد float عندما تكون جميع المدخلات قيماً مفردة (مسار مفرد بنفس العمليات).
+        """
+        if all(np.ndim(x) == 0 for x in (annual_income, discount_rate, years, growth_rate)):
+            return _dcf_scalar(float(annual_income), float(discount_rate), float(years), float(growth_rate))
+
+        income = np.asarray(annual_income, dtype=float)
+        rate = np.asarray(discount_rate, dtype=float)
+        growth = np.asarray(growth_rate, dtype=float)
+        n = np.maximum(np.trunc(np.asarray(years, dtype=float)), 0)
+
+        q = (1 + growth) / (1 + rate)
+        delta = q - 1
+        near_one = np.abs(delta) < DCF_SERIES_EPS
+        safe_delta = np.where(near_one, 1.0, delta)
+        # Σ q^t = (q^n - 1) / (q - 1)، وعند تساوي النمو والخصم (q ≈ 1) تقريب بحدّين
+        series = np.where(near_one,
+                          n + n * (n - 1) / 2 * delta,
+                          (_int_power(q, n) - 1) / safe_delta)
+        return income / (1 + rate) * series + 0.0  # + 0.0 يحوّل -0.0 إلى 0.0
+
+class BatchValuationMethods:
+    """نسخة متجهة (NumPy) من منهجيات التقييم لتقييم محافظ كاملة دفعة واحدة
+
+    كل دالة تستقبل مصفوفات (أو قيماً مفردة قابلة للبث) وتعيد مصفوفة نتائج مطابقة
+    عددياً لنتائج ValuationMethods صفاً بصف.
+    """
+
+    def sales_comparison_method(self, base_price, total_adjustment_pct):
+        total_adj = np.asarray(total_adjustment_pct, dtype=float) / 100
+        return np.asarray(base_price, dtype=float) * (1 + total_adj)
+
+    def residual_method(self, gdv, const_cost, profit_margin):
+        gdv = np.asarray(gdv, dtype=float)
+        return np.maximum(0, gdv - (np.asarray(const_cost, dtype=float) * (1 + np.asarray(profit_margin, dtype=float))))
+
+    def dcf_method(self, annual_income, discount_rate, years, growth_rate=0.02):
+        return np.asarray(ValuationMethods().dcf_method(annual_income, discount_rate, years, growth_rate), dtype=float)
 
 def apply_valuation_method(method_name, property_data, additional_data=None):
     vm = ValuationMethods()
@@ -30,3 +126,46 @@ def apply_valuation_method(method_name, property_data, additional_data=None):
         val = vm.dcf_method(property_data.get('annual_income', 0), property_data.get('discount_rate', 0.1), property_data.get('forecast_years', 10))
         return {'total_value': val, 'method': 'التدفقات النقدية'}
     return None
+
+def apply_valuation_methods_batch(portfolio, method_column='method', additional_data=None):
+    """تقييم محفظة مواقع كاملة دفعة واحدة
+
+    portfolio: DataFrame (أو dict من المصفوفات) يحتوي على عمود المنهجية ومدخلات
+    apply_valuation_method بنفس الأسماء (base_price, land_area, gdv, ...). القيم
+    الناقصة تأخذ نفس القيم الافتراضية. يمكن تمرير عمود adjustment_pct لمجموع
+    تعديلات خاص بكل صف بدلاً من adjustments_matrix المشتركة.
+    تعيد DataFrame بعمودي total_value و method بنفس ترتيب الصفوف.
+    """
+    df = portfolio if isinstance(portfolio, pd.DataFrame) else pd.DataFrame(portfolio)
+    methods = df[method_column].to_numpy()
+    bvm = BatchValuationMethods()
+
+    def column(name):
+        if name in df:
+            return df[name].astype(float).fillna(INPUT_DEFAULTS[name]).to_numpy()
+        return np.full(len(df), INPUT_DEFAULTS[name], dtype=float)
+
+    adj = additional_data.get('adjustments_matrix', {}) if additional_data else {}
+    shared_adj = sum(adj.values())
+    if 'adjustment_pct' in df:
+        total_adj = df['adjustment_pct'].astype(float).fillna(shared_adj).to_numpy()
+    else:
+        total_adj = np.full(len(df), shared_adj, dtype=float)
+
+    values = np.full(len(df), np.nan)
+    mask = methods == 'sales_comparison'
+    if mask.any():
+        values[mask] = bvm.sales_comparison_method(column('base_price')[mask], total_adj[mask]) * column('land_area')[mask]
+    mask = methods == 'residual'
+    if mask.any():
+        values[mask] = bvm.residual_method(column('gdv')[mask], column('construction_cost')[mask],
+                                           column('developer_profit')[mask])
+    mask = methods == 'dcf'
+    if mask.any():
+        values[mask] = bvm.dcf_method(column('annual_income')[mask], column('discount_rate')[mask],
+                                      column('forecast_years')[mask])
+
+    return pd.DataFrame({
+        'total_value': values,
+        'method': pd.Series(methods, index=df.index).map(METHOD_LABELS),
+    }, index=df.index)